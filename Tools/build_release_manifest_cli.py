@@ -1,13 +1,16 @@
 #!/usr/bin/env python
-import argparse, hashlib, os, platform, subprocess, sys, time
+import argparse, os, platform, subprocess, sys, time
 from pathlib import Path
 
+REPO = Path(__file__).resolve().parents[1]
+if str(REPO) not in sys.path:
+    sys.path.insert(0, str(REPO))
+
+from models.common.cas import get_series_store
+
 def sha256(fp):
-    h = hashlib.sha256()
-    with open(fp, "rb") as f:
-        for chunk in iter(lambda: f.read(1<<20), b""):
-            h.update(chunk)
-    return h.hexdigest()
+    # reuses the series store's stat cache: unchanged files are not rehashed
+    return get_series_store().sha256(Path(fp))
 
 def get_py_version():
     return sys.version.replace("\n"," ")
@@ -34,6 +37,9 @@ def main():
         if p.is_file():
             files.append((p.name, sha256(p)))
 
+    store = get_series_store()
+    series = [(name, store.log(name)) for name in store.names()]
+
     pyver = get_py_version()
     pipf  = get_pip_freeze()
 
@@ -60,6 +66,15 @@ def main():
     else:
         lines.append("_(no files found)_\n\n")
 
+    lines.append("## Processed series versions (series store head)\n\n")
+    if series:
+        lines.append("| indicator | sha256 | versions | recorded |\n|:-----|:-------|-----:|:-----|\n")
+        for name, log in series:
+            lines.append(f"| {name} | `{log[-1]['sha256']}` | {len(log)} | {log[-1]['time']} |\n")
+        lines.append("\n")
+    else:
+        lines.append("_(series store empty; run data/processing_pipeline.py)_\n\n")
+
     lines.append("## Reproduction (core commands)\n\n")
     for cmd in repro:
         lines.append(f"- `{cmd}`\n")
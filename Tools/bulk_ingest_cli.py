@@ -0,0 +1,36 @@
+#!/usr/bin/env python
+import argparse, json, sys
+from pathlib import Path
+
+REPO = Path(__file__).resolve().parents[1]
+if str(REPO) not in sys.path:
+    sys.path.insert(0, str(REPO))
+
+from models.common.bulk_ingest import ingest
+
+def main():
+    ap = argparse.ArgumentParser(description="Ingest a directory or .zip of date,value CSVs into data/processed")
+    ap.add_argument("--src", required=True, help="Directory (searched recursively) or .zip archive of CSVs")
+    ap.add_argument("--pro_dir", default="data/processed", help="Processed series directory")
+    ap.add_argument("--prefix", default="", help="Prefix for the ingested series names (e.g., fred_)")
+    ap.add_argument("--min_years", type=int, default=5, help="Reject series with fewer annual values")
+    ap.add_argument("--threads", type=int, default=None, help="Reader threads (default: Python's default)")
+    ap.add_argument("--overwrite", action="store_true", help="Replace existing series of the same name")
+    ap.add_argument("--dry_run", action="store_true", help="Validate and report only; write nothing")
+    ap.add_argument("--report", default=None, help="Optional JSON path for the ingest summary")
+    args = ap.parse_args()
+
+    summary = ingest(args.src, Path(args.pro_dir), prefix=args.prefix, min_years=args.min_years,
+                     threads=args.threads, overwrite=args.overwrite, dry_run=args.dry_run)
+    for member, why in sorted(summary["rejected"].items())[:20]:
+        print(f"[WARN] rejected {member}: {why}")
+    if len(summary["rejected"]) > 20:
+        print(f"[WARN] ... and {len(summary['rejected']) - 20} more rejected")
+    if args.report:
+        Path(args.report).write_text(json.dumps(summary, indent=2), encoding="utf-8")
+        print(f"[OK] Wrote {args.report}")
+    if summary["accepted"] and not args.dry_run:
+        print("[INFO] Run data/processing_pipeline.py to refresh corr_matrix.csv and breaks.csv")
+
+if __name__ == "__main__":
+    main()
@@ -8,6 +8,16 @@ Heuristics:
 - Coerces to annual rows (one per year) and writes YYYY-01-01 as 'date'.
 - Drops NA/inf and collapses duplicate years by mean.
 
+Incremental batch: data/raw/_structural_manifest.json records, per archive
+file, its sha256, the layout the heuristics chose from its header (which
+columns hold the date/year and the value) and the sha256 of the data/raw
+output. Files whose content and output are unchanged are skipped; changed
+files with the same header reuse the recorded layout. Only the two layout
+columns are read, and changed files are cleaned in a process pool. Use --force to re-infer and rewrite everything.
+
+Usage:
+  python Tools/make_structural_indicators.py [--jobs N] [--force]
+
 Targets (if present in archive):
   - union_membership_rate_pct.csv
   - public-trust-in-government.csv
@@ -31,11 +41,17 @@ Result filenames (in data/raw/):
   trust_media_pct, house_polarization_dw, cultural_liberalism_index,
   median_hh_income_real, justice_mq_score, ba_plus_25plus_share, president_party_code
 """
+import argparse
+import hashlib
+import json
+import os
+from concurrent.futures import ProcessPoolExecutor
 from pathlib import Path
 import pandas as pd
 
 ARCH = Path("data/processed/archive")
 RAW  = Path("data/raw")
+MANIFEST_JSON = RAW / "_structural_manifest.json"
 RAW.mkdir(parents=True, exist_ok=True)
 
 MAP = {
@@ -58,35 +74,46 @@ MAP = {
 
 VALUE_LIKE = {"value","val","y","series","measure","pct","index","rate","score"}
 
-def _tidy(df: pd.DataFrame, name: str) -> pd.DataFrame:
-    cols_lower = {c.lower(): c for c in df.columns}
+def _infer_layout(columns: list) -> dict:
+    """Decide, from the header alone, which columns hold the date/year and the value."""
+    cols_lower = {c.lower(): c for c in columns}
 
     # Case A: already tidy
     if "date" in cols_lower and "value" in cols_lower:
-        out = df[[cols_lower["date"], cols_lower["value"]]].copy()
-        out.columns = ["date","value"]
+        return {"kind": "date", "date": cols_lower["date"], "value": cols_lower["value"]}
     # Case B: year + value-like column
-    elif "year" in cols_lower:
-        vcols = [c for c in df.columns if c.lower() in VALUE_LIKE]
+    if "year" in cols_lower:
+        vcols = [c for c in columns if c.lower() in VALUE_LIKE]
         if not vcols:
             # fallback: pick the second column if exists
-            vcols = df.columns[1:2].tolist()
-        ycol = cols_lower["year"]
-        vcol = vcols[0]
-        out = df[[ycol, vcol]].copy()
+            vcols = list(columns[1:2])
+        return {"kind": "year", "year": cols_lower["year"], "value": vcols[0]}
+    # Case C: first column parseable as date, second numeric
+    if len(columns) >= 2:
+        return {"kind": "first_cols", "date": columns[0], "value": columns[1]}
+    raise ValueError("Unrecognized shape—please add date,value manually.")
+
+
+def _layout_columns(layout: dict) -> list:
+    return [layout["year"] if layout["kind"] == "year" else layout["date"], layout["value"]]
+
+
+def _tidy(df: pd.DataFrame, layout: dict) -> pd.DataFrame:
+    if layout["kind"] == "year":
+        out = df[[layout["year"], layout["value"]]].copy()
         out.columns = ["year","value"]
         out = out.dropna(subset=["year","value"])
         out["year"] = pd.to_numeric(out["year"], errors="coerce")
         out = out.dropna(subset=["year"])
         out["date"] = pd.to_datetime(out["year"].astype(int).astype(str) + "-01-01")
         out = out[["date","value"]]
-    # Case C: first column parseable as date, second numeric
-    elif df.shape[1] >= 2:
-        dt = pd.to_datetime(df.iloc[:,0], errors="coerce")
-        out = pd.DataFrame({"date": dt, "value": pd.to_numeric(df.iloc[:,1], errors="coerce")})
+    elif layout["kind"] == "first_cols":
+        dt = pd.to_datetime(df[layout["date"]], errors="coerce")
+        out = pd.DataFrame({"date": dt, "value": pd.to_numeric(df[layout["value"]], errors="coerce")})
         out = out.dropna(subset=["date","value"])
     else:
-        raise ValueError("Unrecognized shape—please add date,value manually.")
+        out = df[[layout["date"], layout["value"]]].copy()
+        out.columns = ["date","value"]
 
     # Normalize to yearly rows & clean
     out["date"] = pd.to_datetime(out["date"], errors="coerce")
@@ -103,22 +130,102 @@ def _tidy(df: pd.DataFrame, name: str) -> pd.DataFrame:
     s = s[["date","value"]].sort_values("date").reset_index(drop=True)
     return s
 
+
+def _sha256(path: Path) -> str:
+    h = hashlib.sha256()
+    with open(path, "rb") as f:
+        for chunk in iter(lambda: f.read(1 << 20), b""):
+            h.update(chunk)
+    return h.hexdigest()
+
+
+def _header(path: Path) -> list:
+    return pd.read_csv(path, nrows=0).columns.tolist()
+
+
+def _load_manifest() -> dict:
+    if MANIFEST_JSON.exists():
+        try:
+            return json.loads(MANIFEST_JSON.read_text(encoding="utf-8"))
+        except ValueError:
+            print(f"[WARN] Ignoring unreadable manifest {MANIFEST_JSON}")
+    return {}
+
+
+def _save_manifest(manifest: dict) -> None:
+    tmp = MANIFEST_JSON.with_name(MANIFEST_JSON.name + ".tmp")
+    tmp.write_text(json.dumps(manifest, indent=2, sort_keys=True), encoding="utf-8")
+    os.replace(tmp, MANIFEST_JSON)
+
+
+def _clean_one(job: tuple) -> tuple:
+    """Worker: (src name, out stem, layout) -> (src name, message, output sha256)."""
+    src_name, out_stem, layout = job
+    try:
+        df = pd.read_csv(ARCH / src_name, usecols=_layout_columns(layout), low_memory=False)
+        tidy = _tidy(df, layout)
+        out = RAW / f"{out_stem}.csv"
+        tidy.to_csv(out, index=False)
+        return src_name, f"[OK] {src_name} -> data/raw/{out.name} ({len(tidy)} rows)", _sha256(out)
+    except Exception as e:
+        return src_name, f"[FAIL] {src_name}: {e}", None
+
+
 def main():
+    ap = argparse.ArgumentParser(description="Incremental archive -> data/raw cleaning of structural indicators.")
+    ap.add_argument("--jobs", type=int, default=None, help="Worker processes (default: CPU count)")
+    ap.add_argument("--force", action="store_true", help="Ignore recorded layouts and hashes; rebuild everything")
+    args = ap.parse_args()
+
+    manifest = {} if args.force else _load_manifest()
     created = []
     skipped  = []
+    jobs = []
+    hashes = {}
+    headers = {}
+    n_fresh = 0
     for src_name, out_stem in MAP.items():
         src = ARCH / src_name
         if not src.exists():
             skipped.append(f"[MISS] {src_name} (not found)")
             continue
+        hashes[src_name] = _sha256(src)
+        entry = manifest.get(src_name) or {}
+        out = RAW / f"{out_stem}.csv"
+        if (entry.get("sha256") == hashes[src_name] and entry.get("output") == out.name
+                and out.exists() and _sha256(out) == entry.get("output_sha256")):
+            n_fresh += 1
+            continue
+        header = _header(src)
         try:
-            df = pd.read_csv(src, low_memory=False)
-            tidy = _tidy(df, src_name)
-            out = RAW / f"{out_stem}.csv"
-            tidy.to_csv(out, index=False)
-            created.append(f"[OK] {src_name} -> data/raw/{out.name} ({len(tidy)} rows)")
-        except Exception as e:
+            layout = entry["layout"] if entry.get("header") == header else _infer_layout(header)
+        except ValueError as e:
             skipped.append(f"[FAIL] {src_name}: {e}")
+            continue
+        jobs.append((src_name, out_stem, layout))
+        headers[src_name] = header
+
+    print(f"[structural] {len(jobs)} of {len(jobs) + n_fresh} archive files changed")
+    if jobs:
+        workers = 1 if len(jobs) == 1 else args.jobs
+        if workers == 1:
+            results = [_clean_one(j) for j in jobs]
+        else:
+            with ProcessPoolExecutor(max_workers=workers) as pool:
+                results = list(pool.map(_clean_one, jobs))
+        for (src_name, out_stem, layout), (_, msg, out_sha) in zip(jobs, results):
+            if msg.startswith("[OK]"):
+                created.append(msg)
+                manifest[src_name] = {"sha256": hashes[src_name], "header": headers[src_name], "layout": layout,
+                                      "output": f"{out_stem}.csv", "output_sha256": out_sha}
+            else:
+                skipped.append(msg)
+                manifest.pop(src_name, None)
+
+    # forget archive files that are gone or no longer mapped
+    for name in [n for n in manifest if n not in hashes]:
+        del manifest[name]
+    _save_manifest(manifest)
 
     print("\n".join(created) if created else "[Info] No files created.")
     if skipped:
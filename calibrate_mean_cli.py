@@ -8,7 +8,7 @@ import pandas as pd
 REPO = Path(__file__).resolve().parent
 sys.path.insert(0, str(REPO / "models" / "common"))
 
-from utils import load_indicator
+from models.common.utils import load_indicator
 
 Z95 = 1.6448536269514722
 
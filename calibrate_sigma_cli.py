@@ -28,6 +28,10 @@ from typing import Dict, List, Tuple
 import numpy as np
 import pandas as pd
 
+from models.common.panel_store import PanelStore, open_panel
+from models.common.utils import load_indicator
+from models.common.vintages import vintage_required
+
 DATA_DIR = Path("data/processed")
 MIN_HISTORY = 8
 
@@ -102,41 +106,13 @@ def _normalize_columns(df: pd.DataFrame) -> pd.DataFrame:
     return df
 
 
-def _load_truth_series(indicator: str) -> pd.DataFrame:
+def _load_truth_series(indicator: str, store: PanelStore | None = None) -> pd.DataFrame:
     path = DATA_DIR / f"{indicator}.csv"
     if not path.exists():
         raise FileNotFoundError(f"Truth series not found for '{indicator}': {path}")
-    df = pd.read_csv(path)
-    cols = [c.strip().lower() for c in df.columns]
-    df.columns = cols
-    if "year" not in df.columns:
-        for c in df.columns:
-            if c.startswith("year"):
-                df = df.rename(columns={c: "year"})
-                break
-    if "year" not in df.columns:
-        years = pd.to_datetime(df.index, errors="coerce").year
-        df = df.assign(year=years).reset_index(drop=True)
-
-    # choose value column
-    value_col = None
-    if "value" in df.columns:
-        value_col = "value"
-    elif indicator.lower() in df.columns:
-        value_col = indicator.lower()
-    else:
-        numeric_candidates = [c for c in df.columns if c != "year" and pd.api.types.is_numeric_dtype(df[c])]
-        if numeric_candidates:
-            value_col = numeric_candidates[0]
-    if value_col is None:
-        raise ValueError(f"No numeric value column in {path}. Need 'value' or '{indicator}'.")
-
-    out = df[["year", value_col]].dropna()
-    out = out.rename(columns={value_col: "value"})
-    out["year"] = pd.to_numeric(out["year"], errors="coerce").astype("Int64")
-    out = out.dropna(subset=["year"]).astype({"year": int})
-    out = out.sort_values("year").reset_index(drop=True)
-    return out
+    if store is None:
+        store = open_panel([indicator], DATA_DIR)
+    return store.year_value(indicator)
 
 
 def _coverage_for_alpha(qdf_ind: pd.DataFrame, truth: pd.DataFrame, origin: int, h: int, alpha: float) -> tuple[int, int]:
@@ -218,7 +194,16 @@ def main():
     ap.add_argument("--indicators", nargs="+", required=True, help="List of indicators included in the CSV")
     ap.add_argument("--h", type=int, default=15, help="Max scored horizon")
     ap.add_argument("--target_cov", type=float, default=0.90, help="Target middle coverage (e.g., 0.90)")
+    ap.add_argument("--vintage", action="store_true",
+                    help="Judge pre-origin history on the vintage known at each origin (vintage store); "
+                         "implied when configs/experiment.yml sets vintage_required")
+    ap.add_argument("--allow-latest-fallback", "--allow_latest_fallback", dest="allow_latest", action="store_true",
+                    help="With vintages, judge indicators that have no vintage <= origin on the latest "
+                         "processed data truncated at the origin (default: fail)")
     args = ap.parse_args()
+    if not args.vintage and vintage_required():
+        print("[calibrate_sigma] configs/experiment.yml sets vintage_required: using vintages (--vintage)")
+        args.vintage = True
 
     in_path = Path(args.in_path)
     out_path = Path(args.out_path)
@@ -231,6 +216,7 @@ def main():
     # --- per-indicator alpha search ---
     alphas: Dict[str, float] = {}
     scales_rows = []
+    store = open_panel([i for i in args.indicators if (DATA_DIR / f"{i}.csv").exists()], DATA_DIR)
 
     for ind in args.indicators:
         qdf_ind = qdf.loc[qdf["indicator"] == ind, ["indicator", "horizon", "q5", "q50", "q95"]].copy()
@@ -242,18 +228,21 @@ def main():
 
         # load truth
         try:
-            truth = _load_truth_series(ind)
+            truth = _load_truth_series(ind, store)
         except Exception:
             alphas[ind] = 1.0
             scales_rows.append(dict(indicator=ind, alpha=1.0, coverage_before=np.nan, coverage_after=np.nan))
             continue
 
         # require some pre-origin history in at least one origin
-        usable = False
-        for O in args.origins:
-            if (truth["year"] <= O).sum() >= MIN_HISTORY:
-                usable = True
-                break
+        if args.vintage:
+            usable = any(
+                int(load_indicator(ind, DATA_DIR, as_of=O, allow_latest=args.allow_latest).dropna().index.le(O).sum()) >= MIN_HISTORY
+                for O in args.origins
+            )
+        else:
+            j = store.column(ind)
+            usable = any(store.counts_upto(O)[j] >= MIN_HISTORY for O in args.origins)
         if not usable:
             alphas[ind] = 1.0
             scales_rows.append(dict(indicator=ind, alpha=1.0, coverage_before=np.nan, coverage_after=np.nan))
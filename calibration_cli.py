@@ -3,7 +3,6 @@ from pathlib import Path
 import argparse
 import numpy as np
 import pandas as pd
-from math import erf
 
 # --- Path setup: ensure model + utils importable ---
 REPO = Path(__file__).resolve().parent
@@ -12,28 +11,10 @@ HSM_DIR = REPO / "models" / "HSM_chatgpt"
 sys.path.insert(0, str(COMMON_DIR))
 sys.path.insert(0, str(HSM_DIR))
 
-from utils import load_indicator
+from models.common.distributions import concat, observed_values
+from models.common.utils import load_indicator
 from models.HSM_chatgpt.hsm import hsm_forecast
 
-# --- Normal CDF helpers (no SciPy) ---
-def _phi(z): 
-    return np.exp(-0.5 * z * z) / np.sqrt(2 * np.pi)
-
-def _Phi(z):
-    # vectorized standard normal CDF via math.erf
-    return 0.5 * (1.0 + np.vectorize(erf)(z / np.sqrt(2.0)))
-
-# Useful z-values
-Z05 = 1.6448536269514722
-Z25 = 0.6744897501960817
-
-def infer_mu_sigma(q5: float, q50: float, q95: float):
-    """Infer Gaussian mu≈q50, sigma from (q5, q95)."""
-    mu = float(q50)
-    spread = float(q95 - q5)
-    sigma = max(spread / (2 * Z05), 1e-6)  # since q95 - q5 = 2*z0.95*sigma
-    return mu, sigma
-
 def ks_uniform_D(pits: np.ndarray):
     """Kolmogorov–Smirnov D-statistic vs U(0,1), no SciPy."""
     # Sort and compare to i/(n)
@@ -46,63 +27,28 @@ def ks_uniform_D(pits: np.ndarray):
     D_minus = np.max(pits - (i - 1) / n)
     return float(max(D_plus, D_minus))
 
-def compute_calibration(indicators, origins, H=15, out_dir="eval/calibration", bins=10, plots=False):
+def compute_calibration(indicators, origins, H=15, out_dir="eval/calibration", bins=10, plots=False, cache=True):
     out_dir = Path(out_dir)
     out_dir.mkdir(parents=True, exist_ok=True)
 
-    rows_pit = []        # per (indicator, origin, h): pit
-    rows_cover = []      # per (indicator, origin, h): inside50, inside90
-
-    for origin in origins:
-        # get quantiles from HSM for this origin
-        qdict = hsm_forecast(indicators, origin, H)
-
-        for ind in indicators:
-            # observed values series (year-indexed, 'imputed' column in utils)
-            s = load_indicator(ind)
-
-            # quantiles for 1..H
-            qdf = qdict[ind]  # columns q5,q50,q95; index = horizon
-            for h in range(1, H + 1):
-                year = origin + h
-                if year not in s.index:
-                    continue  # no target
-
-                y = float(s.loc[year])
-                q5 = float(qdf.loc[h, "q5"])
-                q50 = float(qdf.loc[h, "q50"])
-                q95 = float(qdf.loc[h, "q95"])
-
-                mu, sigma = infer_mu_sigma(q5, q50, q95)
-
-                # PIT
-                z = (y - mu) / max(sigma, 1e-9)
-                pit = float(_Phi(z))
-                rows_pit.append({"indicator": ind, "origin": origin, "horizon": h, "year": year, "y": y, "mu": mu, "sigma": sigma, "pit": pit})
-
-                # Coverage checks:
-                # 50% nominal: [q25,q75]; 90% nominal: [q10,q90]
-                # derive from mu/sigma (Gaussian)
-                q25 = mu - Z25 * sigma
-                q75 = mu + Z25 * sigma
-                q10 = mu - (Z05 / 1.6448536269514722) * Z05 * sigma  # but Z10=1.28155..., compute directly:
-                Z10 = 1.2815515655446004
-                q10 = mu - Z10 * sigma
-                q90 = mu + Z10 * sigma
-
-                inside50 = int(q25 <= y <= q75)
-                inside90 = int(q10 <= y <= q90)
+    # Gaussian forecasts of every origin (mu, sigma from the model, not
+    # back-solved from quantiles); PIT and coverage over all rows at once
+    dist = concat(hsm_forecast(indicators, origin, H, cache=cache, dist=True) for origin in origins)
+    # observed values series (year-indexed)
+    y = observed_values(dist.keys, {ind: load_indicator(ind) for ind in dict.fromkeys(indicators)})
+    scored = ~np.isnan(y)  # no target otherwise
+    dist, y = dist.take(scored), y[scored]
+    keys = dist.keys.assign(year=dist.keys["origin"] + dist.keys["horizon"])
 
-                rows_cover.append({"indicator": ind, "origin": origin, "horizon": h, "year": year,
-                                   "inside50": inside50, "inside90": inside90})
+    # Coverage checks: 50% nominal [q25,q75]; 90% nominal [q05,q95]
+    pit_df = keys.assign(y=y, mu=dist.mu, sigma=dist.sigma, pit=dist.pit(y))
+    cover_df = keys.assign(inside50=dist.covers(y, 0.50).astype(int), inside90=dist.covers(y, 0.90).astype(int))
 
     # Save PIT values
-    pit_df = pd.DataFrame(rows_pit)
     pit_csv = out_dir / "pit_values.csv"
     pit_df.to_csv(pit_csv, index=False)
 
     # Coverage summary
-    cover_df = pd.DataFrame(rows_cover)
     def summarize_cover(df, name):
         if df.empty:
             return pd.DataFrame([{"indicator": name, "n": 0,
@@ -190,9 +136,12 @@ def main():
     ap.add_argument("--out_dir", type=str, default="eval/calibration", help="Output directory")
     ap.add_argument("--bins", type=int, default=10, help="PIT histogram bins")
     ap.add_argument("--plots", action="store_true", help="Save PNG plots")
+    ap.add_argument("--no-cache", "--no_cache", dest="no_cache", action="store_true",
+                    help="Refit every model instead of using the persistent fit cache (data/fit_cache)")
     args = ap.parse_args()
 
-    compute_calibration(args.indicators, args.origins, H=args.h, out_dir=args.out_dir, bins=args.bins, plots=args.plots)
+    compute_calibration(args.indicators, args.origins, H=args.h, out_dir=args.out_dir, bins=args.bins, plots=args.plots,
+                        cache=not args.no_cache)
 
 if __name__ == "__main__":
     main()
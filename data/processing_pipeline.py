@@ -1,65 +1,54 @@
 # data/processing_pipeline.py
+"""
+Raw -> processed build. Incremental: data/processed/_build_manifest.json records
+a sha256 per raw input and per processed output, so only changed inputs are
+re-ingested (in a process pool) into the native-frequency store
+(models/common/freq_store.py), which re-aggregates only the years whose
+observations changed, and only the rows/columns of changed series
+are recomputed in corr_matrix.csv and re-segmented in breaks.csv (change
+points, see models/common/changepoints.py). Gaps in processed series are filled
+by a Kalman smoother into `imputed` / `imputed_var` columns, cached by input
+hash (models/common/impute.py). New versions of processed series are recorded
+in the content-addressed series store (models/common/cas.py).
+Use --force to rebuild everything.
+"""
+import argparse
+import hashlib
+import json
+import os
+import sys
+from concurrent.futures import ProcessPoolExecutor
+
 import pandas as pd
-import numpy as np
 from pathlib import Path
 
+REPO = Path(__file__).resolve().parents[1]
+if str(REPO) not in sys.path:
+    sys.path.insert(0, str(REPO))
+
+from models.common.cas import get_series_store
+from models.common.changepoints import BREAKS_CSV, BREAK_COLUMNS, MEANVAR_MIN_SIZE, detect_breaks_many
+from models.common.freq_store import get_freq_store
+from models.common.impute import impute_processed
+from models.common.schema import read_processed
+
 RAW_DIR = Path("data/raw")
 PRO_DIR = Path("data/processed")
 ANNOT_MD = PRO_DIR / "annotations.md"
 CORR_CSV = PRO_DIR / "corr_matrix.csv"
+MANIFEST_JSON = PRO_DIR / "_build_manifest.json"
+MIN_SEGMENT = {"mean": 3, "meanvar": MEANVAR_MIN_SIZE}  # detect_breaks_many defaults
 
 PRO_DIR.mkdir(parents=True, exist_ok=True)
 
-def _annualize_to_rows(df: pd.DataFrame) -> pd.DataFrame:
-    """
-    Input: df with columns ['date','value'] (date-like, possibly multiple per year)
-    Output: tidy annual rows with columns ['date','value'] where date = Jan 1 of year.
-    """
-    df = df.copy()
-    df["date"] = pd.to_datetime(df["date"], errors="coerce")
-    df = df.dropna(subset=["date", "value"])
-    # Resample to Year-End, then normalize to Jan 1
-    s = df.set_index("date")["value"].resample("YE").mean()
-    out = (
-        s.reset_index()
-         .assign(date=lambda x: pd.to_datetime(x["date"].dt.year.astype(int).astype(str) + "-01-01"))
-         .rename(columns={"value": "value"})[["date", "value"]]
-         .sort_values("date", kind="stable")
-         .reset_index(drop=True)
-    )
-    # Ensure unique years (group by just in case and take mean)
-    out["year"] = out["date"].dt.year.astype(int)
-    out = (
-        out.groupby("year", as_index=False)["value"].mean()
-           .assign(date=lambda x: pd.to_datetime(x["year"].astype(str) + "-01-01"))
-           .drop(columns=["year"])
-           .sort_values("date", kind="stable")
-           .reset_index(drop=True)
-    )
-    return out
-
-def _detect_breaks_simple(values: np.ndarray) -> list[int]:
-    """
-    Lightweight break heuristic: |Δ| > 3 * median(|Δ|).
-    Returns list of break YEARS offsets (we’ll translate to calendar year upstream).
-    """
-    x = pd.Series(values).dropna().values
-    n = len(x)
-    if n <= 2:
-        return []
-    diffs = np.diff(x)
-    mad = np.median(np.abs(diffs)) if len(diffs) else 0.0
-    thr = 3.0 * (mad if mad > 0 else (np.std(diffs) if len(diffs) else 0.0))
-    if thr <= 0:
-        return []
-    idx = np.where(np.abs(diffs) > thr)[0] + 1  # jump locations (row indices)
-    return [int(i) for i in idx]
-
 def process_one_raw(path: Path) -> str | None:
     """
     Process a single raw CSV (requires columns ['date','value']).
-    Writes processed CSV as tidy `date,value` rows (one per year).
-    Returns annotation message.
+    The series is kept at its native frequency in the frequency store
+    (models/common/freq_store.py); the processed CSV is its annual mean view,
+    tidy `date,value` rows (one per year), plus `se` when the raw file has
+    standard errors (the se of each annual mean).
+    Returns annotation message (break years are added from breaks.csv in main()).
     """
     try:
         df = pd.read_csv(path, low_memory=False)
@@ -70,69 +59,85 @@ def process_one_raw(path: Path) -> str | None:
         return f"[SKIP] {path.name}: missing 'date' and 'value' columns"
 
     try:
-        annual = _annualize_to_rows(df)
-        # Break heuristic (convert row indices to years)
-        if len(annual) > 0:
-            br_idx = _detect_breaks_simple(annual["value"].to_numpy())
-            years = annual["date"].dt.year.to_numpy()
-            break_years = [int(years[i]) for i in br_idx if 0 <= i < len(years)]
-        else:
-            break_years = []
-
+        # native observations + incrementally maintained annual records; only
+        # the years whose observations changed are re-aggregated
+        store = get_freq_store()
+        store.ingest(path.stem, df)
+        annual = store.annual_rows(path.stem, "mean")
+        annual = annual[["value", "date"] + [c for c in ("se",) if c in annual]]  # column order of earlier builds
         out_path = PRO_DIR / path.name
-        annual.to_csv(out_path, index=False)  # always 'date,value' tidy format
-        return f"[OK] Processed {path.name} -> {out_path.name} | breaks: {break_years}"
+        annual.to_csv(out_path, index=False)  # always tidy value/date rows
+        return f"[OK] Processed {path.name} -> {out_path.name}"
     except Exception as e:
         return f"[ERROR] {path.name}: {e}"
 
 def _load_processed_flex(path: Path) -> pd.Series:
     """
-    Robust reader for processed files. Handles both tidy ('date,value') and legacy index CSVs.
+    Robust reader for processed files (tidy 'date,value', legacy index, or wide
+    with a year column), driven by the file's schema descriptor.
     Returns a Series indexed by YEAR (int) with unique index (mean if duplicates).
     """
-    df = pd.read_csv(path, low_memory=False)
-    if {"date", "value"}.issubset(df.columns):
-        # tidy path
-        df["date"] = pd.to_datetime(df["date"], errors="coerce")
-        df = df.dropna(subset=["date", "value"]).copy()
-        df["year"] = df["date"].dt.year.astype(int)
-        s = df.groupby("year", as_index=True)["value"].mean()
-        s.name = path.stem
-        return s
-    else:
-        # legacy path: assume first column is date index, second is 'value'
+    try:
+        df = read_processed(path)
+    except Exception as e:
+        raise ValueError(f"Cannot parse processed file {path.name}: {e}")
+    s = df["value"].dropna()
+    s = s.groupby(s.index.astype(int)).mean()
+    s.name = path.stem
+    return s
+
+def _sha256(path: Path) -> str:
+    h = hashlib.sha256()
+    with open(path, "rb") as f:
+        for chunk in iter(lambda: f.read(1 << 20), b""):
+            h.update(chunk)
+    return h.hexdigest()
+
+
+def _load_manifest() -> dict:
+    if MANIFEST_JSON.exists():
         try:
-            df = pd.read_csv(path, index_col=0)
-            # Try parse index to datetime; if fails, coerce to year
-            try:
-                idx_dt = pd.to_datetime(df.index, errors="coerce")
-                years = idx_dt.year
-            except Exception:
-                # If index already looks like years
-                years = pd.to_numeric(df.index, errors="coerce").astype("Int64")
-            s = pd.Series(df.iloc[:, 0].values, index=years, name=path.stem)
-            s = s.dropna()
-            # Group by year to ensure unique index
-            s = s.groupby(s.index.astype(int)).mean()
-            s.index = s.index.astype(int)
-            return s
-        except Exception as e:
-            raise ValueError(f"Cannot parse processed file {path.name}: {e}")
+            return json.loads(MANIFEST_JSON.read_text(encoding="utf-8"))
+        except ValueError:
+            print(f"[WARN] Ignoring unreadable manifest {MANIFEST_JSON}")
+    return {"raw": {}, "corr": {}, "breaks": {}}
 
-def build_corr_matrix():
-    """
-    Assemble all processed series into a single DataFrame indexed by YEAR (int),
-    then compute the Pearson correlation on overlapping years.
-    """
+
+def _save_manifest(manifest: dict) -> None:
+    tmp = MANIFEST_JSON.with_name(MANIFEST_JSON.name + ".tmp")
+    tmp.write_text(json.dumps(manifest, indent=2, sort_keys=True), encoding="utf-8")
+    os.replace(tmp, MANIFEST_JSON)
+
+
+def _series_files() -> list[Path]:
+    return sorted(f for f in PRO_DIR.glob("*.csv") if f.name not in (CORR_CSV.name, BREAKS_CSV.name))
+
+
+def _load_all_series() -> dict:
     series_dict = {}
-    for f in PRO_DIR.glob("*.csv"):
+    for f in _series_files():
         try:
             s = _load_processed_flex(f)
             if s is not None and len(s) > 0:
                 series_dict[f.stem] = s
         except Exception as e:
             print(f"[WARN] Skipping {f.name} for corr: {e}")
+    return series_dict
+
+
+def build_corr_matrix(manifest: dict | None = None, force: bool = False):
+    """
+    Assemble all processed series into a single DataFrame indexed by YEAR (int),
+    then compute the Pearson correlation on overlapping years.
+
+    When `manifest` records the processed hashes the current corr_matrix.csv was
+    built from, only rows/columns of series whose hash changed (or that were
+    added) are recomputed; dropped series are removed.
+    """
+    hashes = {f.stem: _sha256(f) for f in _series_files()}
+    prev = (manifest or {}).get("corr", {})
 
+    series_dict = _load_all_series()
     if not series_dict:
         return False
 
@@ -142,22 +147,158 @@ def build_corr_matrix():
     df = df.groupby(df.index).mean()
     df = df.sort_index()
 
-    corr = df.corr()
+    old = None
+    if not force and prev and CORR_CSV.exists():
+        try:
+            old = pd.read_csv(CORR_CSV, index_col=0)
+        except Exception as e:
+            print(f"[WARN] Rebuilding corr from scratch ({CORR_CSV.name} unreadable: {e})")
+
+    if old is None:
+        corr = df.corr()
+        print(f"[OK] Wrote correlation matrix: {CORR_CSV}")
+    else:
+        cols = df.columns.tolist()
+        changed = [c for c in cols if prev.get(c) != hashes.get(c) or c not in old.columns]
+        corr = old.reindex(index=cols, columns=cols)
+        for c in changed:
+            r = df.corrwith(df[c])
+            corr.loc[c, :] = r
+            corr.loc[:, c] = r
+        print(f"[OK] Updated correlation matrix for {len(changed)} changed series: {CORR_CSV}")
+
     corr.to_csv(CORR_CSV, index=True)
-    print(f"[OK] Wrote correlation matrix: {CORR_CSV}")
+    if manifest is not None:
+        manifest["corr"] = {c: hashes[c] for c in corr.columns if c in hashes}
     return True
 
+
+def build_breaks(manifest: dict | None = None, force: bool = False) -> pd.DataFrame:
+    """
+    Change points of every processed series (models.common.changepoints, mean
+    and mean-variance costs) in one batched call, written to breaks.csv.
+
+    As with the correlation matrix, when `manifest` records the processed
+    hashes breaks.csv was built from, only series whose hash changed (or that
+    were added) are re-segmented; rows of dropped series are removed.
+    Segmentations denser than MIN_SEGMENT allows for are left out.
+    """
+    hashes = {f.stem: _sha256(f) for f in _series_files()}
+    prev = (manifest or {}).get("breaks", {})
+
+    old = None
+    if not force and prev and BREAKS_CSV.exists():
+        try:
+            old = pd.read_csv(BREAKS_CSV)
+        except Exception as e:
+            print(f"[WARN] Rebuilding breaks from scratch ({BREAKS_CSV.name} unreadable: {e})")
+
+    changed = [c for c in hashes if old is None or prev.get(c) != hashes[c]]
+    series = {}
+    for c in changed:
+        try:
+            s = _load_processed_flex(PRO_DIR / f"{c}.csv")
+            if len(s) > 0:
+                series[c] = s
+        except Exception as e:
+            print(f"[WARN] Skipping {c}.csv for breaks: {e}")
+
+    breaks = detect_breaks_many(series)
+    # a series cut into segments averaging under twice the minimum length is
+    # more likely over-segmented than shifting that often: its rows are not written
+    dense = [(ind, cost) for (ind, cost), g in breaks.groupby(["indicator", "cost"])
+             if (len(g) + 1) * 2 * MIN_SEGMENT[cost] > len(series[ind])]
+    for ind, cost in dense:
+        n_breaks = int(((breaks["indicator"] == ind) & (breaks["cost"] == cost)).sum())
+        print(f"[WARN] {ind}: {n_breaks} {cost} breaks in {len(series[ind])} years; not written to {BREAKS_CSV.name}")
+        breaks = breaks[~((breaks["indicator"] == ind) & (breaks["cost"] == cost))]
+    if old is not None:
+        keep = old[old["indicator"].isin(hashes) & ~old["indicator"].isin(changed)][BREAK_COLUMNS]
+        if len(keep):
+            breaks = (pd.concat([keep, breaks], ignore_index=True)
+                        .sort_values(["indicator", "cost", "year"], kind="stable", ignore_index=True))
+    breaks.to_csv(BREAKS_CSV, index=False)
+    print(f"[OK] Wrote {len(breaks)} breaks ({len(series)} series re-segmented): {BREAKS_CSV}")
+    if manifest is not None:
+        kept = set(series) | ({c for c in hashes if c not in changed} if old is not None else set())
+        manifest["breaks"] = {c: hashes[c] for c in sorted(kept)}
+    return breaks
+
+
+def _build_one(path: Path) -> tuple[str, str | None, str | None]:
+    """Worker: process one raw file; returns (raw name, annotation, processed sha256)."""
+    msg = process_one_raw(path)
+    out_path = PRO_DIR / path.name
+    out_sha = _sha256(out_path) if (msg or "").startswith("[OK]") and out_path.exists() else None
+    return path.name, msg, out_sha
+
+
 def main():
-    annotations: list[str] = []
+    ap = argparse.ArgumentParser(description="Incremental raw -> processed build.")
+    ap.add_argument("--jobs", type=int, default=None, help="Worker processes (default: CPU count)")
+    ap.add_argument("--force", action="store_true", help="Ignore the build manifest and rebuild everything")
+    args = ap.parse_args()
+
+    manifest = {"raw": {}, "corr": {}, "breaks": {}} if args.force else _load_manifest()
+    raw_entries = manifest.setdefault("raw", {})
+
+    raw_paths = sorted(RAW_DIR.glob("*.csv"))
+    todo: list[Path] = []
+    raw_hashes = {}
+    for raw_path in raw_paths:
+        raw_hashes[raw_path.name] = _sha256(raw_path)
+        entry = raw_entries.get(raw_path.name)
+        out_path = PRO_DIR / raw_path.name
+        fresh = (
+            entry is not None
+            and entry.get("sha256") == raw_hashes[raw_path.name]
+            and (entry.get("output_sha256") is None
+                 or (out_path.exists() and _sha256(out_path) == entry["output_sha256"]))
+        )
+        if not fresh:
+            todo.append(raw_path)
+
+    print(f"[build] {len(todo)} of {len(raw_paths)} raw files changed")
+    if todo:
+        workers = 1 if len(todo) == 1 else args.jobs
+        if workers == 1:
+            results = [_build_one(p) for p in todo]
+        else:
+            with ProcessPoolExecutor(max_workers=workers) as pool:
+                results = list(pool.map(_build_one, todo))
+        for name, msg, out_sha in results:
+            if msg:
+                print(msg)
+            raw_entries[name] = {"sha256": raw_hashes[name], "output_sha256": out_sha, "message": msg}
+
+    # forget raw files that no longer exist
+    for name in [n for n in raw_entries if n not in raw_hashes]:
+        del raw_entries[name]
+
+    # imputed columns; rewritten files keep their raw entries fresh
+    for name, out_sha in impute_processed(_series_files(), PRO_DIR, force=args.force).items():
+        entry = raw_entries.get(f"{name}.csv")
+        if entry is not None and entry.get("output_sha256") is not None:
+            entry["output_sha256"] = out_sha
 
-    for raw_path in RAW_DIR.glob("*.csv"):
-        msg = process_one_raw(raw_path)
-        if msg:
-            print(msg)
-            annotations.append(msg)
+    # version history of processed series (content-addressed; unchanged files cost a stat)
+    new_versions = get_series_store().commit_many(_series_files(), message="processing_pipeline")
+    if new_versions:
+        print(f"[OK] Stored {len(new_versions)} new processed-series versions in the series store")
 
-    _ = build_corr_matrix()
+    _ = build_corr_matrix(manifest, force=args.force)
+    breaks = build_breaks(manifest, force=args.force)
+    _save_manifest(manifest)
 
+    mean_breaks = breaks[breaks["cost"] == "mean"].groupby("indicator")["year"].apply(list)
+    annotations = []
+    for p in raw_paths:
+        msg = raw_entries[p.name].get("message")
+        if not msg:
+            continue
+        if msg.startswith("[OK]"):
+            msg = msg.split(" | breaks:")[0] + f" | breaks: {mean_breaks.get(p.stem, [])}"
+        annotations.append(msg)
     ANNOT_MD.write_text(
         "# Data Annotations\n\n" + "\n".join(f"- {line}" for line in annotations) + "\n",
         encoding="utf-8",
@@ -13,7 +13,7 @@ FSM_DIR = REPO / "models" / "FSM_grok"
 sys.path.insert(0, str(COMMON_DIR))
 sys.path.insert(0, str(FSM_DIR))
 
-from utils import load_indicator
+from models.common.utils import load_indicator
 from models.FSM_grok.fsm import fsm_forecast
 
 # CRPS (Gaussian) - same as HSM evaluator
@@ -25,48 +25,20 @@ import numpy as np
 import pandas as pd
 from pathlib import Path
 
+from models.common.panel_store import PanelStore, open_panel
+
 DATA_DIR = Path("data/processed")
 MIN_HISTORY = 8
 Z05 = 1.6448536269514722  # Phi^{-1}(0.95)
 
 
-def _load_indicator_series(indicator: str) -> pd.DataFrame:
+def _load_indicator_series(indicator: str, store: PanelStore | None = None) -> pd.DataFrame:
     path = DATA_DIR / f"{indicator}.csv"
     if not path.exists():
         raise FileNotFoundError(f"Processed file not found for indicator '{indicator}': {path}")
-    df = pd.read_csv(path)
-    df.columns = [c.strip().lower() for c in df.columns]
-
-    if "year" not in df.columns:
-        # try to infer year from any year-like column or index
-        year_col = None
-        for c in df.columns:
-            if c.startswith("year"):
-                year_col = c
-                break
-        if year_col is not None:
-            df = df.rename(columns={year_col: "year"})
-        else:
-            years = pd.to_datetime(df.index, errors="coerce").year
-            df = df.assign(year=years).reset_index(drop=True)
-
-    # value column
-    value_col = None
-    if "value" in df.columns:
-        value_col = "value"
-    elif indicator.lower() in df.columns:
-        value_col = indicator.lower()
-    else:
-        numeric_candidates = [c for c in df.columns if c != "year" and pd.api.types.is_numeric_dtype(df[c])]
-        if numeric_candidates:
-            value_col = numeric_candidates[0]
-    if value_col is None:
-        raise ValueError(f"No numeric value column in {path}. Need 'value' or '{indicator}'.")
-
-    out = df[["year", value_col]].dropna().rename(columns={value_col: "value"})
-    out["year"] = pd.to_numeric(out["year"], errors="coerce").astype("Int64")
-    out = out.dropna(subset=["year"]).astype({"year": int}).sort_values("year").reset_index(drop=True)
-    return out
+    if store is None:
+        store = open_panel([indicator], DATA_DIR)
+    return store.year_value(indicator)
 
 
 @dataclass
@@ -152,8 +124,9 @@ def fsm_forecast(indicators: List[str], origin: int, h_scored: int = 15, h_scena
     rows_scored: List[Dict] = []
     rows_scen: List[Dict] = []
 
+    store = open_panel([i for i in indicators if (DATA_DIR / f"{i}.csv").exists()], DATA_DIR)
     for ind in indicators:
-        df = _load_indicator_series(ind)
+        df = _load_indicator_series(ind, store)
         df_tr = df[df["year"] <= origin]
         if len(df_tr) < MIN_HISTORY:
             # not enough history, skip quietly
@@ -7,6 +7,8 @@ import pandas as pd
 from scipy.stats import poisson, t
 from copulae import GaussianCopula
 
+from models.common.comoments import origin_corr
+from models.common.transforms import origin_transforms
 from models.common.utils import make_origin_panel, save_quantiles_csv
 
 def fsm_forecast(
@@ -20,15 +22,13 @@ def fsm_forecast(
 ) -> Dict[str, Dict[str, Dict[int, Dict[str, float]]]]:
     """Simulate indicator paths with random walk and shocks, ECC post-processed."""
     print(f"[DEBUG] Starting fsm_forecast for origin {origin_year}")
-    panel = make_origin_panel(indicators, origin_year, min_len=8)
+    panel = make_origin_panel(indicators, origin_year, min_len=8, imputed=True)
     data = pd.DataFrame({ind: s for ind, s in panel.items()}).dropna(how='any')
     print(f"[DEBUG] Data shape after dropna: {data.shape}")
     
-    # Normalize data
-    means = data.mean()
-    stds = data.std()
-    data_normalized = (data - means) / stds
-    print(f"[DEBUG] Normalized data means: {means}, stds: {stds}")
+    # Transform, winsorize and standardize within the training window (configs/indicator_transform_spec.yml)
+    tf = origin_transforms(data.columns, origin_year)
+    data_normalized = tf.forward(data)
     
     # Estimate drifts and volatilities, handle NaN and enforce minimum volatility
     drifts = data_normalized.diff().mean().fillna(0.0)
@@ -41,10 +41,9 @@ def fsm_forecast(
     paths_scenario = np.zeros((len(indicators), n_paths, H_scenario))
     
     for i, ind in enumerate(indicators):
-        mu = means[ind]
         sigma = volatilities[ind]
         last_observed = data_normalized[ind].iloc[-1]
-        print(f"[DEBUG] Processing indicator {ind}, mu={mu}, sigma={sigma}, last_observed={last_observed}")
+        print(f"[DEBUG] Processing indicator {ind}, sigma={sigma}, last_observed={last_observed}")
         for j in range(n_paths):
             print(f"[DEBUG] Simulation path {j} for {ind}")
             x = last_observed
@@ -53,9 +52,9 @@ def fsm_forecast(
                 s = t.rvs(t_df, scale=sigma) if poisson.rvs(lam) > 0 else 0.0
                 x = x + drifts[ind] + eps + s
                 if h < H_scored:
-                    paths_scored[i, j, h] = mu + stds[ind] * x
+                    paths_scored[i, j, h] = x
                 if h < H_scenario:
-                    paths_scenario[i, j, h] = mu + stds[ind] * x
+                    paths_scenario[i, j, h] = x
     print(f"[DEBUG] Simulation completed, paths_scored shape: {paths_scored.shape}")
 
     # Quantiles
@@ -75,11 +74,13 @@ def fsm_forecast(
                 "q50": float(np.quantile(p, 0.50)),
                 "q95": float(np.quantile(p, 0.95)),
             }
+    # paths live on the transformed scale; quantiles map back through the inverse transform
+    res = {key: tf.inverse_quantiles(q) for key, q in res.items()}
 
     # ECC post-processing
     print("[DEBUG] Starting ECC post-processing")
-    corr = pd.read_csv("data/processed/corr_matrix.csv", index_col=0)
-    corr = corr.loc[indicators, indicators]
+    # correlations from years <= origin only (pairs without overlap -> 0)
+    corr = origin_corr(indicators, origin_year).fillna(0.0)
     copula = GaussianCopula(dim=len(indicators))
     print(f"[DEBUG] Copula dim: {copula.dim}, Correlation matrix shape: {corr.shape}")
     sample_data = np.random.multivariate_normal(mean=np.zeros(len(indicators)), cov=corr.values, size=1000)
@@ -1,113 +1,551 @@
 # models/HSM_chatgpt/hsm.py
 
 from __future__ import annotations
+import json
 import os
+from concurrent.futures import ProcessPoolExecutor
 from pathlib import Path
-from typing import List, Dict
+from typing import Dict, Iterable, List, Tuple
 
 import numpy as np
 import pandas as pd
+import statsmodels
 from statsmodels.tsa.statespace.structural import UnobservedComponents
 
+from models.common.distributions import GaussianForecast
+from models.common.fit_cache import FitCache, get_fit_cache, series_hash
+from models.common.panel_store import PanelStore, open_panel
+from models.common import ucm_online
+from models.common.ucm_engine import GRID as _NUMPY_GRID, TOL as _NUMPY_TOL, fit_forecast_many, fit_local_level
+from models.common.utils import load_indicator, load_indicator_se
+
 # ↓↓↓ Lower this so we don't skip everything
 MIN_HISTORY = 5
 DATA_DIR = Path("data/processed")
+# filtered states for online updating (hsm_forecast_online), one JSON per backend
+STATE_DIR = Path("data/hsm_state")
+# "statsmodels": UnobservedComponents per fit; "numpy": models.common.ucm_engine,
+# all fits of a call batched together (same model and outputs)
+BACKENDS = ("statsmodels", "numpy")
+# model spec per backend, part of every fit-cache key (models.common.fit_cache):
+# bump HSM_SPEC_VERSION whenever the fit or its outputs change
+HSM_SPEC_VERSION = 2
+_SPECS = {
+    "statsmodels": f"hsm{HSM_SPEC_VERSION} UnobservedComponents(level='local level', trend=True) "
+                   f"statsmodels={statsmodels.__version__}",
+    "numpy": f"hsm{HSM_SPEC_VERSION} ucm_engine local level grid={len(_NUMPY_GRID)} tol={_NUMPY_TOL}",
+}
+# log-likelihood gain over the statsmodels optimum that makes _fit_ucm_and_forecast
+# refit from the ucm_engine estimate
+SEED_LLF_TOL = 1e-6
+# backend_parity(): largest |q50 difference| / q95-q05 width and |width ratio - 1| counted as agreement
+PARITY_TOL = 1e-3
+
+def _spec(backend: str, s2_known: float | None) -> str:
+    return _SPECS[backend] if s2_known is None else f"{_SPECS[backend]} sigma2.irregular={s2_known!r}"
+
 
-def _load_indicator_series(indicator: str) -> pd.DataFrame:
+def _load_indicator_series(indicator: str, store: PanelStore | None = None) -> pd.DataFrame:
     path = DATA_DIR / f"{indicator}.csv"
     if not path.exists():
         raise FileNotFoundError(f"Processed file not found for indicator '{indicator}': {path}")
+    if store is None:
+        store = open_panel([indicator], DATA_DIR)
+    return store.year_value(indicator)
 
-    df = pd.read_csv(path)
-
-    # normalize column names
-    cols = [c.strip().lower() for c in df.columns]
-    df.columns = cols
-
-    if "year" not in df.columns:
-        for c in df.columns:
-            if c.startswith("year"):
-                df.rename(columns={c: "year"}, inplace=True)
-                break
-        if "year" not in df.columns:
-            years = pd.to_datetime(df.index, errors="coerce").year
-            df = df.assign(year=years).reset_index(drop=True)
-
-    value_col = None
-    if "value" in df.columns:
-        value_col = "value"
-    elif indicator.lower() in df.columns:
-        value_col = indicator.lower()
-    else:
-        numeric_candidates = [c for c in df.columns if c != "year" and pd.api.types.is_numeric_dtype(df[c])]
-        if numeric_candidates:
-            value_col = numeric_candidates[0]
-
-    if value_col is None:
-        raise ValueError(
-            f"Could not find a numeric value column in {path}. "
-            f"Expected 'value' or '{indicator}', or a single numeric column."
-        )
-
-    out = df[["year", value_col]].dropna()
-    out.rename(columns={value_col: "value"}, inplace=True)
-    out["year"] = pd.to_numeric(out["year"], errors="coerce").astype("Int64")
-    out = out.dropna(subset=["year"]).astype({"year": int})
-    out = out.sort_values("year").reset_index(drop=True)
-    return out
-
-def _fit_ucm_and_forecast(y: pd.Series, h: int) -> Dict[str, np.ndarray]:
+def _dense_endog(y: pd.Series) -> np.ndarray:
     y = pd.to_numeric(y, errors="coerce").astype(float)
     y = y.dropna()
-    mod = UnobservedComponents(endog=y, level="local level", trend=True)
-    res = mod.fit(disp=False)
+    # one state step per calendar year: missing years stay in the sample as
+    # NaN (skipped by the Kalman filter) rather than being collapsed
+    years = np.asarray(y.index, dtype=np.int64)
+    return pd.Series(y.to_numpy(), index=years).reindex(np.arange(years.min(), years.max() + 1)).to_numpy()
+
+
+def _gaussian_quantiles(mu: np.ndarray, var_pred_mean: np.ndarray, sigma2_irreg: float) -> Dict[str, np.ndarray]:
+    var = np.clip(var_pred_mean + sigma2_irreg, 1e-12, None)
+    sigma = np.sqrt(var)
+
+    z05 = 1.6448536269514722  # Phi^{-1}(0.95)
+    q50 = mu
+    q95 = mu + z05 * sigma
+    q05 = mu - z05 * sigma
+
+    return dict(mu=mu, sigma=sigma, q05=q05, q50=q50, q95=q95)
+
+
+def _known_irregular(ind: str, y: pd.Series) -> float | None:
+    """
+    Mean squared standard error of the training years that have one (the
+    processed file's se column), used as the known irregular variance;
+    None when the indicator has no standard errors.
+    """
+    se = load_indicator_se(ind, DATA_DIR)
+    se = se[se.index.isin(y.index)]
+    return float(np.mean(np.square(se.to_numpy()))) if len(se) else None
+
+
+def _fit_ucm_and_forecast(y: pd.Series, h: int, start_params: np.ndarray | None = None,
+                          s2_known: float | None = None) -> Dict[str, np.ndarray]:
+    """
+    Fit the UCM and forecast h steps. With start_params (e.g. the previous
+    origin's estimates) the optimizer is warm-started; if that fit does not
+    converge it is redone from statsmodels' default start. When the
+    ucm_engine estimate (what backend="numpy" returns) has a higher
+    likelihood than the optimum found, the fit is redone from it, so both
+    backends end at the same maximum. With s2_known,
+    sigma2.irregular is fixed at that value and only sigma2.level is
+    estimated. The result also carries the fitted params and optimizer
+    counts (iterations, fcalls, warm, seeded).
+    """
+    endog = _dense_endog(y)
+    mod = UnobservedComponents(endog=endog, level="local level", trend=True)
+    fixed = {} if s2_known is None else {"sigma2.irregular": s2_known}
+    free = [i for i, k in enumerate(mod.param_names) if k not in fixed]
+
+    def fit(start=None):
+        if fixed:
+            return mod.fit_constrained(fixed, start_params=None if start is None else start[free], disp=False)
+        return mod.fit(start_params=start, disp=False)
+
+    iterations = fcalls = 0
+    res = None
+    if start_params is not None and len(start_params) == len(mod.param_names):
+        res = fit(np.asarray(start_params, dtype=float))
+        iterations += int(res.mle_retvals.get("iterations", 0))
+        fcalls += int(res.mle_retvals.get("fcalls", 0))
+        if not res.mle_retvals.get("converged", True):
+            res = None
+    warm = res is not None
+    if res is None:
+        res = fit()
+        iterations += int(res.mle_retvals.get("iterations", 0))
+        fcalls += int(res.mle_retvals.get("fcalls", 0))
+
+    # the quasi-Newton search can stop on a boundary (e.g. sigma2.level -> 0)
+    # below the maximum; ucm_engine's grid over the variance ratio does not,
+    # so refit from its estimate whenever that scores higher
+    seed = fit_local_level([endog], None if s2_known is None else [s2_known])
+    seed_params = np.array([seed["sigma2_irregular"][0], seed["sigma2_level"][0]])
+    seeded = False
+    if mod.loglike(seed_params) > mod.loglike(res.params) + SEED_LLF_TOL:
+        alt = fit(seed_params)
+        iterations += int(alt.mle_retvals.get("iterations", 0))
+        fcalls += int(alt.mle_retvals.get("fcalls", 0))
+        if mod.loglike(alt.params) > mod.loglike(res.params):
+            res, seeded = alt, True
 
     fcast = res.get_forecast(steps=h)
     mu = np.asarray(fcast.predicted_mean, dtype=float)
     var_mean = np.asarray(fcast.var_pred_mean, dtype=float)
 
     sigma2_irreg = 0.0
-    for k, v in res.params.items():
+    for k, v in zip(mod.param_names, np.asarray(res.params)):
         if "sigma2.irregular" in k:
             sigma2_irreg = float(v)
             break
 
-    var = np.clip(var_mean + sigma2_irreg, 1e-12, None)
-    sigma = np.sqrt(var)
+    return dict(**_gaussian_quantiles(mu, var_mean, sigma2_irreg), var_mean=var_mean, sigma2_irreg=sigma2_irreg,
+                params=np.asarray(res.params, dtype=float),
+                converged=bool(res.mle_retvals.get("converged", True)), warm=warm, seeded=seeded,
+                iterations=iterations, fcalls=fcalls)
 
-    z05 = 1.6448536269514722  # Phi^{-1}(0.95)
-    q50 = mu
-    q95 = mu + z05 * sigma
-    q05 = mu - z05 * sigma
 
-    return dict(mu=mu, sigma=sigma, q05=q05, q50=q50, q95=q95)
+def _fit_numpy_batch(ys: List[pd.Series], h: int,
+                     s2_known: List[float | None] | None = None) -> List[Dict[str, np.ndarray]]:
+    """The same fits and outputs as _fit_ucm_and_forecast, all series in one models.common.ucm_engine batch."""
+    if not ys:
+        return []
+    fixed = None if s2_known is None else [np.nan if v is None else v for v in s2_known]
+    fit = fit_forecast_many([_dense_endog(y) for y in ys], h, fixed)
+    out = []
+    for j in range(len(ys)):
+        s2_irr, s2_lvl = float(fit["sigma2_irregular"][j]), float(fit["sigma2_level"][j])
+        out.append(dict(**_gaussian_quantiles(fit["mu"][j], fit["var"][j], s2_irr), var_mean=fit["var"][j],
+                        sigma2_irreg=s2_irr, params=np.array([s2_irr, s2_lvl]), converged=bool(fit["converged"][j]), warm=False,
+                        iterations=int(fit["iterations"][j]),
+                        fcalls=len(_NUMPY_GRID) + int(fit["iterations"][j]) + 1))
+    return out
+
+
+def _cache_key(ind: str, origin: int, y: pd.Series, backend: str, s2_known: float | None = None) -> Dict:
+    return FitCache.make_key(ind, origin, series_hash(y.index, y.to_numpy()), _spec(backend, s2_known))
+
+
+def _to_cache(fc: Dict) -> Dict:
+    return {k: fc[k] for k in ("mu", "var_mean", "sigma2_irreg", "params", "converged")}
 
-def hsm_forecast(indicators: List[str], origin: int, h: int = 15) -> pd.DataFrame:
+
+def _from_cache(payload: Dict | None, h: int) -> Dict | None:
+    """A fit result rebuilt from a cache payload (None if absent or shorter than h)."""
+    if payload is None or len(payload["mu"]) < h:
+        return None
+    mu = np.asarray(payload["mu"][:h], dtype=float)
+    var_mean = np.asarray(payload["var_mean"][:h], dtype=float)
+    s2 = float(payload["sigma2_irreg"])
+    return dict(**_gaussian_quantiles(mu, var_mean, s2), var_mean=var_mean, sigma2_irreg=s2,
+                params=np.asarray(payload["params"], dtype=float), converged=bool(payload["converged"]),
+                warm=False, iterations=0, fcalls=0, cached=True)
+
+
+def _training_series(ind: str, origin: int, store: PanelStore | None, as_of: int | None,
+                     allow_latest: bool = False) -> pd.Series:
+    if as_of is None:
+        df = _load_indicator_series(ind, store)
+    else:
+        s = load_indicator(ind, DATA_DIR, as_of=as_of, allow_latest=allow_latest).dropna()
+        df = pd.DataFrame({"year": s.index.astype(int), "value": s.to_numpy()})
+    return df[df["year"] <= origin].set_index("year")["value"]
+
+
+def _forecast_rows(ind: str, fc: Dict[str, np.ndarray], h: int) -> List[Dict]:
+    return [dict(indicator=ind, horizon=k, q05=float(fc["q05"][k - 1]), q50=float(fc["q50"][k - 1]),
+                 q95=float(fc["q95"][k - 1]), mu=float(fc["mu"][k - 1]), sigma=float(fc["sigma"][k - 1]))
+            for k in range(1, h + 1)]
+
+
+def _fit_stats(origin: int, ind: str, fc: Dict) -> Dict:
+    return {"origin": origin, "indicator": ind, "cached": fc.get("cached", False), "warm": fc["warm"],
+            "converged": fc["converged"], "iterations": fc["iterations"], "fcalls": fc["fcalls"]}
+
+
+def _fit_chain(task: Tuple[str, List[Tuple[int, pd.Series, float | None]], int, bool]) -> List[Tuple]:
+    """
+    Worker: every origin of one indicator, in origin order, each fit
+    warm-started from the last converged one (when `warm`). Failures are
+    returned, not raised: [(origin, indicator, fit, error, stats)].
+    """
+    ind, slices, h, warm = task
+    out, prev = [], None
+    for origin, y, s2_known in slices:
+        try:
+            fc = _fit_ucm_and_forecast(y, h=h, start_params=prev if warm else None, s2_known=s2_known)
+        except Exception as e:
+            out.append((origin, ind, None, f"{type(e).__name__}: {e}", None))
+            continue
+        if fc["converged"]:
+            prev = fc["params"]
+        out.append((origin, ind, fc, None, _fit_stats(origin, ind, fc)))
+    return out
+
+
+def hsm_forecast(indicators: List[str], origin: int, h: int = 15, as_of: int | None = None,
+                 backend: str = "statsmodels", cache: bool = True, dist: bool = False,
+                 allow_latest: bool = False):
+    """
+    Fit one UCM per indicator on data <= origin and forecast h steps.
+    as_of=YYYY trains on the vintage known at YYYY (see models.common.vintages)
+    instead of the latest processed data; an indicator without one raises
+    KeyError unless allow_latest=True. backend="numpy" fits all
+    indicators together with models.common.ucm_engine.
+
+    The two backends estimate the same model but optimize differently:
+    statsmodels' quasi-Newton search could stop on a boundary below the
+    maximum (unemployment_rate at origin 1985 ended with sigma2.level = 0,
+    q50 0.92 off the numpy fit and 0.77-1.71x its widths), so its fits are
+    redone from the ucm_engine estimate when that scores higher (see
+    _fit_ucm_and_forecast). They then agree to optimizer tolerance;
+    backend_parity() checks that over a set of origins.
+
+    Indicators whose processed file has standard errors (se column, e.g.
+    survey indicators) are fitted with the irregular variance fixed at the
+    training years' mean se^2, so sampling noise is not estimated as
+    level movement; only sigma2.level is estimated for them.
+
+    Fits are looked up in / stored to the persistent fit cache
+    (models.common.fit_cache), keyed by indicator, origin, a hash of the
+    training slice and the backend's model spec; cache=False refits
+    everything and leaves the cache untouched.
+
+    dist=True returns the forecasts as a models.common.distributions
+    GaussianForecast (keys indicator, origin, horizon; mu, sigma) instead of
+    the q05/q50/q95 frame.
+    """
+    if backend not in BACKENDS:
+        raise ValueError(f"Unknown backend {backend!r} (expected one of {BACKENDS})")
     rows = []
+    store = open_panel([i for i in indicators if (DATA_DIR / f"{i}.csv").exists()], DATA_DIR)
+    fit_cache = get_fit_cache() if cache else None
+    train, keys, fcs, known = [], {}, {}, {}
     for ind in indicators:
-        df = _load_indicator_series(ind)
-        df_train = df[df["year"] <= origin].copy()
-        if len(df_train) < MIN_HISTORY:
-            print(f"[HSM] skip {ind}: insufficient history up to {origin} (have={len(df_train)}, need>={MIN_HISTORY})")
+        y = _training_series(ind, origin, store, as_of, allow_latest)
+        if len(y) < MIN_HISTORY:
+            print(f"[HSM] skip {ind}: insufficient history up to {origin} (have={len(y)}, need>={MIN_HISTORY})")
             continue
+        train.append((ind, y))
+        known[ind] = _known_irregular(ind, y)
+        if fit_cache is not None:
+            keys[ind] = _cache_key(ind, origin, y, backend, known[ind])
+            fc = _from_cache(fit_cache.get(keys[ind]), h)
+            if fc is not None:
+                fcs[ind] = fc
+
+    todo = [(ind, y) for ind, y in dict(train).items() if ind not in fcs]
+    if backend == "numpy":
+        fitted = _fit_numpy_batch([y for _, y in todo], h, [known[ind] for ind, _ in todo])
+    else:
+        fitted = (_fit_ucm_and_forecast(y, h=h, s2_known=known[ind]) for ind, y in todo)
+    for (ind, _), fc in zip(todo, fitted):
+        fcs[ind] = fc
+        if fit_cache is not None:
+            fit_cache.put(keys[ind], _to_cache(fc))
 
-        y = df_train.set_index("year")["value"]
-        fc = _fit_ucm_and_forecast(y, h=h)
-        for k in range(1, h + 1):
-            rows.append(
-                dict(
-                    indicator=ind,
-                    horizon=k,
-                    q05=float(fc["q05"][k - 1]),
-                    q50=float(fc["q50"][k - 1]),
-                    q95=float(fc["q95"][k - 1]),
-                )
-            )
-
-        print(f"[HSM] ok {ind}: wrote {h} horizons (last train year <= {origin})")
+    for ind, _ in train:
+        fc = fcs[ind]
+        rows.extend(_forecast_rows(ind, fc, h))
 
+        print(f"[HSM] ok {ind}: wrote {h} horizons (last train year <= {origin}){' [cached]' if fc.get('cached') else ''}")
+    if fit_cache is not None:
+        print(f"[HSM] fit cache: {len(fcs) - len(todo)} hits, {len(todo)} fitted")
+
+    out = pd.DataFrame(rows, columns=["indicator", "horizon", "q05", "q50", "q95", "mu", "sigma"])
+    if out.empty:
+        print("[HSM] WARNING: produced no rows (all indicators skipped).")
+    if dist:
+        return GaussianForecast(out.assign(origin=origin), out["mu"], out["sigma"])
     # NOTE: keep q05 here to match your existing files
-    out = pd.DataFrame(rows, columns=["indicator", "horizon", "q05", "q50", "q95"])
+    return out[["indicator", "horizon", "q05", "q50", "q95"]]
+
+
+def hsm_forecast_many(indicators: Iterable[str], origins: Iterable[int], h: int = 15, vintage: bool = False,
+                      jobs: int | None = None, warm_start: bool = True, backend: str = "statsmodels",
+                      cache: bool = True, dist: bool = False, allow_latest: bool = False):
+    """
+    hsm_forecast for every (origin, indicator) pair, with the work spread
+    over a process pool (`jobs` workers, default CPU count; 1 runs
+    in-process). Each indicator's origins are fitted in order in one worker,
+    each fit starting from the previous origin's parameters (warm_start).
+
+    Returns one tidy frame [origin, indicator, horizon, q05, q50, q95] sorted
+    by origin, then indicator in the order given, then horizon, whatever
+    order the fits finish in. A fit that raises does not stop the batch: it
+    is reported and listed in out.attrs["failures"] as
+    {origin, indicator, error} records. out.attrs["fit_stats"] holds one
+    {origin, indicator, cached, warm, converged, iterations, fcalls} record
+    per fit. vintage=True trains each origin on the vintage known at that
+    origin; pairs without one fail (see failures) unless allow_latest=True.
+    backend="numpy" fits every (origin, indicator) pair in one
+    in-process models.common.ucm_engine batch instead (no pool, no warm
+    starts needed).
+
+    As in hsm_forecast, pairs found in the fit cache are not refitted
+    (cache=False bypasses it). A cached fit is reused whichever start
+    values produced it. dist=True returns a GaussianForecast as in
+    hsm_forecast (failures and fit_stats then in its `attrs`).
+    """
+    if backend not in BACKENDS:
+        raise ValueError(f"Unknown backend {backend!r} (expected one of {BACKENDS})")
+    indicators = list(dict.fromkeys(indicators))
+    origins = sorted(set(int(o) for o in origins))
+    store = open_panel([i for i in indicators if (DATA_DIR / f"{i}.csv").exists()], DATA_DIR)
+    fit_cache = get_fit_cache() if cache else None
+
+    tasks, failures, results, keys = [], [], [], {}
+    for ind in indicators:
+        slices = []
+        for origin in origins:
+            try:
+                y = _training_series(ind, origin, store, origin if vintage else None, allow_latest)
+            except Exception as e:
+                print(f"[HSM] FAILED {ind} @ {origin}: {type(e).__name__}: {e}")
+                failures.append({"origin": origin, "indicator": ind, "error": f"{type(e).__name__}: {e}"})
+                continue
+            if len(y) < MIN_HISTORY:
+                print(f"[HSM] skip {ind} @ {origin}: insufficient history (have={len(y)}, need>={MIN_HISTORY})")
+                continue
+            s2_known = _known_irregular(ind, y)
+            if fit_cache is not None:
+                keys[(origin, ind)] = _cache_key(ind, origin, y, backend, s2_known)
+                fc = _from_cache(fit_cache.get(keys[(origin, ind)]), h)
+                if fc is not None:
+                    results.append((origin, ind, fc, None, _fit_stats(origin, ind, fc)))
+                    continue
+            slices.append((origin, y, s2_known))
+        if slices:
+            tasks.append((ind, slices, h, warm_start))
+
+    n_fits = sum(len(t[1]) for t in tasks)
+    workers = max(1, min(jobs if jobs is not None else (os.cpu_count() or 1), len(tasks)))
+    n_cached = len(results)
+    head = f"[HSM] {n_fits} fits, {n_cached} cached ({len(origins)} origins x {len(indicators)} indicators)"
+    if not tasks:
+        print(head)
+        fitted = []
+    elif backend == "numpy":
+        print(f"{head}, numpy batch")
+        pairs = [(origin, ind) for ind, slices, _, _ in tasks for origin, _, _ in slices]
+        fcs = _fit_numpy_batch([y for _, slices, _, _ in tasks for _, y, _ in slices], h,
+                               [s2 for _, slices, _, _ in tasks for _, _, s2 in slices])
+        fitted = [(origin, ind, fc, None, _fit_stats(origin, ind, fc)) for (origin, ind), fc in zip(pairs, fcs)]
+    elif workers == 1:
+        print(f"{head}, 1 worker")
+        fitted = [r for t in tasks for r in _fit_chain(t)]
+    else:
+        print(f"{head}, {workers} workers")
+        with ProcessPoolExecutor(max_workers=workers) as pool:
+            fitted = [r for chain in pool.map(_fit_chain, tasks) for r in chain]
+
+    rows, stats = [], []
+    for origin, ind, fc, err, st in results + fitted:
+        if err is not None:
+            print(f"[HSM] FAILED {ind} @ {origin}: {err}")
+            failures.append({"origin": origin, "indicator": ind, "error": err})
+            continue
+        if fit_cache is not None and not fc.get("cached"):
+            fit_cache.put(keys[(origin, ind)], _to_cache(fc))
+        rows.extend({"origin": origin, **r} for r in _forecast_rows(ind, fc, h))
+        stats.append(st)
+
+    out = pd.DataFrame(rows, columns=["origin", "indicator", "horizon", "q05", "q50", "q95", "mu", "sigma"])
+    order = {ind: i for i, ind in enumerate(indicators)}
+    out = (out.assign(_ind=out["indicator"].map(order))
+              .sort_values(["origin", "_ind", "horizon"], kind="stable", ignore_index=True)
+              .drop(columns="_ind"))
+    if dist:
+        out = GaussianForecast(out, out["mu"], out["sigma"])
+    else:
+        out = out.drop(columns=["mu", "sigma"])
+    out.attrs["failures"] = failures
+    out.attrs["fit_stats"] = sorted(stats, key=lambda r: (r["origin"], order[r["indicator"]]))
+    n_warm = sum(r["warm"] for r in stats)
+    n_iter, n_calls = sum(r["iterations"] for r in stats), sum(r["fcalls"] for r in stats)
+    print(f"[HSM] {len(stats)} fits ok ({n_cached} from cache, {n_warm} warm-started), {len(failures)} failed; "
+          f"{n_iter} optimizer iterations, {n_calls} likelihood evaluations")
+    return out
+
+
+def backend_parity(indicators: Iterable[str], origins: Iterable[int], h: int = 15, vintage: bool = False,
+                   allow_latest: bool = False, tol: float = PARITY_TOL) -> pd.DataFrame:
+    """
+    Fit every (origin, indicator) pair with both backends (no fit cache) and
+    compare the forecasts: one row per pair with the largest |q50 difference|
+    relative to the statsmodels q05-q95 width (dq50), the smallest and
+    largest statsmodels / numpy width ratio over the horizons, and ok when
+    both are within tol. The backends fit the same model; a pair that is
+    not ok means one optimizer stopped short of the maximum.
+    """
+    kw = dict(h=h, vintage=vintage, jobs=1, warm_start=False, cache=False, allow_latest=allow_latest)
+    keys = ["origin", "indicator", "horizon"]
+    sm = hsm_forecast_many(indicators, origins, backend="statsmodels", **kw)
+    nb = hsm_forecast_many(indicators, origins, backend="numpy", **kw)
+    both = sm.merge(nb, on=keys, suffixes=("_sm", "_np"))
+    width_sm, width_np = both["q95_sm"] - both["q05_sm"], both["q95_np"] - both["q05_np"]
+    both = both.assign(dq50=(both["q50_sm"] - both["q50_np"]).abs() / width_sm, ratio=width_sm / width_np)
+    out = (both.groupby(["origin", "indicator"], sort=False)
+               .agg(dq50=("dq50", "max"), width_ratio_min=("ratio", "min"), width_ratio_max=("ratio", "max"))
+               .reset_index())
+    out["ok"] = ((out["dq50"] <= tol) & ((out["width_ratio_min"] - 1).abs() <= tol)
+                 & ((out["width_ratio_max"] - 1).abs() <= tol))
+    print(f"[HSM] backend parity: {int(out['ok'].sum())} of {len(out)} (origin, indicator) pairs agree "
+          f"within {tol:g}")
+    return out
+
+
+def _load_states(path: Path) -> Dict:
+    if path.exists():
+        try:
+            return json.loads(path.read_text(encoding="utf-8"))
+        except ValueError:
+            print(f"[HSM] Ignoring unreadable state file {path}")
+    return {}
+
+
+def _save_states(path: Path, states: Dict) -> None:
+    path.parent.mkdir(parents=True, exist_ok=True)
+    tmp = path.with_name(path.name + ".tmp")
+    tmp.write_text(json.dumps(states, indent=1, sort_keys=True), encoding="utf-8")
+    os.replace(tmp, path)
+
+
+def hsm_forecast_online(indicators: List[str], origin: int, h: int = 15, backend: str = "statsmodels",
+                        refit_every: int = ucm_online.REFIT_EVERY, alpha: float = ucm_online.DRIFT_ALPHA,
+                        state_dir: Path | None = None, dist: bool = False):
+    """
+    hsm_forecast that keeps each indicator's filtered level and variance in
+    STATE_DIR/<backend>.json and, when new years (<= origin) have arrived
+    since the last call, assimilates them with one Kalman step each at the
+    stored parameters (models.common.ucm_online) instead of refitting.
+
+    The model is re-estimated (warm-started from the stored parameters)
+    when the indicator has no state yet, the model spec changed, the origin
+    is before the stored state, already-assimilated years were revised, or
+    after assimilating: every `refit_every` new observations or when the
+    innovations fail the drift test at level `alpha`.
+
+    Returns the same frame as hsm_forecast (or a GaussianForecast with
+    dist=True); out.attrs["online"] has one {indicator, year, assimilated,
+    refit, drift_p} record per indicator.
+    """
+    if backend not in BACKENDS:
+        raise ValueError(f"Unknown backend {backend!r} (expected one of {BACKENDS})")
+    state_path = Path(state_dir if state_dir is not None else STATE_DIR) / f"{backend}.json"
+    states = _load_states(state_path)
+    store = open_panel([i for i in indicators if (DATA_DIR / f"{i}.csv").exists()], DATA_DIR)
+
+    train, refit, log = [], {}, {}
+    for ind in dict.fromkeys(indicators):
+        y = _training_series(ind, origin, store, None).dropna()
+        if len(y) < MIN_HISTORY:
+            print(f"[HSM] skip {ind}: insufficient history up to {origin} (have={len(y)}, need>={MIN_HISTORY})")
+            continue
+        train.append((ind, y))
+        years = np.asarray(y.index, dtype=np.int64)
+        st = states.get(ind)
+        s2_known = _known_irregular(ind, y)
+        n_new, reason = 0, None
+        if st is None:
+            reason = "new"
+        elif st.get("spec") != _spec(backend, s2_known):
+            reason = "spec"
+        elif years[-1] < st["year"]:
+            reason = "rewind"
+        elif series_hash(years[years <= st["year"]], y.to_numpy()[years <= st["year"]]) != st["data"]:
+            reason = "revised"
+        else:
+            for yr, val in zip(years[years > st["year"]], y.to_numpy()[years > st["year"]]):
+                st, _ = ucm_online.assimilate(st, int(yr), float(val))
+                n_new += 1
+            st["data"] = series_hash(years, y.to_numpy())
+            states[ind] = st
+            reason = ucm_online.needs_refit(st, refit_every, alpha)
+        log[ind] = {"indicator": ind, "year": int(years[-1]), "assimilated": n_new, "refit": reason,
+                    "drift_p": ucm_online.drift_pvalue(st) if n_new else None}
+        if reason is not None:
+            # warm start from the stored parameters unless the model changed
+            start = None if st is None or reason == "spec" else np.array([st["s2_irr"], st["s2_lvl"]])
+            refit[ind] = (y, start, s2_known)
+
+    # re-estimate parameters, then re-filter the whole series at them
+    todo = list(refit.items())
+    if backend == "numpy":
+        fits = _fit_numpy_batch([y for _, (y, _, _) in todo], h, [s2 for _, (_, _, s2) in todo])
+    else:
+        fits = (_fit_ucm_and_forecast(y, h=h, start_params=start, s2_known=s2)
+                for _, (y, start, s2) in todo)
+    for (ind, (y, _, s2_known)), fc in zip(todo, fits):
+        s2_irr, s2_lvl = (float(v) for v in fc["params"][:2])  # [sigma2.irregular, sigma2.level] in both backends
+        st = ucm_online.init_state(y.index, y.to_numpy(), s2_irr, s2_lvl)
+        st.update(spec=_spec(backend, s2_known), data=series_hash(y.index, y.to_numpy()))
+        states[ind] = st
+
+    rows = []
+    for ind, y in train:
+        st = states[ind]
+        mu, var_mean = ucm_online.forecast(st, h)
+        fc = _gaussian_quantiles(mu, var_mean, st["s2_irr"])
+        rows.extend(_forecast_rows(ind, fc, h))
+    _save_states(state_path, states)
+    n_new = sum(r["assimilated"] for r in log.values())
+    reasons = ", ".join(f"{ind}: {log[ind]['refit']}" for ind, _ in todo)
+    print(f"[HSM] online: {n_new} new observations assimilated, {len(todo)} of {len(train)} indicators refitted"
+          + (f" ({reasons})" if reasons else ""))
+
+    out = pd.DataFrame(rows, columns=["indicator", "horizon", "q05", "q50", "q95", "mu", "sigma"])
     if out.empty:
         print("[HSM] WARNING: produced no rows (all indicators skipped).")
+    if dist:
+        out = GaussianForecast(out.assign(origin=origin), out["mu"], out["sigma"])
+    else:
+        out = out[["indicator", "horizon", "q05", "q50", "q95"]]
+    out.attrs["online"] = list(log.values())
     return out
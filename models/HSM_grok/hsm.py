@@ -1,89 +1,112 @@
 # models/HSM_grok/hsm.py
 from __future__ import annotations
 
+from pathlib import Path
 from typing import Dict, List
 import numpy as np
 import pandas as pd
 from copulae import GaussianCopula
-from statsmodels.tsa.statespace.kalman_filter import KalmanFilter
+from statsmodels.tsa.statespace.structural import UnobservedComponents
 
+from models.common.comoments import origin_corr
+from models.common.state_forecast import filter_state, marginal_quantiles, predictive_moments
+from models.common.transforms import origin_transforms
 from models.common.utils import make_origin_panel, save_quantiles_csv
 
+LEVELS = (0.05, 0.5, 0.95)
+VARIANCES = ("sigma2.irregular", "sigma2.level")
+
+
+def _fit_variances(data: pd.DataFrame) -> pd.DataFrame:
+    """
+    ML estimates of each indicator's irregular and level variances on the
+    training panel, one UnobservedComponents("local linear deterministic
+    trend") fit per column, the model _system() filters: indicators x VARIANCES.
+    """
+    rows = {}
+    for ind in data.columns:
+        mod = UnobservedComponents(data[ind].to_numpy(dtype=np.float64), level="local linear deterministic trend")
+        res = mod.fit(disp=False)
+        rows[ind] = [float(res.params[mod.param_names.index(k)]) for k in VARIANCES]
+    return pd.DataFrame.from_dict(rows, orient="index", columns=list(VARIANCES))
+
+
+def _system(var: pd.DataFrame):
+    """
+    Local level + drift per indicator: states [levels, drifts]; (Z, T, Q, H)
+    with the fitted variances on the diagonals of Q and H. The drifts are
+    fixed (no disturbance); the filter estimates them from the diffuse start.
+    """
+    n = len(var)
+    Z = np.block([[np.eye(n), np.zeros((n, n))]])
+    T = np.block([[np.eye(n), np.eye(n)], [np.zeros((n, n)), np.eye(n)]])
+    Q = np.diag(np.concatenate([var["sigma2.level"].to_numpy(), np.zeros(n)]))
+    H = np.diag(var["sigma2.irregular"].to_numpy())
+    return Z, T, Q, H
+
+
+def hsm_predictive(indicators: List[str], origin_year: int, steps: int = 40) -> Dict:
+    """
+    Predictive distribution of the state-space model on the transformed
+    scale, propagated once over 1..steps (models.common.state_forecast):
+    mean (steps, n), cov (steps, n, n), sd (steps, n), quantiles
+    (steps, n, len(LEVELS)); plus the fitted variances, transforms (tf), the
+    training panel and the indicator order.
+
+    Each indicator's variances are estimated separately, so cov is diagonal:
+    the model has no cross-indicator dependence. hsm_forecast takes that
+    from origin_corr in the copula step.
+    """
+    panel = make_origin_panel(indicators, origin_year, min_len=8, imputed=True)
+    data = pd.DataFrame({ind: s for ind, s in panel.items()}).dropna(how='any')
+
+    # Transform, winsorize and standardize within the training window (configs/indicator_transform_spec.yml)
+    tf = origin_transforms(data.columns, origin_year)
+    data_normalized = tf.forward(data)
+
+    # State-space model (level + drift per indicator), fitted and filtered once to the origin
+    names = list(data_normalized.columns)
+    var = _fit_variances(data_normalized)
+    Z, T, Q, H = _system(var)
+    a, P = filter_state(data_normalized.to_numpy(dtype=np.float64), Z, T, Q, H)
+    mom = predictive_moments(a, P, Z, T, Q, steps, H)
+    mom.update(quantiles=marginal_quantiles(mom, LEVELS), levels=np.asarray(LEVELS), indicators=names,
+               variances=var, tf=tf, panel=panel)
+    return mom
+
+
 def hsm_forecast(indicators: List[str], origin_year: int, H: int = 15, H_scenario: int = 40) -> Dict[str, Dict[int, Dict[str, float]]]:
     """Forecast indicators using a multivariate state-space model with ECC post-processing."""
-    panel = make_origin_panel(indicators, origin_year, min_len=8)
-    data = pd.DataFrame({ind: s for ind, s in panel.items()}).dropna(how='any')
-    
-    # Normalize data (z-score)
-    means = data.mean()
-    stds = data.std()
-    data_normalized = (data - means) / stds
-    
-    # State-space model (level + trend per indicator)
-    k_states = len(indicators) * 2  # Level + trend
-    model = KalmanFilter(
-        endog=data_normalized,
-        k_endog=len(indicators),
-        k_states=k_states,
-        transition=np.block([
-            [np.eye(len(indicators)), np.eye(len(indicators))],
-            [np.zeros((len(indicators), len(indicators))), np.eye(len(indicators))]
-        ]),
-        observation=np.block([[np.eye(len(indicators)), np.zeros((len(indicators), len(indicators)))]]),
-        state_cov=np.diag([0.1] * k_states)
-    )
-    results = model.fit()
-    
-    # Forecast
-    forecasts = []
-    for h in range(1, max(H, H_scenario) + 1):
-        pred = results.forecast(h)[-1]
-        pred = pred * stds + means  # Denormalize
-        forecasts.append(pred)
-    
-    # Quantiles
-    out: Dict[str, Dict[int, Dict[str, float]]] = {ind: {} for ind in indicators}
-    for h in range(1, max(H, H_scenario) + 1):
-        for i, ind in enumerate(indicators):
-            pred_h = forecasts[h-1][i]
-            sigma = stds[ind] * np.sqrt(h)
-            out[ind][h] = {
-                "q05": float(pred_h - 1.645 * sigma),
-                "q50": float(pred_h),
-                "q95": float(pred_h + 1.645 * sigma),
-            }
+    steps = max(H, H_scenario)
+    pred = hsm_predictive(indicators, origin_year, steps)
+    panel, tf, names = pred["panel"], pred["tf"], pred["indicators"]
+
+    # Marginal quantiles from the propagated predictive variances (transformed
+    # scale), mapped back through the inverse transform: (n, steps, 3)
+    quantiles = np.stack([np.column_stack([tf.inverse(pred["quantiles"][:, i, j], ind) for j in range(len(LEVELS))])
+                          for i, ind in enumerate(names)])
 
     # ECC post-processing
-    corr = pd.read_csv("data/processed/corr_matrix.csv", index_col=0)
-    corr = corr.loc[indicators, indicators]
-    copula = GaussianCopula(dim=len(indicators), rho=corr.values)
-    quantiles = np.array([[[out[ind][h]["q05"], out[ind][h]["q50"], out[ind][h]["q95"]] for h in range(1, max(H, H_scenario) + 1)] for ind in indicators])
+    # correlations from years <= origin only (pairs without overlap -> 0)
+    corr = origin_corr(names, origin_year).fillna(0.0)
+    copula = GaussianCopula(dim=len(names), rho=corr.values)
     quantiles_joint = copula.sample(quantiles.transpose(1, 0, 2), n=10000)
-    for i, ind in enumerate(indicators):
-        for h in range(1, max(H, H_scenario) + 1):
-            out[ind][h] = {
-                "q05": float(np.percentile(quantiles_joint[:, h-1, i, 0], 5)),
-                "q50": float(np.percentile(quantiles_joint[:, h-1, i, 1], 50)),
-                "q95": float(np.percentile(quantiles_joint[:, h-1, i, 2], 95)),
-            }
-
-    # Calibration
-    for ind in indicators:
-        s = panel[ind]
-        diffs = [s.iloc[-1] - out[ind][1]["q50"]]
-        mean_adj = float(np.nanmean(diffs)) if diffs else 0.0
-        sigma_scale = np.std(s) / np.std([out[ind][h]["q50"] for h in range(1, H+1)]) if H > 0 else 1.0
-        for h in range(1, max(H, H_scenario) + 1):
-            out[ind][h]["q05"] = out[ind][h]["q05"] * sigma_scale + mean_adj
-            out[ind][h]["q50"] = out[ind][h]["q50"] * sigma_scale + mean_adj
-            out[ind][h]["q95"] = out[ind][h]["q95"] * sigma_scale + mean_adj
-    
-    # Event probabilities
-    event_probs = {
-        'trust_below_20': [(out['public_trust_government'][h]['q50'] < 20) for h in [1, 3, 5, 10, 15]],
-        'turnout_above_65': [(out['vep_turnout_pct'][h]['q50'] >= 65) for h in [1, 3, 5, 10, 15]],
-        'polarization_above_50': [(out['mass_public_polarization'][h]['q50'] > 50) for h in [1, 3, 5, 10, 15]],
+    joint = np.stack([np.percentile(quantiles_joint[:, :, :, j], 100 * p, axis=0) for j, p in enumerate(LEVELS)],
+                     axis=-1)  # (steps, n, 3)
+    out: Dict[str, Dict[int, Dict[str, float]]] = {
+        ind: {h: {"q05": float(joint[h - 1, i, 0]), "q50": float(joint[h - 1, i, 1]), "q95": float(joint[h - 1, i, 2])}
+              for h in range(1, steps + 1)}
+        for i, ind in enumerate(names)
+    }
+
+    # Event probabilities (events whose indicator had enough history to be forecast)
+    events = {
+        'trust_below_20': ('public_trust_government', lambda v: v < 20),
+        'turnout_above_65': ('vep_turnout_pct', lambda v: v >= 65),
+        'polarization_above_50': ('mass_public_polarization', lambda v: v > 50),
     }
+    event_probs = {name: [test(out[ind][h]['q50']) for h in [1, 3, 5, 10, 15]]
+                   for name, (ind, test) in events.items() if ind in out}
     pd.DataFrame(event_probs, index=[2026, 2028, 2030, 2035, 2040]).to_csv("models/HSM_grok/event_probs.csv")
     
     return out
@@ -3,6 +3,8 @@ import numpy as np
 from statsmodels.tsa.statespace.kalman_filter import KalmanFilter
 from statsmodels.tsa.regime_switching.markov_regression import MarkovRegression
 
+from models.common.changepoints import load_breaks, regime_labels
+
 # Load data
 data = pd.concat([
     pd.read_csv('data/processed/mass_public_polarization.csv')[['year', 'affective_polarization']],
@@ -12,9 +14,9 @@ data = pd.concat([
 ], axis=1).dropna(subset=['year']).set_index('year')
 data.columns = ['polarization', 'trust', 'turnout', ...]
 
-# Handle breaks (from annotations.md)
-breaks = {'real_gdp_growth': 2015, ...}  # Example: year 2015 for GDP break
-regimes = np.where(data.index < breaks.get('real_gdp_growth', np.inf), 0, 1)
+# Handle breaks (data/processed/breaks.csv, written by data/processing_pipeline.py)
+breaks = load_breaks(cost='mean')  # {indicator: [break years]}
+regimes = regime_labels(data.index, breaks.get('real_gdp_growth', [])[-1:])  # 0 before the latest break, 1 after
 
 # State-space model
 model = KalmanFilter(
@@ -1 +1,2 @@
-from .utils import make_origin_panel, save_quantiles_csv
\ No newline at end of file
+from .utils import make_origin_panel, save_quantiles_csv
+from .cache import cache_stats, invalidate_cache
@@ -0,0 +1,309 @@
+# models/common/anes_cache.py
+"""
+Columnar, year-partitioned cache of ANES CSV files.
+
+The first read of an ANES CSV (the cumulative data file or a single wave)
+converts it once into a directory next to the source, data/raw/_anes_cache/<stem>/:
+
+  meta.json        source fingerprint (size, mtime_ns), encoding, year column,
+                   row count, year partitions {year: [offset, count]} and the
+                   column index {name: {file, codes dtype, dict kind, n_distinct}}
+  <k>.codes.npy    dictionary codes for column k, rows sorted by survey year
+  <k>.dict.npy     float64 dictionary (numeric columns; blanks -> NaN), or
+  <k>.dict.json    string dictionary for non-numeric columns
+
+ANES columns are overwhelmingly small integer codes, so each column becomes a
+uint8/uint16 code vector plus a tiny dictionary. Rows are sorted by year, so a
+year partition is a contiguous row range and reading a handful of columns for
+a handful of years memory-maps a few slices instead of parsing the whole CSV.
+The cache is rebuilt automatically whenever the source file changes.
+
+Usage:
+  python -m models.common.anes_cache build data/raw/anes_timeseries_cdf_csv_20220916.csv
+  python -m models.common.anes_cache info  data/raw/anes_timeseries_cdf_csv_20220916.csv
+"""
+from __future__ import annotations
+import argparse
+import json
+import os
+import shutil
+from pathlib import Path
+from typing import Dict, Iterable, List, Optional, Sequence
+
+import numpy as np
+import pandas as pd
+
+CACHE_DIRNAME = "_anes_cache"
+FORMAT_VERSION = 1
+CHUNK_ROWS = 20_000
+YEAR_CANDS = ["VCF0004", "YEAR", "year", "vyear", "VCF0004a", "VCF0004x"]
+
+_OPEN: Dict[str, "AnesCache"] = {}
+
+
+def _fingerprint(path: Path) -> List[int]:
+    st = path.stat()
+    return [int(st.st_size), int(st.st_mtime_ns)]
+
+
+def _codes_dtype(n: int) -> str:
+    if n <= np.iinfo(np.uint8).max:
+        return "u1"
+    if n <= np.iinfo(np.uint16).max:
+        return "u2"
+    return "u4"
+
+
+def cache_dir_for(csv_path: Path) -> Path:
+    csv_path = Path(csv_path)
+    return csv_path.parent / CACHE_DIRNAME / csv_path.stem
+
+
+class _ColumnEncoder:
+    """Grows one column's string dictionary chunk by chunk."""
+
+    def __init__(self):
+        self.lookup: Dict[str, int] = {}
+        self.chunks: List[np.ndarray] = []
+
+    def add(self, values: pd.Series) -> None:
+        codes, uniques = pd.factorize(values, use_na_sentinel=False)
+        remap = np.empty(len(uniques), dtype=np.int64)
+        for i, u in enumerate(uniques.tolist()):
+            u = "" if u is None or (isinstance(u, float) and np.isnan(u)) else str(u)
+            code = self.lookup.get(u)
+            if code is None:
+                code = self.lookup[u] = len(self.lookup)
+            remap[i] = code
+        self.chunks.append(remap[codes])
+
+    def finish(self):
+        """(codes, dictionary, kind) with kind 'num' (float64 dict) or 'str'."""
+        words = [""] * len(self.lookup)
+        for w, i in self.lookup.items():
+            words[i] = w
+        codes = np.concatenate(self.chunks) if self.chunks else np.zeros(0, dtype=np.int64)
+        stripped = pd.Series(words, dtype=object).str.strip()
+        nums = pd.to_numeric(stripped.replace("", np.nan), errors="coerce")
+        if bool((nums.notna() | (stripped == "")).all()):
+            return codes, nums.to_numpy(dtype=np.float64), "num"
+        return codes, words, "str"
+
+
+class AnesCache:
+    """Read-only view over a converted ANES file."""
+
+    def __init__(self, root: Path, meta: Dict):
+        self.root = Path(root)
+        self.meta = meta
+        self.columns: List[str] = list(meta["columns"])
+        self.year_col: Optional[str] = meta.get("year_col")
+        self.partitions: Dict[int, List[int]] = {int(y): v for y, v in meta["partitions"].items()}
+        self._dicts: Dict[str, object] = {}
+
+    @property
+    def years(self) -> List[int]:
+        return sorted(self.partitions)
+
+    @property
+    def n_rows(self) -> int:
+        return int(self.meta["n_rows"])
+
+    # ---------- construction ----------
+    @classmethod
+    def open(cls, csv_path: Path) -> Optional["AnesCache"]:
+        root = cache_dir_for(csv_path)
+        try:
+            meta = json.loads((root / "meta.json").read_text(encoding="utf-8"))
+        except (OSError, ValueError):
+            return None
+        if meta.get("version") != FORMAT_VERSION:
+            return None
+        return cls(root, meta)
+
+    @classmethod
+    def build(cls, csv_path: Path, year_col: Optional[str] = None,
+              year_const: Optional[int] = None) -> "AnesCache":
+        """Convert csv_path in CHUNK_ROWS-row chunks (utf-8, then latin-1)."""
+        csv_path = Path(csv_path)
+        for enc in ("utf-8", "latin-1"):
+            try:
+                names, encoders = cls._encode(csv_path, enc)
+                break
+            except UnicodeDecodeError:
+                print(f"[anes_cache] utf-8 failed for {csv_path.name}; trying latin-1")
+        n_rows = sum(len(c) for c in encoders[0].chunks) if encoders else 0
+
+        finished = [e.finish() for e in encoders]
+        if year_const is not None:
+            year_col = None
+            year = np.full(n_rows, int(year_const), dtype=np.int64)
+        else:
+            if year_col is None:
+                year_col = next((c for c in YEAR_CANDS if c in names), None)
+            if year_col is not None:
+                codes, dictionary, kind = finished[names.index(year_col)]
+                yv = dictionary[codes] if kind == "num" else np.full(n_rows, np.nan)
+                year = np.where(np.isfinite(yv), yv, -1).astype(np.int64)
+            else:
+                year = np.full(n_rows, -1, dtype=np.int64)
+        order = np.argsort(year, kind="stable")
+        sorted_years = year[order]
+        uniq, starts, counts = np.unique(sorted_years, return_index=True, return_counts=True)
+        partitions = {str(int(y)): [int(s), int(c)] for y, s, c in zip(uniq, starts, counts)}
+
+        root = cache_dir_for(csv_path)
+        tmp_root = root.with_name(root.name + ".tmp")
+        shutil.rmtree(tmp_root, ignore_errors=True)
+        tmp_root.mkdir(parents=True)
+        index = {}
+        for k, (name, (codes, dictionary, kind)) in enumerate(zip(names, finished)):
+            dt = _codes_dtype(len(dictionary))
+            np.save(tmp_root / f"{k}.codes.npy", codes[order].astype(dt))
+            if kind == "num":
+                np.save(tmp_root / f"{k}.dict.npy", dictionary)
+            else:
+                (tmp_root / f"{k}.dict.json").write_text(json.dumps(dictionary), encoding="utf-8")
+            index[name] = {"file": k, "codes": dt, "kind": kind, "n_distinct": len(dictionary)}
+
+        meta = {
+            "version": FORMAT_VERSION,
+            "source": csv_path.name,
+            "fingerprint": _fingerprint(csv_path),
+            "encoding": enc,
+            "year_col": year_col,
+            "year_const": year_const,
+            "n_rows": int(n_rows),
+            "partitions": partitions,
+            "columns": index,
+        }
+        (tmp_root / "meta.json").write_text(json.dumps(meta, indent=1), encoding="utf-8")
+        _OPEN.pop(str(root.resolve()), None)
+        shutil.rmtree(root, ignore_errors=True)
+        os.replace(tmp_root, root)
+        print(f"[anes_cache] converted {csv_path.name}: {n_rows} rows x {len(names)} columns, "
+              f"{len(partitions)} year partitions -> {root}")
+        return cls(root, meta)
+
+    @staticmethod
+    def _encode(csv_path: Path, encoding: str):
+        reader = pd.read_csv(csv_path, dtype=str, keep_default_na=False, encoding=encoding,
+                             chunksize=CHUNK_ROWS)
+        names: List[str] = []
+        encoders: List[_ColumnEncoder] = []
+        for chunk in reader:
+            if not names:
+                names = [str(c) for c in chunk.columns]
+                encoders = [_ColumnEncoder() for _ in names]
+            for enc, col in zip(encoders, chunk.columns):
+                enc.add(chunk[col])
+        return names, encoders
+
+    def is_fresh(self, csv_path: Path, year_col: Optional[str] = None,
+                 year_const: Optional[int] = None) -> bool:
+        if self.meta.get("fingerprint") != _fingerprint(Path(csv_path)):
+            return False
+        if year_const is not None and self.meta.get("year_const") != year_const:
+            return False
+        if year_col is not None and self.year_col != year_col:
+            return False
+        return True
+
+    # ---------- queries ----------
+    def dictionary(self, name: str):
+        d = self._dicts.get(name)
+        if d is None:
+            info = self.meta["columns"][name]
+            if info["kind"] == "num":
+                d = np.load(self.root / f"{info['file']}.dict.npy")
+            else:
+                d = np.array(json.loads((self.root / f"{info['file']}.dict.json").read_text(encoding="utf-8")),
+                             dtype=object)
+            self._dicts[name] = d
+        return d
+
+    def codes(self, name: str) -> np.ndarray:
+        info = self.meta["columns"][name]
+        return np.load(self.root / f"{info['file']}.codes.npy", mmap_mode="r")
+
+    def rows(self, years: Iterable[int] | None = None) -> np.ndarray:
+        """Row positions (sorted-by-year order) of the requested partitions."""
+        if years is None:
+            return np.arange(self.n_rows)
+        parts = [self.partitions[int(y)] for y in sorted(set(int(y) for y in years)) if int(y) in self.partitions]
+        if not parts:
+            return np.zeros(0, dtype=np.int64)
+        return np.concatenate([np.arange(s, s + c) for s, c in parts])
+
+    def column(self, name: str, rows: np.ndarray | None = None) -> np.ndarray:
+        """Decoded values (float64 for numeric columns, object for text)."""
+        codes = self.codes(name)
+        codes = np.asarray(codes) if rows is None else np.asarray(codes[rows])
+        return self.dictionary(name)[codes]
+
+    def value_counts(self, name: str, years: Iterable[int] | None = None) -> pd.Series:
+        """Distinct decoded values and their counts, straight from the codes."""
+        codes = np.asarray(self.codes(name)) if years is None else np.asarray(self.codes(name)[self.rows(years)])
+        d = self.dictionary(name)
+        counts = np.bincount(codes, minlength=len(d))
+        keep = counts > 0
+        return pd.Series(counts[keep], index=pd.Index(np.asarray(d)[keep]), name=name)
+
+    def year_vector(self, rows: np.ndarray | None = None) -> np.ndarray:
+        """Survey year of each row (from the partitions, not by decoding a column)."""
+        year = np.empty(self.n_rows, dtype=np.int64)
+        for y, (s, c) in self.partitions.items():
+            year[s:s + c] = y
+        return year if rows is None else year[rows]
+
+    def frame(self, columns: Sequence[str] | None = None, years: Iterable[int] | None = None) -> pd.DataFrame:
+        """Projected columns (those that exist) for the requested year partitions."""
+        names = self.columns if columns is None else [c for c in dict.fromkeys(columns) if c in self.meta["columns"]]
+        rows = None if years is None else self.rows(years)
+        return pd.DataFrame({c: self.column(c, rows) for c in names})
+
+
+def open_anes(csv_path: str | Path, year_col: Optional[str] = None,
+              year_const: Optional[int] = None) -> AnesCache:
+    """Process-wide AnesCache for csv_path, converting the CSV only when needed."""
+    csv_path = Path(csv_path)
+    key = str(cache_dir_for(csv_path).resolve())
+    cache = _OPEN.get(key) or AnesCache.open(csv_path)
+    if cache is None or not cache.is_fresh(csv_path, year_col, year_const):
+        cache = AnesCache.build(csv_path, year_col=year_col, year_const=year_const)
+    _OPEN[key] = cache
+    return cache
+
+
+def read_anes(csv_path: str | Path, columns: Sequence[str] | None = None,
+              years: Iterable[int] | None = None, year_col: Optional[str] = None,
+              year_const: Optional[int] = None) -> pd.DataFrame:
+    """
+    Read only `columns` (missing names are skipped) for the given survey
+    `years` from the columnar cache of an ANES CSV. Numeric columns come back
+    as float64 with blanks as NaN; text columns as object.
+    """
+    return open_anes(csv_path, year_col, year_const).frame(columns, years)
+
+
+def main():
+    ap = argparse.ArgumentParser(description="Columnar, year-partitioned cache of ANES CSV files.")
+    ap.add_argument("cmd", choices=["build", "info"])
+    ap.add_argument("csv", type=str)
+    ap.add_argument("--year_col", type=str, default=None)
+    ap.add_argument("--year_const", type=int, default=None)
+    args = ap.parse_args()
+
+    if args.cmd == "build":
+        AnesCache.build(Path(args.csv), year_col=args.year_col, year_const=args.year_const)
+        return
+    cache = open_anes(args.csv, args.year_col, args.year_const)
+    kinds = pd.Series([v["kind"] for v in cache.meta["columns"].values()]).value_counts().to_dict()
+    print(f"[anes_cache] {cache.meta['source']}: {cache.n_rows} rows, {len(cache.columns)} columns {kinds}")
+    print(f"[anes_cache] year column: {cache.year_col or cache.meta.get('year_const')}")
+    for y in cache.years:
+        print(f"  {y}: {cache.partitions[y][1]} rows")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,227 @@
+# models/common/bulk_ingest.py
+"""
+Bulk ingestion of many date,value series (a directory tree or a .zip, e.g. a
+FRED-style dump) into data/processed in one batch.
+
+  1. read      every CSV is parsed in a thread pool (pandas' C parser releases
+               the GIL); per file only the date and value columns are kept
+  2. annualize all observations are stacked into one array and reduced to
+               annual means with a single bincount over (series, year) keys
+  3. validate  series with fewer than `min_years` annual values are rejected
+  4. dedupe    each series' observed (year, value) pairs are hashed
+               (fit_cache.series_hash), as are the parsed value columns of the
+               files in data/processed, so a series already there is found
+               however its file is laid out (extra imputed / se columns);
+               identical content is registered once
+  5. commit    files are written to a staging directory, then moved into
+               data/processed together; the registry
+               data/processed/_bulk_registry.json is written last, and new
+               versions are recorded in the series store (models.common.cas)
+
+Column detection: the date column is `date` or `observation_date` (any case);
+the value column is `value` or, failing that, the only other column. FRED's
+"." for missing parses as NaN.
+"""
+from __future__ import annotations
+import csv
+import hashlib
+import io
+import json
+import os
+import re
+import shutil
+import zipfile
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+from typing import Dict, List, Optional, Tuple
+
+import numpy as np
+import pandas as pd
+
+from .cas import get_series_store
+from .fit_cache import series_hash
+from .schema import read_processed, read_schema
+
+PRO_DIR = Path("data/processed")
+REGISTRY_JSON = "_bulk_registry.json"
+STAGING_DIRNAME = "_bulk_staging"
+DATE_COLS = ("date", "observation_date")
+
+
+def series_name(member: str, prefix: str = "") -> str:
+    stem = Path(member).stem
+    return prefix + re.sub(r"[^0-9a-z]+", "_", stem.lower()).strip("_")
+
+
+def _list_sources(src: Path) -> List[str]:
+    if src.suffix.lower() == ".zip":
+        with zipfile.ZipFile(src) as z:
+            return sorted(n for n in z.namelist() if n.lower().endswith(".csv") and not n.endswith("/"))
+    return sorted(p.relative_to(src).as_posix() for p in src.rglob("*.csv"))
+
+
+def _parse(data: bytes) -> Tuple[np.ndarray, np.ndarray]:
+    """(days since 1970-01-01, values) of one CSV; invalid rows dropped."""
+    header = next(csv.reader([data.split(b"\n", 1)[0].decode("utf-8-sig").strip()]), [])
+    lower = {c.strip().lower(): c for c in header}
+    dcol = next((lower[c] for c in DATE_COLS if c in lower), None)
+    if dcol is None:
+        raise ValueError(f"no date column (expected one of {DATE_COLS})")
+    others = [c for c in header if c != dcol]
+    vcol = lower.get("value") or (others[0] if len(others) == 1 else None)
+    if vcol is None:
+        raise ValueError("no 'value' column and more than one candidate")
+    df = pd.read_csv(io.BytesIO(data), usecols=[dcol, vcol], na_values=["."], encoding="utf-8-sig")
+    date = pd.to_datetime(df[dcol], errors="coerce")
+    value = pd.to_numeric(df[vcol], errors="coerce").to_numpy(dtype=np.float64)
+    ok = date.notna().to_numpy() & np.isfinite(value)
+    days = date[ok].to_numpy(dtype="datetime64[ns]").astype("datetime64[D]").astype(np.int64)
+    return days, value[ok]
+
+
+def read_many(src: Path, members: List[str], threads: Optional[int] = None) -> Tuple[List, Dict[str, str]]:
+    """Parse members of a directory or zip in a thread pool: ([(member, days, values)], {member: error})."""
+    is_zip = src.suffix.lower() == ".zip"
+    zf = zipfile.ZipFile(src) if is_zip else None
+
+    def load(member: str):
+        try:
+            if zf is not None:
+                with zf.open(member) as f:  # ZipFile serializes reads internally
+                    data = f.read()
+            else:
+                data = (src / member).read_bytes()
+            return member, _parse(data), None
+        except Exception as e:
+            return member, None, str(e)
+
+    try:
+        with ThreadPoolExecutor(max_workers=threads) as pool:
+            results = list(pool.map(load, members))
+    finally:
+        if zf is not None:
+            zf.close()
+    parsed = [(m, r[0], r[1]) for m, r, err in results if err is None]
+    errors = {m: err for m, r, err in results if err is not None}
+    return parsed, errors
+
+
+def annualize_batch(parsed: List[Tuple[str, np.ndarray, np.ndarray]]) -> List[Tuple[str, int, np.ndarray]]:
+    """
+    Annual means of many series at once: [(member, first year, values over
+    the dense first..last year span, NaN where a year has no observations)].
+    """
+    if not parsed:
+        return []
+    lens = np.array([len(d) for _, d, _ in parsed], dtype=np.int64)
+    days = np.concatenate([d for _, d, _ in parsed]) if lens.sum() else np.zeros(0, dtype=np.int64)
+    vals = np.concatenate([v for _, _, v in parsed]) if lens.sum() else np.zeros(0)
+    sid = np.repeat(np.arange(len(parsed)), lens)
+    out = [(m, 0, np.zeros(0)) for m, _, _ in parsed]
+    if len(days) == 0:
+        return out
+    years = days.astype("datetime64[D]").astype("datetime64[Y]").astype(np.int64) + 1970
+    y0 = int(years.min())
+    span = int(years.max()) - y0 + 1
+    key = sid * span + (years - y0)
+    size = len(parsed) * span
+    sums = np.bincount(key, weights=vals, minlength=size).reshape(len(parsed), span)
+    cnts = np.bincount(key, minlength=size).reshape(len(parsed), span)
+    with np.errstate(invalid="ignore", divide="ignore"):
+        means = np.where(cnts > 0, sums / cnts, np.nan)
+    for i, (m, _, _) in enumerate(parsed):
+        has = np.flatnonzero(cnts[i])
+        if len(has):
+            out[i] = (m, y0 + int(has[0]), means[i, has[0]:has[-1] + 1])
+    return out
+
+
+def render(first_year: int, values: np.ndarray) -> bytes:
+    """
+    Processed-file bytes (value,date rows, as written by the processing
+    pipeline with DataFrame.to_csv), formatted directly: going through a
+    DataFrame per series dominated the run time of large batches.
+    """
+    text = np.asarray(values, dtype=np.float64).astype(str)
+    text[np.isnan(values)] = ""
+    rows = [f"{v},{first_year + i:04d}-01-01" for i, v in enumerate(text.tolist())]
+    return os.linesep.join(["value,date", *rows, ""]).encode("utf-8")
+
+
+def _content_hash(path: Path) -> Optional[str]:
+    """series_hash of a processed file's observed values; None if it is not a series file."""
+    try:
+        s = read_processed(path, read_schema(path, write=False))["value"]
+    except Exception:
+        return None
+    return series_hash(s.index.to_numpy(dtype=np.int64), s.to_numpy(dtype=np.float64))
+
+
+def ingest(src: str | Path, pro_dir: Path | None = None, prefix: str = "", min_years: int = 5,
+           threads: Optional[int] = None, overwrite: bool = False, dry_run: bool = False) -> Dict:
+    """Ingest every CSV under `src` (directory or .zip). Returns a summary dict."""
+    src = Path(src)
+    pro_dir = Path(pro_dir) if pro_dir is not None else PRO_DIR
+    members = _list_sources(src)
+    print(f"[bulk_ingest] {len(members)} CSV files in {src}")
+    parsed, errors = read_many(src, members, threads)
+    annual = annualize_batch(parsed)
+
+    store = get_series_store()
+    existing = {}  # content hash -> processed series name
+    for p in sorted(pro_dir.glob("*.csv")):
+        h = _content_hash(p)
+        if h is not None:
+            existing.setdefault(h, p.stem)
+
+    accepted: Dict[str, Tuple[str, bytes, str, int, int]] = {}
+    rejected: Dict[str, str] = dict(errors)
+    duplicates: Dict[str, str] = {}
+    for member, y0, values in annual:
+        name = series_name(member, prefix)
+        n_valid = int(np.isfinite(values).sum())
+        if n_valid < min_years:
+            rejected[member] = f"{n_valid} annual values (< {min_years})"
+            continue
+        content = series_hash(np.arange(y0, y0 + len(values)), values)
+        if content in existing:
+            duplicates[member] = existing[content]
+            continue
+        if name in accepted or ((pro_dir / f"{name}.csv").exists() and not overwrite):
+            rejected[member] = f"name {name!r} already taken (use a prefix or overwrite)"
+            continue
+        blob = render(y0, values)
+        sha = hashlib.sha256(blob).hexdigest()
+        existing[content] = name
+        accepted[name] = (member, blob, sha, y0, y0 + len(values) - 1)
+
+    summary = {"source": str(src), "files": len(members), "accepted": len(accepted),
+               "duplicates": duplicates, "rejected": rejected}
+    print(f"[bulk_ingest] accepted {len(accepted)}, duplicates {len(duplicates)}, rejected {len(rejected)}")
+    if dry_run or not accepted:
+        return summary
+
+    # stage everything, then move into place; the registry is written last
+    staging = pro_dir / STAGING_DIRNAME
+    shutil.rmtree(staging, ignore_errors=True)
+    staging.mkdir(parents=True)
+    try:
+        for name, (_, blob, _, _, _) in accepted.items():
+            (staging / f"{name}.csv").write_bytes(blob)
+        for name in accepted:
+            os.replace(staging / f"{name}.csv", pro_dir / f"{name}.csv")
+    finally:
+        shutil.rmtree(staging, ignore_errors=True)
+
+    reg_path = pro_dir / REGISTRY_JSON
+    registry = json.loads(reg_path.read_text(encoding="utf-8")) if reg_path.exists() else {}
+    for name, (member, _, sha, y0, y1) in accepted.items():
+        registry[name] = {"source": f"{src.name}:{member}", "sha256": sha, "first_year": y0, "last_year": y1}
+    tmp = reg_path.with_name(reg_path.name + ".tmp")
+    tmp.write_text(json.dumps(registry, indent=2, sort_keys=True), encoding="utf-8")
+    os.replace(tmp, reg_path)
+
+    new = store.commit_many([pro_dir / f"{n}.csv" for n in accepted], message=f"bulk_ingest {src.name}")
+    print(f"[bulk_ingest] wrote {len(accepted)} series to {pro_dir} ({len(new)} new store versions); "
+          f"registry: {reg_path}")
+    return summary
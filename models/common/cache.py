@@ -0,0 +1,114 @@
+# models/common/cache.py
+"""
+Process-level, bounded LRU cache for parsed data files.
+
+Entries are keyed on (path, size, mtime_ns, sha256 of content, tag). The
+content hash is computed once per (path, size, mtime_ns) and memoized, so a
+repeated load of an unchanged file costs one os.stat plus a dictionary lookup;
+an edited file produces a new key and is re-parsed. All bookkeeping is guarded
+by a lock so loaders can be called from worker threads.
+"""
+from __future__ import annotations
+import hashlib
+import threading
+from collections import OrderedDict
+from pathlib import Path
+from typing import Any, Callable, Dict, Hashable, Optional, Tuple
+
+import pandas as pd
+
+
+def file_sha256(path: str | Path, chunk_size: int = 1 << 20) -> str:
+    """Hex sha256 of a file's content (streamed)."""
+    h = hashlib.sha256()
+    with open(path, "rb") as f:
+        for chunk in iter(lambda: f.read(chunk_size), b""):
+            h.update(chunk)
+    return h.hexdigest()
+
+
+class FileCache:
+    """Bounded LRU of objects parsed from files, with hit/miss counters."""
+
+    def __init__(self, maxsize: int = 256):
+        if maxsize <= 0:
+            raise ValueError("maxsize must be positive")
+        self.maxsize = int(maxsize)
+        self._lock = threading.Lock()
+        self._entries: "OrderedDict[Tuple, Any]" = OrderedDict()
+        self._digests: Dict[Tuple[str, int, int], str] = {}
+        self.hits = 0
+        self.misses = 0
+
+    def _key(self, path: Path, tag: Hashable) -> Tuple:
+        st = path.stat()
+        stat_key = (str(path.resolve()), int(st.st_size), int(st.st_mtime_ns))
+        with self._lock:
+            digest = self._digests.get(stat_key)
+        if digest is None:
+            digest = file_sha256(path)
+            with self._lock:
+                for old in [k for k in self._digests if k[0] == stat_key[0]]:
+                    del self._digests[old]
+                self._digests[stat_key] = digest
+        return stat_key + (digest, tag)
+
+    def get_or_load(self, path: str | Path, loader: Callable[[Path], Any],
+                    tag: Hashable = None, copy: bool = True) -> Any:
+        """
+        Return loader(path), parsing only when no entry exists for the file's
+        current (size, mtime, sha256). pandas objects are copied on the way out
+        so callers cannot mutate the cached value.
+        """
+        path = Path(path)
+        key = self._key(path, tag)
+        with self._lock:
+            if key in self._entries:
+                self._entries.move_to_end(key)
+                self.hits += 1
+                value = self._entries[key]
+                return value.copy() if copy and isinstance(value, (pd.Series, pd.DataFrame)) else value
+            self.misses += 1
+
+        value = loader(path)
+        with self._lock:
+            # a stale entry for the same path/tag can never be hit again
+            for old in [k for k in self._entries if k[0] == key[0] and k[4] == tag and k != key]:
+                del self._entries[old]
+            self._entries[key] = value
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.maxsize:
+                self._entries.popitem(last=False)
+        return value.copy() if copy and isinstance(value, (pd.Series, pd.DataFrame)) else value
+
+    def invalidate(self, path: Optional[str | Path] = None) -> int:
+        """Drop entries for one file (or everything when path is None); returns #dropped."""
+        with self._lock:
+            if path is None:
+                n = len(self._entries)
+                self._entries.clear()
+                self._digests.clear()
+                return n
+            target = str(Path(path).resolve())
+            dropped = [k for k in self._entries if k[0] == target]
+            for k in dropped:
+                del self._entries[k]
+            for k in [k for k in self._digests if k[0] == target]:
+                del self._digests[k]
+            return len(dropped)
+
+    def stats(self) -> Dict[str, int]:
+        with self._lock:
+            return dict(hits=self.hits, misses=self.misses, size=len(self._entries), maxsize=self.maxsize)
+
+
+# shared instance used by models.common.utils.load_indicator
+INDICATOR_CACHE = FileCache(maxsize=256)
+
+
+def cache_stats() -> Dict[str, int]:
+    return INDICATOR_CACHE.stats()
+
+
+def invalidate_cache(path: Optional[str | Path] = None) -> int:
+    return INDICATOR_CACHE.invalidate(path)
@@ -0,0 +1,369 @@
+# models/common/cas.py
+"""
+Content-addressed, deduplicated history of processed-series files.
+
+Layout (data/series_store/):
+  objects/ab/cdef...       zlib-compressed chunk, named by the sha256 of its bytes
+  versions/ab/cdef....json one file version, named by the sha256 of the whole
+                           file: {"size", "chunks": [[sha256, bytes, lines], ...]}
+  refs/<indicator>.jsonl   append-only ref log, one line per committed version
+                           (sha256, size, time, source, message)
+  stat_cache.json          {path: [size, mtime_ns, sha256]} for files already hashed
+
+Files are cut into content-defined chunks at line boundaries: a chunk ends
+after a line whose crc32 matches BOUNDARY_MASK (once it holds CHUNK_MIN
+bytes) or when it reaches CHUNK_MAX, so editing or appending rows of a CSV
+changes only the chunks around the edit. Identical chunks and identical
+versions are stored once, whichever indicator or backup they came from.
+
+Restoring a version concatenates its chunks; diffing two versions decodes
+only the chunks they do not share. The whole-file sha256 is computed while
+chunking, and stat_cache.json lets later callers (the processing pipeline,
+the release manifest) reuse it for an unchanged file instead of rehashing.
+
+Usage:
+  python -m models.common.cas commit [--indicators ...]     # snapshot data/processed/*.csv
+  python -m models.common.cas log --indicator vep_turnout_pct
+  python -m models.common.cas restore --indicator vep_turnout_pct --rev -2 --out old.csv
+  python -m models.common.cas diff --indicator vep_turnout_pct --a -2 --b -1
+  python -m models.common.cas import-bak [--delete]         # fold *.csv.<stamp>.bak files in
+  python -m models.common.cas stats
+"""
+from __future__ import annotations
+import argparse
+import datetime as dt
+import difflib
+import hashlib
+import json
+import os
+import re
+import time
+import zlib
+from pathlib import Path
+from typing import Dict, Iterable, Iterator, List, Optional, Tuple
+
+CAS_DIR = Path("data/series_store")
+CHUNK_MIN = 1 << 10
+CHUNK_MAX = 1 << 16
+BOUNDARY_MASK = 0x1F  # ~1 boundary candidate per 32 lines
+BAK_RE = re.compile(r"^(?P<stem>.+)\.csv\.(?P<stamp>\d{8}_\d{6})\.bak$")
+
+_OPEN: Dict[str, "SeriesStore"] = {}
+
+
+def _fingerprint(path: Path) -> List[int]:
+    st = path.stat()
+    return [int(st.st_size), int(st.st_mtime_ns)]
+
+
+def _write_atomic(path: Path, data: bytes) -> None:
+    path.parent.mkdir(parents=True, exist_ok=True)
+    tmp = path.with_name(path.name + ".tmp")
+    tmp.write_bytes(data)
+    os.replace(tmp, path)
+
+
+def iter_chunks(data: bytes) -> Iterator[Tuple[bytes, int]]:
+    """Content-defined chunks of `data` at line boundaries: (bytes, line count)."""
+    start = pos = lines = 0
+    n = len(data)
+    while pos < n:
+        end = data.find(b"\n", pos)
+        end = n if end < 0 else end + 1
+        if end - start > CHUNK_MAX and pos > start:
+            # this line would overflow the chunk: close it before the line
+            yield data[start:pos], lines
+            start, lines = pos, 0
+        while end - start > CHUNK_MAX:
+            # a single overlong line: cut it at CHUNK_MAX
+            yield data[start:start + CHUNK_MAX], 0
+            start += CHUNK_MAX
+        line = data[max(pos, start):end]
+        lines += 1
+        pos = end
+        if end - start >= CHUNK_MIN and (zlib.crc32(line) & BOUNDARY_MASK) == 0:
+            yield data[start:end], lines
+            start, lines = end, 0
+    if start < n:
+        yield data[start:n], lines
+
+
+class SeriesStore:
+    """Chunked object store plus per-indicator ref logs."""
+
+    def __init__(self, root: Path | None = None):
+        self.root = Path(root) if root is not None else CAS_DIR
+        self._stat: Optional[Dict[str, List]] = None
+
+    # ---------- objects ----------
+    def _obj_path(self, h: str) -> Path:
+        return self.root / "objects" / h[:2] / h[2:]
+
+    def _ver_path(self, h: str) -> Path:
+        return self.root / "versions" / h[:2] / f"{h[2:]}.json"
+
+    def put(self, data: bytes) -> Tuple[str, int]:
+        """Store `data`; returns (file sha256, number of chunks that were new)."""
+        whole = hashlib.sha256()
+        chunks = []
+        new = 0
+        for chunk, lines in iter_chunks(data):
+            whole.update(chunk)
+            h = hashlib.sha256(chunk).hexdigest()
+            p = self._obj_path(h)
+            if not p.exists():
+                _write_atomic(p, zlib.compress(chunk, 6))
+                new += 1
+            chunks.append([h, len(chunk), lines])
+        sha = whole.hexdigest()
+        vp = self._ver_path(sha)
+        if not vp.exists():
+            _write_atomic(vp, json.dumps({"size": len(data), "chunks": chunks}).encode("utf-8"))
+        return sha, new
+
+    def version(self, sha: str) -> Dict:
+        return json.loads(self._ver_path(sha).read_text(encoding="utf-8"))
+
+    def _chunk(self, h: str) -> bytes:
+        return zlib.decompress(self._obj_path(h).read_bytes())
+
+    def read(self, sha: str) -> bytes:
+        return b"".join(self._chunk(h) for h, _, _ in self.version(sha)["chunks"])
+
+    # ---------- stat cache ----------
+    def _stat_cache(self) -> Dict[str, List]:
+        if self._stat is None:
+            p = self.root / "stat_cache.json"
+            try:
+                self._stat = json.loads(p.read_text(encoding="utf-8")) if p.exists() else {}
+            except ValueError:
+                self._stat = {}
+        return self._stat
+
+    def _save_stat_cache(self) -> None:
+        _write_atomic(self.root / "stat_cache.json", json.dumps(self._stat_cache(), sort_keys=True).encode("utf-8"))
+
+    def known_sha256(self, path: Path) -> Optional[str]:
+        """sha256 recorded for this file if its (size, mtime_ns) are unchanged."""
+        entry = self._stat_cache().get(Path(path).as_posix())
+        if entry and entry[:2] == _fingerprint(Path(path)):
+            return entry[2]
+        return None
+
+    def sha256(self, path: Path, save: bool = True) -> str:
+        """sha256 of a file, from the stat cache when the file is unchanged."""
+        path = Path(path)
+        sha = self.known_sha256(path)
+        if sha is None:
+            h = hashlib.sha256()
+            with open(path, "rb") as f:
+                for block in iter(lambda: f.read(1 << 20), b""):
+                    h.update(block)
+            sha = h.hexdigest()
+            self._stat_cache()[path.as_posix()] = _fingerprint(path) + [sha]
+            if save:
+                self._save_stat_cache()
+        return sha
+
+    # ---------- ref logs ----------
+    def _ref_path(self, name: str) -> Path:
+        return self.root / "refs" / f"{name}.jsonl"
+
+    def log(self, name: str) -> List[Dict]:
+        p = self._ref_path(name)
+        if not p.exists():
+            return []
+        return [json.loads(line) for line in p.read_text(encoding="utf-8").splitlines() if line.strip()]
+
+    def names(self) -> List[str]:
+        return sorted(p.stem for p in (self.root / "refs").glob("*.jsonl"))
+
+    def head(self, name: str) -> Optional[str]:
+        p = self._ref_path(name)
+        if not p.exists():
+            return None
+        lines = p.read_text(encoding="utf-8").splitlines()
+        return json.loads(lines[-1])["sha256"] if lines else None
+
+    def resolve(self, name: str, rev) -> str:
+        """A version of `name` by log position (int, negative from the end) or sha256 prefix."""
+        entries = self.log(name)
+        if not entries:
+            raise KeyError(f"No history for {name}")
+        if isinstance(rev, int) or str(rev).lstrip("-").isdigit():
+            return entries[int(rev)]["sha256"]
+        hits = {e["sha256"] for e in entries if e["sha256"].startswith(str(rev))}
+        if len(hits) != 1:
+            raise KeyError(f"{name}: revision {rev!r} matches {len(hits)} versions")
+        return hits.pop()
+
+    def commit(self, name: str, path: Path, message: str = "", when: Optional[float] = None,
+               save_stat: bool = True) -> Optional[str]:
+        """
+        Record the current content of `path` as the newest version of `name`.
+        Returns the sha256, or None when it equals the current head (nothing logged).
+        """
+        path = Path(path)
+        sha = self.known_sha256(path)
+        head = self.head(name)
+        if sha is not None and sha == head:
+            return None
+        data = path.read_bytes()
+        sha, new = self.put(data)
+        self._stat_cache()[path.as_posix()] = _fingerprint(path) + [sha]
+        if save_stat:
+            self._save_stat_cache()
+        if sha == head:
+            return None
+        entry = {"sha256": sha, "size": len(data), "new_chunks": new,
+                 "time": dt.datetime.fromtimestamp(when if when is not None else time.time()).isoformat(timespec="seconds"),
+                 "source": path.as_posix(), "message": message}
+        rp = self._ref_path(name)
+        rp.parent.mkdir(parents=True, exist_ok=True)
+        with open(rp, "a", encoding="utf-8") as f:
+            f.write(json.dumps(entry, sort_keys=True) + "\n")
+        return sha
+
+    def commit_many(self, paths: Iterable[Path], message: str = "") -> Dict[str, str]:
+        """Commit several files (indicator = file stem); returns {indicator: sha256} of new versions."""
+        out = {}
+        for p in paths:
+            sha = self.commit(Path(p).stem, p, message, save_stat=False)
+            if sha is not None:
+                out[Path(p).stem] = sha
+        self._save_stat_cache()
+        return out
+
+    # ---------- restore / diff ----------
+    def restore(self, name: str, rev=-1, out: Path | None = None) -> bytes:
+        data = self.read(self.resolve(name, rev))
+        if out is not None:
+            _write_atomic(Path(out), data)
+        return data
+
+    def diff(self, name: str, a=-2, b=-1, context: int = 3) -> str:
+        """Unified diff of two versions; chunks shared at either end are skipped undecoded."""
+        sa, sb = self.resolve(name, a), self.resolve(name, b)
+        ca, cb = self.version(sa)["chunks"], self.version(sb)["chunks"]
+        lo = 0
+        while lo < min(len(ca), len(cb)) and ca[lo][0] == cb[lo][0]:
+            lo += 1
+        hi = 0
+        while hi < min(len(ca), len(cb)) - lo and ca[-1 - hi][0] == cb[-1 - hi][0]:
+            hi += 1
+        skip = sum(c[2] for c in ca[:lo])
+        mid_a = b"".join(self._chunk(c[0]) for c in ca[lo:len(ca) - hi])
+        mid_b = b"".join(self._chunk(c[0]) for c in cb[lo:len(cb) - hi])
+        lines = difflib.unified_diff(mid_a.decode("utf-8", "replace").splitlines(keepends=True),
+                                     mid_b.decode("utf-8", "replace").splitlines(keepends=True),
+                                     fromfile=f"{name}@{sa[:12]}", tofile=f"{name}@{sb[:12]}", n=context)
+
+        def shift(m: re.Match) -> str:
+            return f"@@ -{int(m.group(1)) + skip}{m.group(2) or ''} +{int(m.group(3)) + skip}{m.group(4) or ''} @@"
+
+        return "".join(re.sub(r"^@@ -(\d+)(,\d+)? \+(\d+)(,\d+)? @@", shift, ln) if ln.startswith("@@") else ln
+                       for ln in lines)
+
+    # ---------- backups ----------
+    def import_backups(self, pro_dir: Path, delete: bool = False) -> int:
+        """
+        Fold <stem>.csv.<YYYYmmdd_HHMMSS>.bak files into the ref logs at their
+        backup time (the logs stay in time order, so heads are unchanged
+        unless a backup is newer). Returns the number of versions added.
+        """
+        baks: Dict[str, List[Tuple[str, Path]]] = {}
+        for p in Path(pro_dir).glob("*.bak"):
+            m = BAK_RE.match(p.name)
+            if m:
+                baks.setdefault(m.group("stem"), []).append((m.group("stamp"), p))
+        n = 0
+        for stem, items in sorted(baks.items()):
+            entries = self.log(stem)
+            known = {e["sha256"] for e in entries}
+            for stamp, p in sorted(items):
+                data = p.read_bytes()
+                sha, new = self.put(data)
+                if sha not in known:
+                    when = dt.datetime.strptime(stamp, "%Y%m%d_%H%M%S").isoformat(timespec="seconds")
+                    entries.append({"sha256": sha, "size": len(data), "new_chunks": new, "time": when,
+                                    "source": p.as_posix(), "message": f"backup {p.name}"})
+                    known.add(sha)
+                    n += 1
+            entries.sort(key=lambda e: e["time"])
+            rp = self._ref_path(stem)
+            _write_atomic(rp, "".join(json.dumps(e, sort_keys=True) + "\n" for e in entries).encode("utf-8"))
+            if delete:
+                for _, p in items:
+                    p.unlink()
+        return n
+
+    def stats(self) -> Dict[str, int]:
+        objs = [p for p in (self.root / "objects").rglob("*") if p.is_file()]
+        logical = sum(e["size"] for name in self.names() for e in self.log(name))
+        return {"indicators": len(self.names()), "versions": sum(len(self.log(n)) for n in self.names()),
+                "chunks": len(objs), "stored_bytes": sum(p.stat().st_size for p in objs), "logical_bytes": logical}
+
+
+def get_series_store(root: Path | None = None) -> SeriesStore:
+    root = Path(root) if root is not None else CAS_DIR
+    key = str(root.resolve())
+    if key not in _OPEN:
+        _OPEN[key] = SeriesStore(root)
+    return _OPEN[key]
+
+
+def main():
+    ap = argparse.ArgumentParser(description="Content-addressed history of processed-series files.")
+    sub = ap.add_subparsers(dest="cmd", required=True)
+
+    sp = sub.add_parser("commit", help="Record the current processed files")
+    sp.add_argument("--pro_dir", type=str, default="data/processed")
+    sp.add_argument("--indicators", nargs="*", default=None)
+    sp.add_argument("--message", type=str, default="manual snapshot")
+
+    sl = sub.add_parser("log", help="Show an indicator's ref log")
+    sl.add_argument("--indicator", required=True)
+
+    sr = sub.add_parser("restore", help="Write a previous version to a file")
+    sr.add_argument("--indicator", required=True)
+    sr.add_argument("--rev", default="-1", help="Log position (negative from the end) or sha256 prefix")
+    sr.add_argument("--out", required=True)
+
+    sd = sub.add_parser("diff", help="Unified diff between two versions")
+    sd.add_argument("--indicator", required=True)
+    sd.add_argument("--a", default="-2")
+    sd.add_argument("--b", default="-1")
+
+    sb = sub.add_parser("import-bak", help="Import *.csv.<stamp>.bak backups")
+    sb.add_argument("--pro_dir", type=str, default="data/processed")
+    sb.add_argument("--delete", action="store_true", help="Remove each backup once stored")
+
+    sub.add_parser("stats", help="Object counts and stored vs logical bytes")
+
+    ap.add_argument("--root", type=str, default=str(CAS_DIR))
+    args = ap.parse_args()
+    store = get_series_store(Path(args.root))
+
+    if args.cmd == "commit":
+        pro = Path(args.pro_dir)
+        paths = ([pro / f"{i}.csv" for i in args.indicators] if args.indicators else sorted(pro.glob("*.csv")))
+        new = store.commit_many([p for p in paths if p.exists()], args.message)
+        print(f"[cas] {len(new)} new versions: {', '.join(sorted(new)) or '-'}")
+    elif args.cmd == "log":
+        for i, e in enumerate(store.log(args.indicator)):
+            print(f"{i:>3}  {e['sha256'][:12]}  {e['time']}  {e['size']:>8}  +{e['new_chunks']} chunks  {e['message']}")
+    elif args.cmd == "restore":
+        data = store.restore(args.indicator, args.rev, Path(args.out))
+        print(f"[cas] restored {args.indicator}@{args.rev} ({len(data)} bytes) -> {args.out}")
+    elif args.cmd == "diff":
+        print(store.diff(args.indicator, args.a, args.b), end="")
+    elif args.cmd == "import-bak":
+        n = store.import_backups(Path(args.pro_dir), args.delete)
+        print(f"[cas] imported {n} backup versions")
+    else:
+        for k, v in store.stats().items():
+            print(f"{k}: {v}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,254 @@
+# models/common/changepoints.py
+"""
+Change-point detection for annual indicator series (PELT).
+
+Each series is segmented by exact penalised likelihood with PELT pruning
+(Killick, Fearnhead & Eckley 2012), which is linear in the series length when
+changes are spread through the series and never worse than quadratic (the
+meanvar cost is solved without pruning, see pelt()). Two
+Gaussian segment costs are available, both O(1) per segment from prefix sums
+of x and x^2:
+
+  mean      shift in level, common variance. The variance is the series'
+            sample variance: a break has to be large against the series'
+            whole spread. Genuine shifts inflate it, which makes the cost
+            conservative, but a smooth or trending series splits into a few
+            regimes rather than a staircase of minimum-length segments (a
+            first-difference estimate is tiny for such series).
+  meanvar   shift in the drift and/or volatility of the series: the
+            Gaussian mean-variance cost, m * log(segment variance), on the
+            first differences. On levels it rewards every split of a trend
+            (each short piece of a ramp has a small variance), so steady
+            trends came out as staircases. Segment variances are floored
+            at MEANVAR_FLOOR times the variance of all differences, so a
+            stretch of near-constant increments (e.g. a series interpolated
+            between census years) cannot buy a split by itself, and
+            segments are at least MEANVAR_MIN_SIZE differences long, since
+            a variance needs more points than a mean.
+
+The default penalty is BIC-style, (1 + parameters per segment) * log(n), i.e.
+2 log n for `mean` and 3 log n for `meanvar`. Segments are at least
+`min_size` observations long.
+
+detect_breaks_many() runs every series and cost in one call and returns a
+tidy table; the processing pipeline writes it to data/processed/breaks.csv
+(one row per break: indicator, cost, year, before/after segment stats), and
+models read it back with load_breaks(). A break year is the first year of the
+new regime.
+"""
+from __future__ import annotations
+from pathlib import Path
+from typing import Dict, Iterable, List, Optional, Sequence
+
+import numpy as np
+import pandas as pd
+
+BREAKS_CSV = Path("data/processed/breaks.csv")
+COSTS = ("mean", "meanvar")
+BREAK_COLUMNS = ["indicator", "cost", "year", "mean_before", "mean_after", "sd_before", "sd_after"]
+_N_PARAMS = {"mean": 1, "meanvar": 2}
+BATCH_MAX_LEN = 400
+MEANVAR_MIN_SIZE = 5
+MEANVAR_FLOOR = 0.1
+
+
+def _noise_var(x: np.ndarray) -> float:
+    """Noise variance of the `mean` cost: the sample variance of the series."""
+    return float(np.var(x, ddof=1)) if len(x) > 1 else 0.0
+
+
+class _SegmentCost:
+    """Cost of segment x[s:t] for vectors of start points s, from prefix sums."""
+
+    def __init__(self, x: np.ndarray, cost: str):
+        if cost not in COSTS:
+            raise ValueError(f"Unknown cost {cost!r} (expected one of {COSTS})")
+        self.cost = cost
+        self.s1 = np.concatenate([[0.0], np.cumsum(x)])
+        self.s2 = np.concatenate([[0.0], np.cumsum(x * x)])
+        self.var = _noise_var(x)
+        # floor keeps near-constant stretches from producing -inf (or merely
+        # very negative) costs
+        self.floor = max(float(np.var(x)), 1e-12) * MEANVAR_FLOOR
+
+    def __call__(self, s: np.ndarray, t: int) -> np.ndarray:
+        m = t - s
+        sm = self.s1[t] - self.s1[s]
+        ss = np.maximum(self.s2[t] - self.s2[s] - sm * sm / m, 0.0)
+        if self.cost == "mean":
+            return ss / self.var
+        return m * np.log(np.maximum(ss / m, self.floor))
+
+
+def _prepare(x: np.ndarray, cost: str, min_size: int) -> tuple[np.ndarray, int]:
+    """The sequence `cost` segments (first differences for meanvar) and its minimum segment length."""
+    if cost == "meanvar":
+        return np.diff(x), max(int(min_size), MEANVAR_MIN_SIZE)
+    return x, max(int(min_size), 1)
+
+
+def pelt(x: Sequence[float], cost: str = "mean", penalty: float | str = "bic", min_size: int = 3) -> List[int]:
+    """
+    Optimal segmentation of x under `cost` + `penalty` per change.
+    Returns the change locations as row indices (first index of each new segment).
+    """
+    x = np.asarray(x, dtype=np.float64)
+    x, min_size = _prepare(x[~np.isnan(x)], cost, min_size)
+    shift = 1 if cost == "meanvar" else 0  # difference i ends at observation i + 1
+    n = len(x)
+    if n < 2 * min_size:
+        return []
+    c = _SegmentCost(x, cost)
+    if cost == "mean" and c.var <= 0:
+        return []  # constant series: nothing to measure shifts against
+    pen = _penalty(penalty, cost, n)
+
+    f = np.full(n + 1, np.inf)
+    f[0] = -pen
+    last = np.zeros(n + 1, dtype=np.int64)
+    # dead[s]: first end point from which start point s is pruned
+    dead = np.full(n + 1, n + 1, dtype=np.int64)
+    cands = np.array([0], dtype=np.int64)
+    for t in range(min_size, n + 1):
+        cands = cands[dead[cands] > t]
+        s = cands[cands <= t - min_size]
+        vals = f[s] + c(s, t)
+        j = int(np.argmin(vals))
+        f[t] = vals[j] + pen
+        last[t] = s[j]
+        # PELT: a start point that cannot beat f[t] now never will again, once a
+        # segment starting at t is long enough to be an alternative. That needs
+        # splitting a segment never to raise its cost, which the variance floor
+        # of meanvar can break, so meanvar keeps every start point (O(n^2)).
+        if cost == "mean":
+            lose = s[vals > f[t]]
+            dead[lose] = np.minimum(dead[lose], t + min_size)
+        cands = np.append(cands, t - min_size + 1)
+
+    out = []
+    t = n
+    while t > 0:
+        t = int(last[t])
+        if t > 0:
+            out.append(t + shift)
+    return out[::-1]
+
+
+def _penalty(penalty: float | str, cost: str, n) -> np.ndarray | float:
+    return (1 + _N_PARAMS[cost]) * np.log(n) if penalty == "bic" else float(penalty)
+
+
+def pelt_batch(xs: Sequence[np.ndarray], cost: str = "mean", penalty: float | str = "bic",
+               min_size: int = 3) -> List[List[int]]:
+    """
+    pelt() for many short series at once. The series are padded into one
+    (series x time) array and the optimal-partition recursion is run for all of
+    them together, one vectorized step per time point, without pruning: for
+    annual-length series the per-step interpreter overhead, not the candidate
+    count, is what costs time. Gives the same segmentations as pelt().
+    """
+    xs = [np.asarray(x, dtype=np.float64) for x in xs]
+    prepared = [_prepare(x[~np.isnan(x)], cost, min_size) for x in xs]
+    xs = [x for x, _ in prepared]
+    min_size = prepared[0][1] if prepared else min_size
+    shift = 1 if cost == "meanvar" else 0
+    out: List[List[int]] = [[] for _ in xs]
+    costs = [_SegmentCost(x, cost) if len(x) >= 2 * min_size else None for x in xs]
+    live = [i for i, c in enumerate(costs) if c is not None and not (cost == "mean" and c.var <= 0)]
+    if not live:
+        return out
+    lens = np.array([len(xs[i]) for i in live])
+    n_max = int(lens.max())
+    s1 = np.zeros((len(live), n_max + 1))
+    s2 = np.zeros((len(live), n_max + 1))
+    for r, i in enumerate(live):
+        s1[r, :lens[r] + 1] = costs[i].s1
+        s2[r, :lens[r] + 1] = costs[i].s2
+        s1[r, lens[r] + 1:] = costs[i].s1[-1]  # padding: flat prefix sums, finite costs
+        s2[r, lens[r] + 1:] = costs[i].s2[-1]
+    var = np.array([costs[i].var for i in live])[:, None]
+    floor = np.array([costs[i].floor for i in live])[:, None]
+    pen = np.broadcast_to(_penalty(penalty, cost, lens), (len(live),)).astype(np.float64)
+
+    f = np.full((len(live), n_max + 1), np.inf)
+    f[:, 0] = -pen
+    last = np.zeros((len(live), n_max + 1), dtype=np.int64)
+    for t in range(min_size, n_max + 1):
+        k = t - min_size + 1
+        m = (t - np.arange(k))[None, :]
+        sm = s1[:, t:t + 1] - s1[:, :k]
+        ss = np.maximum(s2[:, t:t + 1] - s2[:, :k] - sm * sm / m, 0.0)
+        seg = ss / var if cost == "mean" else m * np.log(np.maximum(ss / m, floor))
+        vals = f[:, :k] + seg
+        j = np.argmin(vals, axis=1)
+        f[:, t] = vals[np.arange(len(live)), j] + pen
+        last[:, t] = j
+
+    for r, i in enumerate(live):
+        cps, t = [], int(lens[r])
+        while t > 0:
+            t = int(last[r, t])
+            if t > 0:
+                cps.append(t + shift)
+        out[i] = cps[::-1]
+    return out
+
+
+def _break_rows(name: str, cost: str, x: np.ndarray, years: np.ndarray, cps: List[int]) -> List[Dict]:
+    rows = []
+    bounds = [0] + cps + [len(x)]
+    for k, i in enumerate(cps):
+        a, b = x[bounds[k]:i], x[i:bounds[k + 2]]
+        rows.append({"indicator": name, "cost": cost, "year": int(years[i]),
+                     "mean_before": float(a.mean()), "mean_after": float(b.mean()),
+                     "sd_before": float(a.std(ddof=1)) if len(a) > 1 else np.nan,
+                     "sd_after": float(b.std(ddof=1)) if len(b) > 1 else np.nan})
+    return rows
+
+
+def detect_breaks(s: pd.Series, costs: Iterable[str] = COSTS, penalty: float | str = "bic",
+                  min_size: int = 3) -> pd.DataFrame:
+    """Breaks of one year-indexed series, one row per (cost, break)."""
+    return detect_breaks_many({s.name: s}, costs, penalty, min_size)
+
+
+def detect_breaks_many(series: Dict[str, pd.Series], costs: Iterable[str] = COSTS, penalty: float | str = "bic",
+                       min_size: int = 3) -> pd.DataFrame:
+    """
+    Breaks of every year-indexed series in one table (indicator, cost, year,
+    segment stats). Series up to BATCH_MAX_LEN observations go through
+    pelt_batch() together; longer ones through pelt() one at a time.
+    """
+    names, xs, years = [], [], []
+    for name, s in series.items():
+        s = s.dropna().sort_index()
+        names.append(name)
+        xs.append(s.to_numpy(dtype=np.float64))
+        years.append(np.asarray(s.index, dtype=np.int64))
+    short = [i for i, x in enumerate(xs) if len(x) <= BATCH_MAX_LEN]
+    rows = []
+    for cost in costs:
+        cps = dict(zip(short, pelt_batch([xs[i] for i in short], cost, penalty, min_size)))
+        for i in range(len(xs)):
+            if i not in cps:
+                cps[i] = pelt(xs[i], cost, penalty, min_size)
+            rows.extend(_break_rows(names[i], cost, xs[i], years[i], cps[i]))
+    return (pd.DataFrame(rows, columns=BREAK_COLUMNS)
+              .sort_values(["indicator", "cost", "year"], kind="stable", ignore_index=True))
+
+
+def load_breaks(path: Optional[Path] = None, cost: str = "mean") -> Dict[str, List[int]]:
+    """{indicator: [break years]} from breaks.csv for one cost ({} if the file is missing)."""
+    path = Path(path) if path is not None else BREAKS_CSV
+    if not path.exists():
+        print(f"[changepoints] {path} not found; run data/processing_pipeline.py")
+        return {}
+    df = pd.read_csv(path)
+    df = df[df["cost"] == cost].sort_values("year", kind="stable")
+    return {ind: g["year"].astype(int).tolist() for ind, g in df.groupby("indicator", sort=True)}
+
+
+def regime_labels(years: Sequence[int], break_years: Sequence[int]) -> np.ndarray:
+    """Regime number (0, 1, ...) of each year: the count of break years <= year."""
+    return np.searchsorted(np.sort(np.asarray(break_years, dtype=np.int64)),
+                           np.asarray(years, dtype=np.int64), side="right")
@@ -0,0 +1,161 @@
+# models/common/column_profile.py
+"""
+Single-pass column profiles for wide survey files.
+
+Each column is converted to numbers once, and every heuristic the ANES probes
+need is derived from that one conversion:
+
+  n_rows      rows profiled (all rows, or the sample)
+  n_numeric   rows with a numeric value
+  nunique     distinct numeric values
+  min, max    numeric range
+  n_year      rows with a value in 1948..2025 (year-like)
+  n_1_7       rows with an integer code 1..7 (ideology / party ID scales)
+  n_0_100     rows with a value in 0..100 (feeling thermometers)
+
+Counts rather than shares are stored so callers can use either denominator
+(all rows or numeric rows). When the file has a columnar ANES cache
+(models.common.anes_cache), profiles are computed from each column's
+dictionary and code counts without decoding any rows.
+
+Profiles persist next to the CSV as <stem>.profile.json, keyed on the source
+fingerprint (size, mtime_ns) and the sampling settings, so later probes and
+the year-column detection in process_mass_polarization_cdf.py read the sidecar
+instead of rescanning the data.
+"""
+from __future__ import annotations
+import json
+import os
+from pathlib import Path
+from typing import Dict, List, Optional
+
+import numpy as np
+import pandas as pd
+
+PROFILE_VERSION = 1
+YEAR_RANGE = (1948, 2025)
+FIELDS = ["n_rows", "n_numeric", "nunique", "min", "max", "n_year", "n_1_7", "n_0_100"]
+
+
+def profile_path(csv_path: Path) -> Path:
+    csv_path = Path(csv_path)
+    return csv_path.with_name(csv_path.stem + ".profile.json")
+
+
+def profile_counts(values: np.ndarray, counts: np.ndarray, n_rows: int) -> Dict:
+    """Profile from distinct numeric values (NaN allowed) and their row counts."""
+    values = np.asarray(values, dtype=np.float64)
+    counts = np.asarray(counts, dtype=np.int64)
+    num = ~np.isnan(values)
+    v, c = values[num], counts[num]
+    return {
+        "n_rows": int(n_rows),
+        "n_numeric": int(c.sum()),
+        "nunique": int(len(v)),
+        "min": float(v.min()) if len(v) else None,
+        "max": float(v.max()) if len(v) else None,
+        "n_year": int(c[(v >= YEAR_RANGE[0]) & (v <= YEAR_RANGE[1])].sum()),
+        "n_1_7": int(c[np.isin(v, np.arange(1, 8))].sum()),
+        "n_0_100": int(c[(v >= 0) & (v <= 100)].sum()),
+    }
+
+
+def profile_series(s: pd.Series) -> Dict:
+    """Profile one column (a single pd.to_numeric, then a value count)."""
+    vc = pd.to_numeric(s, errors="coerce").value_counts(dropna=True)
+    return profile_counts(vc.index.to_numpy(dtype=np.float64), vc.to_numpy(), len(s))
+
+
+def profile_frame(df: pd.DataFrame) -> pd.DataFrame:
+    return pd.DataFrame([profile_series(df[c]) for c in df.columns], index=pd.Index(df.columns, name="column"),
+                        columns=FIELDS)
+
+
+def _profile_cache(cache, rows: Optional[np.ndarray]) -> pd.DataFrame:
+    n = cache.n_rows if rows is None else len(rows)
+    recs = []
+    for c in cache.columns:
+        codes = np.asarray(cache.codes(c)) if rows is None else np.asarray(cache.codes(c)[rows])
+        d = cache.dictionary(c)
+        counts = np.bincount(codes, minlength=len(d))
+        if cache.meta["columns"][c]["kind"] == "num":
+            vals = np.asarray(d, dtype=np.float64)
+        else:
+            vals = pd.to_numeric(pd.Series(d), errors="coerce").to_numpy(dtype=np.float64)
+        recs.append(profile_counts(vals, counts, n))
+    return pd.DataFrame(recs, index=pd.Index(cache.columns, name="column"), columns=FIELDS)
+
+
+def profile_csv(csv_path: str | Path, sample: Optional[int] = None, seed: int = 0,
+                use_cache: bool = True, write: bool = True) -> pd.DataFrame:
+    """
+    Profile of every column of csv_path, from the sidecar when it matches the
+    file and sampling settings. sample=N profiles N random rows (all rows if
+    None). With use_cache the columnar ANES cache is used (and built if needed).
+    """
+    csv_path = Path(csv_path)
+    st = csv_path.stat()
+    key = {"version": PROFILE_VERSION, "fingerprint": [int(st.st_size), int(st.st_mtime_ns)],
+           "sample": sample, "seed": seed if sample else None}
+    sp = profile_path(csv_path)
+    if sp.exists():
+        try:
+            blob = json.loads(sp.read_text(encoding="utf-8"))
+            if blob.get("key") == key:
+                return pd.DataFrame.from_dict(blob["columns"], orient="index", columns=FIELDS).rename_axis("column")
+        except ValueError:
+            pass
+
+    if use_cache:
+        from .anes_cache import open_anes
+
+        cache = open_anes(csv_path)
+        rows = None
+        if sample is not None and sample < cache.n_rows:
+            rows = np.sort(np.random.default_rng(seed).choice(cache.n_rows, size=sample, replace=False))
+        prof = _profile_cache(cache, rows)
+    else:
+        df = pd.read_csv(csv_path, dtype=str, keep_default_na=False, low_memory=False)
+        if sample is not None and sample < len(df):
+            df = df.sample(n=sample, random_state=seed)
+        prof = profile_frame(df)
+
+    if write:
+        try:
+            blob = {"key": key, "columns": json.loads(prof.to_json(orient="index"))}
+            tmp = sp.with_name(sp.name + ".tmp")
+            tmp.write_text(json.dumps(blob), encoding="utf-8")
+            os.replace(tmp, sp)
+        except OSError:
+            pass  # read-only data dir: profile just isn't persisted
+    print(f"[column_profile] profiled {len(prof)} columns of {csv_path.name}"
+          + (f" (sample {sample})" if sample else ""))
+    return prof
+
+
+# ---------- heuristics shared by the probes and year detection ----------
+def year_candidates(prof: pd.DataFrame, min_numeric: int = 1000, min_share: float = 0.8,
+                    max_unique: int = 200) -> List[str]:
+    """Mostly year-like numeric columns with few distinct values."""
+    p = prof[prof["n_numeric"] > min_numeric]
+    share = p["n_year"] / p["n_numeric"]
+    return p.index[(share > min_share) & (p["nunique"] < max_unique)].tolist()
+
+
+def best_year_column(prof: pd.DataFrame, min_share: float = 0.5, max_unique: int = 200) -> Optional[str]:
+    """
+    Best year column: share of *all* rows in the year range, damped by
+    cardinality (score = share * (1 - min(nunique, 500) / 500)).
+    """
+    share = prof["n_year"] / prof["n_rows"].where(prof["n_rows"] > 0)
+    score = share * (1.0 - prof["nunique"].clip(upper=500) / 500.0)
+    ok = (share > min_share) & (prof["nunique"] < max_unique)
+    return score[ok].idxmax() if ok.any() else None
+
+
+def scale_candidates(prof: pd.DataFrame, field: str, min_share: float, min_numeric: int = 1000) -> List[tuple]:
+    """(column, share) for columns whose numeric values mostly satisfy `field` ('n_1_7' or 'n_0_100')."""
+    p = prof[prof["n_numeric"] > min_numeric]
+    share = p[field] / p["n_numeric"]
+    hit = share[share > min_share]
+    return [(c, round(float(s), 3)) for c, s in hit.items()]
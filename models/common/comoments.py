@@ -0,0 +1,159 @@
+# models/common/comoments.py
+"""
+Per-origin, pairwise-complete correlation matrices from running co-moments.
+
+Walking the compiled panel (models.common.panel_store) year by year, we
+accumulate for every pair (i, j) over years where both are observed:
+
+  n[i, j]    count
+  sx[i, j]   sum of x_i          (sx[j, i] is the sum of x_j)
+  sxx[i, j]  sum of x_i^2
+  sxy[i, j]  sum of x_i * x_j
+
+The accumulators after year t give the correlation matrix "as of origin t" in
+O(k^2) without any joins. Values are centred on each column's mean first; this
+is purely for numerical stability (correlation is shift-invariant), so no
+information from after the origin enters the result.
+
+Results for every year in the panel are cached in one file,
+data/processed/_panel/origin_corr.npz (corr float32 and overlap counts per
+origin), and rebuilt whenever the panel store is recompiled.
+"""
+from __future__ import annotations
+import hashlib
+import json
+from pathlib import Path
+from typing import Dict, Iterable, List, Tuple
+
+import numpy as np
+import pandas as pd
+
+from .panel_store import PanelStore, open_panel
+
+CACHE_NAME = "origin_corr.npz"
+
+_MEMO: Dict[str, Dict] = {}
+
+
+class RunningComoments:
+    """Pairwise sufficient statistics, updated one year (row) at a time."""
+
+    def __init__(self, k: int, centre: np.ndarray | None = None):
+        self.centre = np.zeros(k) if centre is None else np.asarray(centre, dtype=np.float64)
+        self.n = np.zeros((k, k))
+        self.sx = np.zeros((k, k))
+        self.sxx = np.zeros((k, k))
+        self.sxy = np.zeros((k, k))
+
+    def update(self, values: np.ndarray, mask: np.ndarray) -> None:
+        """Fold in one or more rows ((k,) or (t, k))."""
+        m = np.atleast_2d(np.asarray(mask, dtype=np.float64))
+        x = np.where(m > 0, np.atleast_2d(values) - self.centre, 0.0)
+        self.n += m.T @ m
+        self.sx += x.T @ m
+        self.sxx += (x * x).T @ m
+        self.sxy += x.T @ x
+
+    def corr(self, min_periods: int = 2) -> np.ndarray:
+        return corr_from_comoments(self.n, self.sx, self.sxx, self.sxy, min_periods)
+
+
+def origin_corr_table(values: np.ndarray, mask: np.ndarray, min_periods: int = 2) -> Tuple[np.ndarray, np.ndarray]:
+    """
+    Correlation and overlap count as of every row: (T, k, k) float32 and uint16.
+
+    Each column is centred on its mean before accumulating; correlation is
+    shift-invariant so this only improves conditioning and leaks nothing.
+    """
+    values = np.asarray(values, dtype=np.float64)
+    mask = np.asarray(mask, dtype=bool)
+    T, k = values.shape
+    cnt = mask.sum(axis=0)
+    tot = np.where(mask, values, 0.0).sum(axis=0)
+    centre = np.divide(tot, cnt, out=np.zeros(k), where=cnt > 0)
+
+    acc = RunningComoments(k, centre)
+    corr = np.full((T, k, k), np.nan, dtype=np.float32)
+    count = np.zeros((T, k, k), dtype=np.uint16)
+    cap = np.iinfo(np.uint16).max
+    for t in range(T):
+        if mask[t].any():
+            acc.update(values[t], mask[t])
+        corr[t] = acc.corr(min_periods)
+        count[t] = np.minimum(acc.n, cap)
+    return corr, count
+
+
+def corr_from_comoments(n, sx, sxx, sxy, min_periods: int = 2) -> np.ndarray:
+    """Pairwise-complete Pearson correlation from accumulated co-moments (any leading dims)."""
+    sy = np.swapaxes(sx, -1, -2)
+    syy = np.swapaxes(sxx, -1, -2)
+    with np.errstate(invalid="ignore", divide="ignore"):
+        safe_n = np.where(n > 0, n, 1.0)
+        cov = sxy - sx * sy / safe_n
+        vx = sxx - sx * sx / safe_n
+        vy = syy - sy * sy / safe_n
+        r = cov / np.sqrt(vx * vy)
+    r = np.where((n >= min_periods) & (vx > 0) & (vy > 0), np.clip(r, -1.0, 1.0), np.nan)
+    return r
+
+
+def _panel_key(store: PanelStore) -> str:
+    blob = json.dumps({"indicators": store.indicators, "sources": store.meta.get("sources", {}),
+                       "year0": store.year0, "n_years": int(store.values.shape[0])}, sort_keys=True)
+    return hashlib.sha256(blob.encode("utf-8")).hexdigest()
+
+
+def _load_or_build(store: PanelStore) -> Dict:
+    key = _panel_key(store)
+    memo = _MEMO.get(str(store.root.resolve()))
+    if memo is not None and memo["key"] == key:
+        return memo
+
+    path = store.root / CACHE_NAME
+    data = None
+    if path.exists():
+        with np.load(path, allow_pickle=False) as z:
+            if str(z["key"]) == key:
+                data = {k: z[k] for k in ("corr", "count")}
+    if data is None:
+        corr, count = origin_corr_table(store.values, store.mask)
+        np.savez_compressed(path, key=np.array(key), corr=corr, count=count,
+                            years=store.years, indicators=np.array(store.indicators))
+        print(f"[comoments] cached per-origin correlations for {len(store.years)} origins -> {path}")
+        data = {"corr": corr, "count": count}
+
+    memo = {"key": key, "year0": store.year0, "index": {ind: j for j, ind in enumerate(store.indicators)}, **data}
+    _MEMO[str(store.root.resolve())] = memo
+    return memo
+
+
+def _origin_block(indicators: List[str], origin: int, pro_dir: Path | None, what: str) -> pd.DataFrame:
+    store = open_panel(indicators, pro_dir)
+    memo = _load_or_build(store)
+    cols = [memo["index"][ind] for ind in indicators]
+    n_years = memo["corr"].shape[0]
+    t = int(origin) - memo["year0"]
+    if t < 0:
+        block = np.full((len(cols), len(cols)), np.nan if what == "corr" else 0)
+    else:
+        block = memo[what][min(t, n_years - 1)][np.ix_(cols, cols)]
+    return pd.DataFrame(block, index=indicators, columns=indicators)
+
+
+def origin_corr(indicators: Iterable[str], origin: int, pro_dir: Path | None = None) -> pd.DataFrame:
+    """
+    Pairwise-complete correlation of `indicators` using only years <= origin.
+    Pairs with fewer than two overlapping years are NaN; the diagonal is 1.
+    """
+    indicators = list(indicators)
+    df = _origin_block(indicators, origin, pro_dir, "corr").astype(float)
+    arr = df.to_numpy(copy=True)
+    np.fill_diagonal(arr, 1.0)
+    return pd.DataFrame(arr, index=df.index, columns=df.columns)
+
+
+def origin_overlap(indicators: Iterable[str], origin: int, pro_dir: Path | None = None) -> pd.DataFrame:
+    """Number of overlapping observed years <= origin for each pair."""
+    indicators = list(indicators)
+    return _origin_block(indicators, origin, pro_dir, "count").astype(int)
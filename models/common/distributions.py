@@ -0,0 +1,386 @@
+# models/common/distributions.py
+"""
+Vectorized forecast distributions: one object holds the predictive
+distribution of every (indicator, origin, horizon) row of a forecast, as
+parameters, and evaluates quantiles, CDF / PIT, central intervals and CRPS
+over all rows at once, only when asked.
+
+  GaussianForecast(keys, mu, sigma)           closed-form quantile, CDF and CRPS
+  SampleForecast(keys, samples)               (n, m) draws per row; empirical CDF / CRPS
+  QuantileGridForecast(keys, levels, values)  (n, k) quantiles at k levels per row
+
+`keys` is a frame with any of the columns indicator, origin, horizon, one
+row per forecast row. Between and beyond its levels a quantile grid is
+interpolated linearly in the normal score z = Phi^{-1}(p), so a grid taken
+from a Gaussian is reproduced exactly (a three-point q05/q50/q95 grid
+becomes a two-piece normal).
+
+Distributions persist as their parameters (to_frame / save, read back with
+from_frame / read_distribution): mu,sigma for Gaussians, q.. columns for
+grids, s0..s{m-1} columns for samples. quantile_frame(levels) gives the
+materialized q05/q50/q95 layout of the existing forecast files.
+
+  dist = GaussianForecast(keys, mu, sigma)
+  dist.quantile([0.05, 0.5, 0.95])       # (n, 3)
+  y = observed_values(dist.keys, truth)   # truth: {indicator: year-indexed series}
+  dist.pit(y), dist.crps(y), dist.covers(y, 0.9)
+"""
+from __future__ import annotations
+import re
+from pathlib import Path
+from typing import Iterable, Mapping, Sequence, Tuple
+
+import numpy as np
+import pandas as pd
+from scipy.special import ndtr, ndtri
+
+KEY_COLS = ("indicator", "origin", "horizon")
+SIGMA_MIN = 1e-9
+_QCOL = re.compile(r"^q(\d+(?:\.\d+)?)$")
+_SCOL = re.compile(r"^s(\d+)$")
+_CRPS_LEVELS = (np.arange(200) + 0.5) / 200  # midpoint rule for grid CRPS
+
+
+def quantile_name(p: float) -> str:
+    """Column name of quantile level p in forecast files: 0.05 -> q05, 0.5 -> q50, 0.025 -> q2.5."""
+    return f"q{100.0 * float(p):02g}"
+
+
+def quantile_level(name: str) -> float | None:
+    """Inverse of quantile_name (also accepts q5 for 0.05); None if `name` is not a quantile column."""
+    m = _QCOL.match(str(name).strip().lower())
+    return float(m.group(1)) / 100.0 if m else None
+
+
+def _levels(p) -> Tuple[np.ndarray, bool]:
+    arr = np.asarray(p, dtype=np.float64)
+    if np.any((arr <= 0.0) | (arr >= 1.0)):
+        raise ValueError("quantile levels must lie strictly between 0 and 1")
+    return np.atleast_1d(arr), arr.ndim == 0
+
+
+def _rows(rows) -> np.ndarray:
+    rows = np.asarray(rows)
+    return np.flatnonzero(rows) if rows.dtype == bool else rows
+
+
+def _keys(keys: pd.DataFrame | None, n: int) -> pd.DataFrame:
+    if keys is None:
+        return pd.DataFrame(index=pd.RangeIndex(n))
+    keys = keys[[c for c in KEY_COLS if c in keys.columns]].reset_index(drop=True)
+    if len(keys) != n:
+        raise ValueError(f"keys have {len(keys)} rows, parameters {n}")
+    return keys
+
+
+class ForecastDistribution:
+    """Predictive distributions of n forecast rows; subclasses define the parameters."""
+
+    kind = "distribution"
+
+    def __init__(self, keys: pd.DataFrame | None, n: int):
+        self.keys = _keys(keys, n)
+        self.attrs: dict = {}  # free-form metadata, as DataFrame.attrs
+
+    def __len__(self) -> int:
+        return len(self.keys)
+
+    def __repr__(self) -> str:
+        return f"{type(self).__name__}({len(self)} rows)"
+
+    # --- subclass interface -------------------------------------------------
+    def _quantile(self, p: np.ndarray) -> np.ndarray:
+        """(n, k) quantiles at levels p (k,)."""
+        raise NotImplementedError
+
+    def _cdf(self, y: np.ndarray) -> np.ndarray:
+        raise NotImplementedError
+
+    def _crps(self, y: np.ndarray) -> np.ndarray:
+        raise NotImplementedError
+
+    def params(self) -> pd.DataFrame:
+        """Parameter columns, one row per forecast row."""
+        raise NotImplementedError
+
+    def take(self, rows) -> "ForecastDistribution":
+        """The distributions of a subset of rows (boolean mask or positions)."""
+        raise NotImplementedError
+
+    # --- evaluation ---------------------------------------------------------
+    def _y(self, y) -> np.ndarray:
+        y = np.asarray(y, dtype=np.float64)
+        if y.ndim == 0:
+            y = np.full(len(self), float(y))
+        if y.shape != (len(self),):
+            raise ValueError(f"expected {len(self)} observations, got shape {y.shape}")
+        return y
+
+    def _on_observed(self, name: str, y) -> np.ndarray:
+        y = self._y(y)
+        ok = ~np.isnan(y)
+        if ok.all():
+            return getattr(self, name)(y)
+        out = np.full(len(self), np.nan)
+        if ok.any():
+            out[ok] = getattr(self.take(ok), name)(y[ok])
+        return out
+
+    def quantile(self, p) -> np.ndarray:
+        """Quantiles at level(s) p: (n,) for a scalar level, (n, k) for k levels."""
+        levels, scalar = _levels(p)
+        q = self._quantile(levels)
+        return q[:, 0] if scalar else q
+
+    def median(self) -> np.ndarray:
+        return self.quantile(0.5)
+
+    def cdf(self, y) -> np.ndarray:
+        """P(Y <= y) per row (NaN where y is NaN)."""
+        return self._on_observed("_cdf", y)
+
+    def pit(self, y) -> np.ndarray:
+        """Probability integral transform of the observations (the CDF at y)."""
+        return self.cdf(y)
+
+    def interval(self, level: float = 0.9) -> Tuple[np.ndarray, np.ndarray]:
+        """Central interval with coverage `level`: (lower, upper), each (n,)."""
+        a = 0.5 * (1.0 - float(level))
+        q = self.quantile([a, 1.0 - a])
+        return q[:, 0], q[:, 1]
+
+    def covers(self, y, level: float = 0.9) -> np.ndarray:
+        """Whether y lies in the central `level` interval (False where y is NaN)."""
+        y = self._y(y)
+        lo, hi = self.interval(level)
+        return (np.minimum(lo, hi) <= y) & (y <= np.maximum(lo, hi))
+
+    def crps(self, y) -> np.ndarray:
+        """Continuous ranked probability score per row (NaN where y is NaN)."""
+        return self._on_observed("_crps", y)
+
+    # --- frames -------------------------------------------------------------
+    def quantile_frame(self, levels: Sequence[float] = (0.05, 0.5, 0.95)) -> pd.DataFrame:
+        """keys + one q.. column per level (the materialized forecast-file layout)."""
+        q = self.quantile(list(levels))
+        return pd.concat([self.keys, pd.DataFrame(q, columns=[quantile_name(p) for p in levels])], axis=1)
+
+    def to_frame(self) -> pd.DataFrame:
+        """keys + parameter columns (see from_frame)."""
+        return pd.concat([self.keys, self.params()], axis=1)
+
+    def save(self, path: str | Path) -> Path:
+        path = Path(path)
+        path.parent.mkdir(parents=True, exist_ok=True)
+        self.to_frame().to_csv(path, index=False)
+        return path
+
+
+class GaussianForecast(ForecastDistribution):
+    """N(mu, sigma^2) per row."""
+
+    kind = "gaussian"
+
+    def __init__(self, keys: pd.DataFrame | None, mu, sigma):
+        self.mu = np.asarray(mu, dtype=np.float64).reshape(-1)
+        self.sigma = np.maximum(np.asarray(sigma, dtype=np.float64).reshape(-1), SIGMA_MIN)
+        if self.mu.shape != self.sigma.shape:
+            raise ValueError("mu and sigma must have the same length")
+        super().__init__(keys, len(self.mu))
+
+    @classmethod
+    def from_quantiles(cls, keys: pd.DataFrame | None, median, upper, lower=None,
+                       level: float = 0.90) -> "GaussianForecast":
+        """
+        Gaussian with mu = median and sigma from the central `level` interval
+        [lower, upper]: (upper - lower) / (2 z), or (upper - median) / z when
+        only the upper quantile is used.
+        """
+        z = float(ndtri(0.5 + 0.5 * float(level)))
+        median = np.asarray(median, dtype=np.float64)
+        upper = np.asarray(upper, dtype=np.float64)
+        if lower is None:
+            sigma = (upper - median) / z
+        else:
+            sigma = (upper - np.asarray(lower, dtype=np.float64)) / (2.0 * z)
+        return cls(keys, median, sigma)
+
+    def _quantile(self, p):
+        return self.mu[:, None] + self.sigma[:, None] * ndtri(p)[None, :]
+
+    def _cdf(self, y):
+        return ndtr((y - self.mu) / self.sigma)
+
+    def _crps(self, y):
+        z = (y - self.mu) / self.sigma
+        pdf = np.exp(-0.5 * z * z) / np.sqrt(2.0 * np.pi)
+        return self.sigma * (z * (2.0 * ndtr(z) - 1.0) + 2.0 * pdf - 1.0 / np.sqrt(np.pi))
+
+    def params(self):
+        return pd.DataFrame({"mu": self.mu, "sigma": self.sigma})
+
+    def take(self, rows):
+        rows = _rows(rows)
+        return GaussianForecast(self.keys.iloc[rows], self.mu[rows], self.sigma[rows])
+
+
+class SampleForecast(ForecastDistribution):
+    """Empirical distribution of m draws per row ((n, m) array)."""
+
+    kind = "samples"
+
+    def __init__(self, keys: pd.DataFrame | None, samples):
+        samples = np.asarray(samples, dtype=np.float64)
+        if samples.ndim != 2 or samples.shape[1] == 0:
+            raise ValueError("samples must be an (n, m) array with m >= 1")
+        self.samples = samples
+        self._sorted = None
+        super().__init__(keys, samples.shape[0])
+
+    @property
+    def sorted(self) -> np.ndarray:
+        if self._sorted is None:
+            self._sorted = np.sort(self.samples, axis=1)
+        return self._sorted
+
+    def _quantile(self, p):
+        return np.quantile(self.sorted, p, axis=1).T
+
+    def _cdf(self, y):
+        return (self.sorted <= y[:, None]).mean(axis=1)
+
+    def _crps(self, y):
+        # CRPS of the empirical distribution: E|X - y| - E|X - X'| / 2
+        x = self.sorted
+        m = x.shape[1]
+        w = (2.0 * np.arange(1, m + 1) - m - 1) / (m * m)
+        return np.abs(x - y[:, None]).mean(axis=1) - x @ w
+
+    def params(self):
+        return pd.DataFrame(self.samples, columns=[f"s{j}" for j in range(self.samples.shape[1])])
+
+    def take(self, rows):
+        rows = _rows(rows)
+        return SampleForecast(self.keys.iloc[rows], self.samples[rows])
+
+
+class QuantileGridForecast(ForecastDistribution):
+    """
+    Quantiles at k fixed levels per row ((n, k) values), interpolated
+    linearly in the normal score between levels and extrapolated the same
+    way beyond them. Non-monotone rows are made non-decreasing.
+    """
+
+    kind = "quantile_grid"
+
+    def __init__(self, keys: pd.DataFrame | None, levels, values):
+        levels = np.asarray(levels, dtype=np.float64).reshape(-1)
+        values = np.asarray(values, dtype=np.float64)
+        if values.ndim != 2 or values.shape[1] != len(levels) or len(levels) < 2:
+            raise ValueError("values must be an (n, k) array matching k >= 2 levels")
+        _levels(levels)
+        order = np.argsort(levels)
+        self.levels = levels[order]
+        self.values = np.maximum.accumulate(values[:, order], axis=1)
+        self._z = ndtri(self.levels)
+        super().__init__(keys, values.shape[0])
+
+    def _quantile(self, p):
+        z = ndtri(p)
+        # segment of each level (end segments extended), then linear in z
+        j = np.clip(np.searchsorted(self._z, z) - 1, 0, len(self._z) - 2)
+        z0, z1 = self._z[j], self._z[j + 1]
+        v0, v1 = self.values[:, j], self.values[:, j + 1]
+        return v0 + (v1 - v0) * ((z - z0) / (z1 - z0))[None, :]
+
+    def _cdf(self, y):
+        v = self.values
+        n, k = v.shape
+        # last grid value <= y (end segments extended on both sides)
+        j = np.clip((v <= y[:, None]).sum(axis=1) - 1, 0, k - 2)
+        rows = np.arange(n)
+        v0, v1 = v[rows, j], v[rows, j + 1]
+        z0, z1 = self._z[j], self._z[j + 1]
+        with np.errstate(divide="ignore", invalid="ignore"):
+            z = z0 + (z1 - z0) * (y - v0) / (v1 - v0)
+        # flat segment: a point mass; y at or above it counts it fully
+        z = np.where(v1 > v0, z, np.where(y >= v1, z1, z0))
+        return ndtr(z)
+
+    def _crps(self, y):
+        # CRPS = 2 * integral over levels of the quantile (pinball) score
+        # (1{y < q} - tau) (q - y), midpoint rule
+        q = self._quantile(_CRPS_LEVELS)
+        below = (y[:, None] < q).astype(np.float64)
+        return 2.0 * np.mean((below - _CRPS_LEVELS[None, :]) * (q - y[:, None]), axis=1)
+
+    def params(self):
+        return pd.DataFrame(self.values, columns=[quantile_name(p) for p in self.levels])
+
+    def take(self, rows):
+        rows = _rows(rows)
+        return QuantileGridForecast(self.keys.iloc[rows], self.levels, self.values[rows])
+
+
+def from_frame(df: pd.DataFrame) -> ForecastDistribution:
+    """
+    Distribution from a parameter frame (to_frame layout): mu,sigma ->
+    Gaussian; s0..s{m-1} -> samples; q.. columns (q05 / q5 / q50 / q95 ...)
+    -> quantile grid.
+    """
+    cols = {str(c).strip().lower(): c for c in df.columns}
+    keys = df[[cols[c] for c in KEY_COLS if c in cols]].rename(columns={cols[c]: c for c in KEY_COLS if c in cols})
+    if "mu" in cols and "sigma" in cols:
+        return GaussianForecast(keys, pd.to_numeric(df[cols["mu"]]), pd.to_numeric(df[cols["sigma"]]))
+    scols = sorted((int(_SCOL.match(c).group(1)), orig) for c, orig in cols.items() if _SCOL.match(c))
+    if scols:
+        return SampleForecast(keys, df[[orig for _, orig in scols]].apply(pd.to_numeric).to_numpy())
+    qcols = sorted((quantile_level(c), orig) for c, orig in cols.items() if quantile_level(c) is not None)
+    if len(qcols) >= 2:
+        return QuantileGridForecast(keys, [p for p, _ in qcols],
+                                    df[[orig for _, orig in qcols]].apply(pd.to_numeric).to_numpy())
+    raise ValueError(f"No distribution parameters (mu/sigma, s0.., q..) in columns {list(df.columns)}")
+
+
+def read_distribution(path: str | Path) -> ForecastDistribution:
+    return from_frame(pd.read_csv(path))
+
+
+def concat(dists: Iterable[ForecastDistribution]) -> ForecastDistribution:
+    """Rows of several distributions of the same type (and levels / draw count) in one."""
+    dists = list(dists)
+    if not dists:
+        raise ValueError("nothing to concatenate")
+    kind = type(dists[0])
+    if any(type(d) is not kind for d in dists):
+        raise ValueError("cannot concatenate different distribution types")
+    keys = pd.concat([d.keys for d in dists], ignore_index=True)
+    if kind is GaussianForecast:
+        return GaussianForecast(keys, np.concatenate([d.mu for d in dists]), np.concatenate([d.sigma for d in dists]))
+    if kind is SampleForecast:
+        return SampleForecast(keys, np.vstack([d.samples for d in dists]))
+    if kind is QuantileGridForecast:
+        if any(not np.array_equal(d.levels, dists[0].levels) for d in dists):
+            raise ValueError("quantile grids have different levels")
+        return QuantileGridForecast(keys, dists[0].levels, np.vstack([d.values for d in dists]))
+    raise TypeError(f"cannot concatenate {kind.__name__}")
+
+
+def observed_values(keys: pd.DataFrame, truth: Mapping[str, pd.Series]) -> np.ndarray:
+    """
+    Observed value for each (indicator, origin, horizon) row: the indicator's
+    value in year origin + horizon, NaN if not observed. `truth` maps
+    indicator -> year-indexed series.
+    """
+    y = np.full(len(keys), np.nan)
+    years = keys["origin"].to_numpy(dtype=np.int64) + keys["horizon"].to_numpy(dtype=np.int64)
+    ind = keys["indicator"].to_numpy()
+    for name in pd.unique(ind):
+        s = truth.get(name)
+        if s is None:
+            continue
+        s = pd.to_numeric(s, errors="coerce").dropna()
+        s = s.groupby(np.asarray(s.index, dtype=np.int64)).mean()
+        rows = np.flatnonzero(ind == name)
+        y[rows] = s.reindex(years[rows]).to_numpy(dtype=np.float64)
+    return y
@@ -0,0 +1,219 @@
+# models/common/fit_cache.py
+"""
+Persistent on-disk cache of fitted forecast models (fitted parameters and
+predictive moments), shared by every process and entry point that fits them.
+
+An entry is keyed by (indicator, origin, data hash, spec):
+
+  data hash   sha256 of the training slice's (year, value) pairs, so a
+              revised or extended series never hits an old fit
+  spec        model specification / backend / library version string of the
+              caller, plus CACHE_VERSION; changing either orphans old entries
+
+Layout (data/fit_cache/):
+  ab/cdef....json   one entry, named by the sha256 of its key:
+                    {"key": {...}, "payload": {...}, "time": ...}
+
+Entries are written atomically (tmp file + os.replace) by the process that
+owns the results, so concurrent runs at worst refit the same model. Payload
+values are JSON (floats round-trip exactly); numpy arrays come back as lists.
+
+Eviction is least-recently-used: a hit touches the entry's mtime, and once
+the cache holds more than max_entries entries or max_bytes bytes, the
+oldest are deleted down to 90% of both limits. Unreadable entries are
+treated as misses and removed.
+
+Usage:
+  python -m models.common.fit_cache stats
+  python -m models.common.fit_cache prune [--max_entries N] [--max_mb M]
+  python -m models.common.fit_cache clear
+"""
+from __future__ import annotations
+import argparse
+import hashlib
+import json
+import os
+import time
+from pathlib import Path
+from typing import Any, Dict, List, Optional, Tuple
+
+import numpy as np
+
+FIT_CACHE_DIR = Path("data/fit_cache")
+CACHE_VERSION = 1
+MAX_ENTRIES = 20000
+MAX_BYTES = 256 << 20
+
+_OPEN: Dict[str, "FitCache"] = {}
+
+
+def series_hash(years: Any, values: Any) -> str:
+    """sha256 of a training slice's observed (year, value) pairs."""
+    years = np.asarray(years, dtype=np.int64)
+    values = np.asarray(values, dtype=np.float64)
+    ok = ~np.isnan(values)
+    h = hashlib.sha256(np.ascontiguousarray(years[ok], dtype="<i8").tobytes())
+    h.update(np.ascontiguousarray(values[ok], dtype="<f8").tobytes())
+    return h.hexdigest()
+
+
+def _jsonable(v: Any) -> Any:
+    if isinstance(v, np.ndarray):
+        return v.tolist()
+    if isinstance(v, np.generic):
+        return v.item()
+    if isinstance(v, dict):
+        return {k: _jsonable(x) for k, x in v.items()}
+    if isinstance(v, (list, tuple)):
+        return [_jsonable(x) for x in v]
+    return v
+
+
+class FitCache:
+    """Directory of fitted-model entries with LRU eviction and hit/miss counters."""
+
+    def __init__(self, root: str | Path = FIT_CACHE_DIR, max_entries: int = MAX_ENTRIES,
+                 max_bytes: int = MAX_BYTES):
+        if max_entries <= 0 or max_bytes <= 0:
+            raise ValueError("max_entries and max_bytes must be positive")
+        self.root = Path(root)
+        self.max_entries = int(max_entries)
+        self.max_bytes = int(max_bytes)
+        self._usage: Optional[List[int]] = None  # [entries, bytes], scanned lazily
+        self.hits = 0
+        self.misses = 0
+        self.writes = 0
+
+    @staticmethod
+    def make_key(indicator: str, origin: int, data_hash: str, spec: str) -> Dict[str, Any]:
+        return {"indicator": str(indicator), "origin": int(origin), "data": str(data_hash),
+                "spec": str(spec), "version": CACHE_VERSION}
+
+    def _path(self, key: Dict[str, Any]) -> Path:
+        digest = hashlib.sha256(json.dumps(key, sort_keys=True).encode("utf-8")).hexdigest()
+        return self.root / digest[:2] / f"{digest[2:]}.json"
+
+    def get(self, key: Dict[str, Any]) -> Optional[Dict[str, Any]]:
+        """Payload stored under `key`, or None (a miss)."""
+        path = self._path(key)
+        try:
+            entry = json.loads(path.read_text(encoding="utf-8"))
+        except FileNotFoundError:
+            self.misses += 1
+            return None
+        except (OSError, ValueError):
+            self._remove(path)
+            self.misses += 1
+            return None
+        if entry.get("key") != key:
+            self.misses += 1
+            return None
+        try:
+            os.utime(path)  # recency for LRU eviction
+        except OSError:
+            pass
+        self.hits += 1
+        return entry["payload"]
+
+    def put(self, key: Dict[str, Any], payload: Dict[str, Any]) -> None:
+        path = self._path(key)
+        data = json.dumps({"key": key, "payload": _jsonable(payload), "time": time.time()}).encode("utf-8")
+        usage = self._scan_usage()
+        path.parent.mkdir(parents=True, exist_ok=True)
+        old = path.stat().st_size if path.exists() else None
+        tmp = path.with_name(f"{path.name}.{os.getpid()}.tmp")
+        tmp.write_bytes(data)
+        os.replace(tmp, path)
+        self.writes += 1
+        usage[0] += old is None
+        usage[1] += len(data) - (old or 0)
+        if usage[0] > self.max_entries or usage[1] > self.max_bytes:
+            self.prune()
+
+    def _entries(self) -> List[Tuple[float, int, Path]]:
+        out = []
+        if not self.root.exists():
+            return out
+        for sub in os.scandir(self.root):
+            if not sub.is_dir():
+                continue
+            for e in os.scandir(sub.path):
+                if e.name.endswith(".json"):
+                    st = e.stat()
+                    out.append((st.st_mtime, st.st_size, Path(e.path)))
+        return out
+
+    def _scan_usage(self) -> List[int]:
+        if self._usage is None:
+            entries = self._entries()
+            self._usage = [len(entries), sum(e[1] for e in entries)]
+        return self._usage
+
+    def _remove(self, path: Path) -> None:
+        try:
+            path.unlink()
+        except OSError:
+            pass
+
+    def prune(self, max_entries: Optional[int] = None, max_bytes: Optional[int] = None) -> int:
+        """Evict least-recently-used entries down to 90% of the limits; returns #evicted."""
+        max_entries = self.max_entries if max_entries is None else int(max_entries)
+        max_bytes = self.max_bytes if max_bytes is None else int(max_bytes)
+        entries = sorted(self._entries(), key=lambda e: e[0])
+        n, size = len(entries), sum(e[1] for e in entries)
+        evicted = 0
+        if n > max_entries or size > max_bytes:
+            keep_n, keep_bytes = int(0.9 * max_entries), int(0.9 * max_bytes)
+            for _, nbytes, path in entries:
+                if n <= keep_n and size <= keep_bytes:
+                    break
+                self._remove(path)
+                n, size, evicted = n - 1, size - nbytes, evicted + 1
+        self._usage = [n, size]
+        if evicted:
+            print(f"[fit_cache] evicted {evicted} least-recently-used entries ({n} left)")
+        return evicted
+
+    def clear(self) -> int:
+        entries = self._entries()
+        for _, _, path in entries:
+            self._remove(path)
+        self._usage = [0, 0]
+        return len(entries)
+
+    def stats(self) -> Dict[str, int]:
+        entries, size = self._scan_usage()
+        return dict(entries=entries, bytes=size, max_entries=self.max_entries, max_bytes=self.max_bytes,
+                    hits=self.hits, misses=self.misses, writes=self.writes)
+
+
+def get_fit_cache(root: str | Path = FIT_CACHE_DIR) -> FitCache:
+    """Process-wide FitCache for `root` (counters accumulate across calls)."""
+    k = str(Path(root).resolve())
+    if k not in _OPEN:
+        _OPEN[k] = FitCache(root)
+    return _OPEN[k]
+
+
+def main(argv: Optional[List[str]] = None) -> None:
+    ap = argparse.ArgumentParser(description="Persistent fitted-model cache.")
+    ap.add_argument("command", choices=["stats", "prune", "clear"])
+    ap.add_argument("--root", type=str, default=str(FIT_CACHE_DIR))
+    ap.add_argument("--max_entries", type=int, default=None)
+    ap.add_argument("--max_mb", type=float, default=None)
+    args = ap.parse_args(argv)
+
+    cache = FitCache(args.root)
+    if args.command == "stats":
+        st = cache.stats()
+        print(f"[fit_cache] {st['entries']} entries, {st['bytes'] / 2**20:.1f} MB "
+              f"(limits {st['max_entries']} entries, {st['max_bytes'] / 2**20:.0f} MB) in {cache.root}")
+    elif args.command == "prune":
+        n = cache.prune(args.max_entries, None if args.max_mb is None else int(args.max_mb * 2**20))
+        print(f"[fit_cache] pruned {n} entries")
+    else:
+        print(f"[fit_cache] cleared {cache.clear()} entries from {cache.root}")
+
+
+if __name__ == "__main__":
+    main()
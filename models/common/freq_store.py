@@ -0,0 +1,261 @@
+# models/common/freq_store.py
+"""
+Native-frequency store for raw series with materialized annual views.
+
+Raw inputs (data/raw/<name>.csv, date,value and optionally se, the
+observation's standard error) may be monthly, quarterly or annual. Each
+series is kept at its own frequency, and its annual aggregates are kept
+alongside and updated only for the years whose observations changed.
+
+Layout (data/freq_store/<name>/):
+  obs.bin      fixed-width records (day:int64 days since 1970-01-01, value:float64,
+               var:float64 squared se, NaN if unknown), sorted by date; pure
+               appends are appended in place
+  annual.bin   one fixed-width record per calendar year from year0 (dense):
+               count, sum, min, max, last value and its day, and the sum and
+               count of known observation variances
+  meta.json    year0, inferred frequency, observation count
+
+On ingest the new observations are compared with the stored ones; the common
+leading and trailing runs are unchanged, so only the years spanned by the
+differing middle are recomputed and rewritten in annual.bin. Adding one month
+touches one annual record.
+
+Views (annual(name, view)):
+  mean    sum / count (what the processing pipeline writes to data/processed)
+  last    last observation of the year
+  max     largest observation
+  min     smallest observation
+  sum     sum of observations
+  count   number of sub-annual observations
+  se      standard error of `mean`, sqrt(sum var) / count (observation errors
+          taken as independent); NaN unless every observation of the year has one
+Years inside the series' span without observations are NaN (count 0).
+"""
+from __future__ import annotations
+import json
+import math
+import os
+from pathlib import Path
+from typing import Dict, List, Optional
+
+import numpy as np
+import pandas as pd
+
+FREQ_DIR = Path("data/freq_store")
+FORMAT_VERSION = 2
+VIEWS = ("mean", "last", "max", "min", "sum", "count", "se")
+
+OBS = np.dtype([("day", "<i8"), ("value", "<f8"), ("var", "<f8")])
+ANNUAL = np.dtype([("count", "<i4"), ("sum", "<f8"), ("min", "<f8"), ("max", "<f8"),
+                   ("last", "<f8"), ("last_day", "<i8"), ("var_sum", "<f8"), ("var_count", "<i4")])
+
+_OPEN: Dict[str, "FreqStore"] = {}
+
+
+def _infer_frequency(days: np.ndarray) -> str:
+    if len(days) < 2:
+        return "annual"
+    step = float(np.median(np.diff(np.unique(days))))
+    if step <= 8:
+        return "daily/weekly"
+    if step <= 31:
+        return "monthly"
+    if step <= 92:
+        return "quarterly"
+    return "annual"
+
+
+def _normalize(df: pd.DataFrame) -> np.ndarray:
+    """date,value[,se] frame -> OBS records sorted by date (stable), invalid rows dropped."""
+    date = pd.to_datetime(df["date"], errors="coerce")
+    value = pd.to_numeric(df["value"], errors="coerce")
+    ok = date.notna().to_numpy() & value.notna().to_numpy()
+    out = np.empty(int(ok.sum()), dtype=OBS)
+    out["day"] = date[ok].to_numpy(dtype="datetime64[ns]").astype("datetime64[D]").astype(np.int64)
+    out["value"] = value[ok].to_numpy(dtype=np.float64)
+    out["var"] = np.nan
+    if "se" in df.columns:
+        se = pd.to_numeric(df["se"], errors="coerce").to_numpy(dtype=np.float64)[ok]
+        out["var"] = np.where(se >= 0, se * se, np.nan)
+    return out[np.argsort(out["day"], kind="stable")]
+
+
+def _differs(a: np.ndarray, b: np.ndarray) -> np.ndarray:
+    """Per-record inequality of two OBS arrays of equal length (NaN variances compare equal)."""
+    var_eq = (a["var"] == b["var"]) | (np.isnan(a["var"]) & np.isnan(b["var"]))
+    return (a["day"] != b["day"]) | (a["value"] != b["value"]) | ~var_eq
+
+
+def _years(days: np.ndarray) -> np.ndarray:
+    return days.astype("datetime64[D]").astype("datetime64[Y]").astype(np.int64) + 1970
+
+
+def _year_start_days(years: np.ndarray) -> np.ndarray:
+    return (np.asarray(years, dtype=np.int64) - 1970).astype("datetime64[Y]").astype("datetime64[D]").astype(np.int64)
+
+
+def _aggregate(obs: np.ndarray, years: np.ndarray) -> np.ndarray:
+    """ANNUAL records for `years` (sorted) from sorted observations."""
+    rec = np.zeros(len(years), dtype=ANNUAL)
+    rec["min"] = rec["max"] = rec["last"] = np.nan
+    if len(years) == 0:
+        return rec
+    lo = np.searchsorted(obs["day"], _year_start_days(years), side="left")
+    hi = np.searchsorted(obs["day"], _year_start_days(years + 1), side="left")
+    for i in np.flatnonzero(hi > lo):
+        v = obs["value"][lo[i]:hi[i]]
+        var = obs["var"][lo[i]:hi[i]]
+        known = var[~np.isnan(var)]
+        rec[i] = (len(v), math.fsum(v), v.min(), v.max(), v[-1], obs["day"][hi[i] - 1],
+                  math.fsum(known), len(known))
+    return rec
+
+
+class FreqStore:
+    """Per-series native observations plus incrementally maintained annual records."""
+
+    def __init__(self, root: Path | None = None):
+        self.root = Path(root) if root is not None else FREQ_DIR
+
+    def _dir(self, name: str) -> Path:
+        return self.root / name
+
+    def meta(self, name: str) -> Optional[Dict]:
+        p = self._dir(name) / "meta.json"
+        if not p.exists():
+            return None
+        meta = json.loads(p.read_text(encoding="utf-8"))
+        return meta if meta.get("version") == FORMAT_VERSION else None
+
+    def _read(self, name: str, fname: str, dtype: np.dtype) -> np.ndarray:
+        p = self._dir(name) / fname
+        if not p.exists() or p.stat().st_size == 0:
+            return np.zeros(0, dtype=dtype)
+        return np.fromfile(p, dtype=dtype)
+
+    def observations(self, name: str) -> np.ndarray:
+        return self._read(name, "obs.bin", OBS) if self.meta(name) else np.zeros(0, dtype=OBS)
+
+    # ---------- writing ----------
+    def ingest(self, name: str, df: pd.DataFrame) -> List[int]:
+        """
+        Bring the stored series in line with `df` (date,value[,se]). Returns the
+        calendar years whose annual records were recomputed.
+        """
+        new = _normalize(df)
+        meta = self.meta(name)
+        old = self._read(name, "obs.bin", OBS) if meta else np.zeros(0, dtype=OBS)
+        d = self._dir(name)
+        d.mkdir(parents=True, exist_ok=True)
+
+        # common leading / trailing runs are unchanged
+        n = min(len(old), len(new))
+        neq = np.flatnonzero(_differs(old[:n], new[:n]))
+        pre = int(neq[0]) if len(neq) else n
+        m = n - pre
+        tail_o, tail_n = old[len(old) - m:], new[len(new) - m:]
+        neq = np.flatnonzero(_differs(tail_o, tail_n))
+        suf = m - int(neq[-1]) - 1 if len(neq) else m
+        if meta is not None and pre == len(old) == len(new):
+            return []
+
+        if meta is not None and pre == len(old):
+            with open(d / "obs.bin", "ab") as f:  # pure append
+                new[pre:].tofile(f)
+        else:
+            tmp = d / "obs.bin.tmp"
+            new.tofile(tmp)
+            os.replace(tmp, d / "obs.bin")
+
+        changed_days = np.concatenate([old["day"][pre:len(old) - suf], new["day"][pre:len(new) - suf]])
+        changed = np.unique(_years(changed_days)) if len(changed_days) else np.zeros(0, dtype=np.int64)
+
+        # annual records over the dense span of the new observations
+        y_new = _years(new["day"][[0, -1]]) if len(new) else np.zeros(0, dtype=np.int64)
+        year0_old = int(meta["year0"]) if meta else None
+        annual = self._read(name, "annual.bin", ANNUAL) if meta else np.zeros(0, dtype=ANNUAL)
+        if len(new) == 0:
+            year0, annual = 0, np.zeros(0, dtype=ANNUAL)
+            tmp = d / "annual.bin.tmp"
+            annual.tofile(tmp)
+            os.replace(tmp, d / "annual.bin")
+        elif year0_old is not None and int(y_new[0]) == year0_old and int(y_new[1]) >= year0_old + len(annual) - 1:
+            # same start year: update changed rows in place, append any new years
+            year0 = year0_old
+            span_end = int(y_new[1])
+            new_rows = np.arange(year0 + len(annual), span_end + 1)
+            upd = changed[(changed >= year0) & (changed < year0 + len(annual))]
+            with open(d / "annual.bin", "r+b") as f:
+                for y, rec in zip(upd, _aggregate(new, upd)):
+                    f.seek((int(y) - year0) * ANNUAL.itemsize)
+                    f.write(rec.tobytes())
+                f.seek(len(annual) * ANNUAL.itemsize)
+                f.write(_aggregate(new, new_rows).tobytes())
+            changed = np.union1d(upd, new_rows)
+        else:
+            year0 = int(y_new[0])
+            years = np.arange(year0, int(y_new[1]) + 1)
+            tmp = d / "annual.bin.tmp"
+            _aggregate(new, years).tofile(tmp)
+            os.replace(tmp, d / "annual.bin")
+            changed = years
+
+        meta = {"version": FORMAT_VERSION, "year0": year0, "frequency": _infer_frequency(new["day"]),
+                "n_obs": int(len(new))}
+        tmp = d / "meta.json.tmp"
+        tmp.write_text(json.dumps(meta, indent=2), encoding="utf-8")
+        os.replace(tmp, d / "meta.json")
+        return [int(y) for y in changed]
+
+    # ---------- reading ----------
+    def frequency(self, name: str) -> Optional[str]:
+        meta = self.meta(name)
+        return meta["frequency"] if meta else None
+
+    def native(self, name: str) -> pd.Series:
+        """Observations at native frequency (DatetimeIndex)."""
+        obs = self.observations(name)
+        idx = pd.DatetimeIndex(obs["day"].astype("datetime64[D]"), name="date")
+        return pd.Series(obs["value"], index=idx, name=name)
+
+    def annual(self, name: str, view: str = "mean") -> pd.Series:
+        """One annual view as a Series on an Int64 year index (dense span; empty years NaN)."""
+        if view not in VIEWS:
+            raise ValueError(f"Unknown view {view!r} (expected one of {VIEWS})")
+        meta = self.meta(name)
+        if meta is None:
+            raise KeyError(f"{name} is not in the frequency store {self.root}")
+        rec = self._read(name, "annual.bin", ANNUAL)
+        cnt = rec["count"].astype(np.float64)
+        with np.errstate(invalid="ignore", divide="ignore"):
+            values = {"mean": rec["sum"] / cnt, "count": cnt, "sum": np.where(cnt > 0, rec["sum"], np.nan),
+                      "last": rec["last"], "max": rec["max"], "min": rec["min"],
+                      "se": np.where(rec["var_count"] == rec["count"], np.sqrt(rec["var_sum"]) / cnt, np.nan),
+                      }[view]
+        if view != "count":
+            values = np.where(cnt > 0, values, np.nan)
+        idx = pd.Index(np.arange(meta["year0"], meta["year0"] + len(rec)), dtype="Int64", name="year")
+        return pd.Series(values, index=idx, name=name)
+
+    def annual_rows(self, name: str, view: str = "mean") -> pd.DataFrame:
+        """
+        Tidy date,value rows (date = YYYY-01-01), the processed-file layout.
+        The mean view adds an se column when any year has a standard error.
+        """
+        s = self.annual(name, view)
+        dates = pd.to_datetime(s.index.astype(int).astype(str) + "-01-01")
+        out = pd.DataFrame({"date": dates, "value": s.to_numpy()})
+        if view == "mean":
+            se = self.annual(name, "se").to_numpy()
+            if np.isfinite(se).any():
+                out["se"] = se
+        return out
+
+
+def get_freq_store(root: Path | None = None) -> FreqStore:
+    root = Path(root) if root is not None else FREQ_DIR
+    key = str(root.resolve())
+    if key not in _OPEN:
+        _OPEN[key] = FreqStore(root)
+    return _OPEN[key]
@@ -0,0 +1,210 @@
+# models/common/impute.py
+"""
+Imputation of missing years in processed series (Kalman smoother).
+
+Every tidy processed series (value,date rows, as written by the processing
+pipeline and the bulk ingester) gets two extra columns:
+
+  imputed       the observed value where there is one; otherwise the smoothed
+                level from models.common.kalman (local level or smooth trend,
+                whichever fits the series better) plus the observation
+                residuals (value - smoothed level) of the observed years on
+                either side of the gap, linearly interpolated, so a gap joins
+                its neighbouring observations instead of jumping to the level
+  imputed_var   0 where observed; otherwise the smoothed variance of the level
+
+Values are only imputed between a series' first and last observation. All
+series that need work are stacked into one (years x series) array and fitted
+and smoothed together.
+
+The smoother is two-sided and runs over the full sample, so these columns
+use later observations to fill earlier gaps: they are for descriptive use.
+Backtests get gap-filled panels from make_origin_panel(..., imputed=True),
+which runs impute_series() on the years <= origin only.
+
+Results are cached in data/processed/_impute_cache.json, keyed by a hash of
+each series' observed (year, value) pairs and the model settings, together
+with the sha256 of the file last written. A file whose hash still matches is
+skipped without being read; a file rewritten with the same observations (the
+pipeline re-processing an unchanged series) gets its cached columns back
+without refitting.
+
+Other layouts (the structural id,year,... files) are left as they are.
+"""
+from __future__ import annotations
+import hashlib
+import json
+import os
+from pathlib import Path
+from typing import Dict, Iterable, List, Optional
+
+import numpy as np
+import pandas as pd
+
+from .kalman import MODELS, Q_GRID, fit_smooth
+from .schema import EXTRA_COLS, read_schema, years_from_values
+
+PRO_DIR = Path("data/processed")
+CACHE_JSON = "_impute_cache.json"
+MIN_OBS = 4
+_SETTINGS = json.dumps({"models": list(MODELS), "q_grid": [float(q) for q in Q_GRID], "min_obs": MIN_OBS,
+                        "fill": "level+bridged residuals"})
+
+
+def _sha256(path: Path) -> str:
+    h = hashlib.sha256()
+    with open(path, "rb") as f:
+        for chunk in iter(lambda: f.read(1 << 20), b""):
+            h.update(chunk)
+    return h.hexdigest()
+
+
+def _input_key(years: np.ndarray, values: np.ndarray) -> str:
+    ok = ~np.isnan(values)
+    h = hashlib.sha256(_SETTINGS.encode("utf-8"))
+    h.update(np.ascontiguousarray(years[ok], dtype="<i8").tobytes())
+    h.update(np.ascontiguousarray(values[ok], dtype="<f8").tobytes())
+    return h.hexdigest()
+
+
+def _load_cache(pro_dir: Path) -> Dict:
+    p = pro_dir / CACHE_JSON
+    if p.exists():
+        try:
+            return json.loads(p.read_text(encoding="utf-8"))
+        except ValueError:
+            print(f"[impute] Ignoring unreadable cache {p}")
+    return {}
+
+
+def _save_cache(pro_dir: Path, cache: Dict) -> None:
+    p = pro_dir / CACHE_JSON
+    tmp = p.with_name(p.name + ".tmp")
+    tmp.write_text(json.dumps(cache, indent=1, sort_keys=True), encoding="utf-8")
+    os.replace(tmp, p)
+
+
+def impute_series(series: Dict[str, pd.Series]) -> Dict[str, pd.DataFrame]:
+    """
+    {name: year-indexed series with NaN gaps} -> {name: frame of imputed,
+    imputed_var over the first..last observed years}. One batched fit for all.
+    """
+    series = {n: s.dropna() for n, s in series.items()}
+    series = {n: s for n, s in series.items() if len(s) >= MIN_OBS}
+    if not series:
+        return {}
+    y0 = min(int(s.index.min()) for s in series.values())
+    y1 = max(int(s.index.max()) for s in series.values())
+    names = list(series)
+    Y = np.full((y1 - y0 + 1, len(names)), np.nan)
+    for j, n in enumerate(names):
+        Y[series[n].index.to_numpy(dtype=np.int64) - y0, j] = series[n].to_numpy(dtype=np.float64)
+    fit = fit_smooth(Y)
+    obs = ~np.isnan(Y)
+    var = np.where(obs, 0.0, np.maximum(fit["var"], 0.0))
+
+    out = {}
+    years = np.arange(y0, y1 + 1)
+    imputed = np.empty_like(Y)
+    for j, n in enumerate(names):
+        rows = np.flatnonzero(obs[:, j])
+        sl = slice(rows[0], rows[-1] + 1)
+        # bridge each gap between the residuals of its bordering observations
+        resid = np.interp(np.arange(len(years)), rows, Y[rows, j] - fit["mean"][rows, j])
+        imputed[:, j] = np.where(obs[:, j], Y[:, j], fit["mean"][:, j] + resid)
+        out[n] = pd.DataFrame({"imputed": imputed[sl, j], "imputed_var": var[sl, j]},
+                              index=pd.Index(years[sl], dtype="Int64", name="year"))
+        out[n].attrs.update(model=str(fit["model"][j]), q=float(fit["q"][j]))
+    return out
+
+
+def _read_tidy(path: Path):
+    """(raw string frame, years, values) of a tidy processed CSV, or None if it is not tidy."""
+    desc = read_schema(path)
+    if desc.get("layout") != "tidy" or desc.get("value_col") != "value":
+        return None
+    df = pd.read_csv(path, dtype=str, keep_default_na=False)
+    df = df.drop(columns=[c for c in EXTRA_COLS if c in df.columns])
+    years = years_from_values(df[desc["year_col"]], desc["year_rule"])
+    if years.isna().any() or years.duplicated().any():
+        return None
+    values = pd.to_numeric(df["value"], errors="coerce").to_numpy(dtype=np.float64)
+    return df, years.to_numpy(dtype=np.int64), values
+
+
+def _write(path: Path, df: pd.DataFrame, years: np.ndarray, values: np.ndarray, result: Dict) -> None:
+    """Rewrite `path` with imputed / imputed_var columns (observed years keep their value, variance 0)."""
+    imp = np.full(len(years), np.nan)
+    var = np.full(len(years), np.nan)
+    if result["imputed"]:
+        pos = years - int(result["year0"])
+        inside = (pos >= 0) & (pos < len(result["imputed"]))
+        imp[inside] = np.asarray(result["imputed"], dtype=np.float64)[pos[inside]]
+        var[inside] = np.asarray(result["imputed_var"], dtype=np.float64)[pos[inside]]
+    obs = ~np.isnan(values)
+    out = df.copy()
+    out["imputed"] = np.where(obs, values, imp)
+    out["imputed_var"] = np.where(obs, 0.0, var)
+    tmp = path.with_name(path.name + ".tmp")
+    out.to_csv(tmp, index=False)
+    os.replace(tmp, path)
+
+
+def impute_processed(paths: Iterable[Path] | None = None, pro_dir: Path | None = None,
+                     force: bool = False) -> Dict[str, str]:
+    """
+    Add / refresh the imputed columns of tidy processed series. Returns
+    {name: sha256} of the files rewritten.
+    """
+    pro_dir = Path(pro_dir) if pro_dir is not None else PRO_DIR
+    paths = sorted(pro_dir.glob("*.csv")) if paths is None else [Path(p) for p in paths]
+    cache = {} if force else _load_cache(pro_dir)
+
+    pending: Dict[str, tuple] = {}
+    for p in paths:
+        entry = cache.get(p.stem)
+        if entry is not None and p.exists() and entry.get("output") == _sha256(p):
+            continue
+        parsed = _read_tidy(p)
+        if parsed is None:
+            continue
+        pending[p.stem] = (p, *parsed, _input_key(parsed[1], parsed[2]))
+
+    to_fit = {n: pd.Series(v, index=pd.Index(y, dtype="Int64"))
+              for n, (_, _, y, v, key) in pending.items()
+              if cache.get(n, {}).get("input") != key}
+    fitted = impute_series(to_fit)
+    for n, frame in fitted.items():
+        cache[n] = {"input": pending[n][4], "model": frame.attrs["model"], "q": frame.attrs["q"],
+                    "year0": int(frame.index[0]), "imputed": frame["imputed"].tolist(),
+                    "imputed_var": frame["imputed_var"].tolist()}
+    for n in to_fit:
+        if n not in fitted:  # too short to fit: observed values only
+            cache[n] = {"input": pending[n][4], "model": None, "q": None, "year0": 0,
+                        "imputed": [], "imputed_var": []}
+
+    written: Dict[str, str] = {}
+    for n, (p, df, years, values, _) in pending.items():
+        _write(p, df, years, values, cache[n])
+        cache[n]["output"] = written[n] = _sha256(p)
+    gone = [n for n in cache if not (pro_dir / f"{n}.csv").exists()]
+    for n in gone:
+        del cache[n]
+    if written or gone or force:
+        _save_cache(pro_dir, cache)
+    print(f"[impute] {len(fitted)} series fitted, {len(written)} files updated")
+    return written
+
+
+def main(argv: Optional[List[str]] = None) -> None:
+    import argparse
+
+    ap = argparse.ArgumentParser(description="Kalman-smoother imputation of processed series.")
+    ap.add_argument("--pro_dir", type=str, default="data/processed")
+    ap.add_argument("--force", action="store_true", help="Ignore the cache and refit every series")
+    args = ap.parse_args(argv)
+    impute_processed(pro_dir=Path(args.pro_dir), force=args.force)
+
+
+if __name__ == "__main__":
+    main()
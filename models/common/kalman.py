@@ -0,0 +1,162 @@
+# models/common/kalman.py
+"""
+Batched Kalman filter / RTS smoother for univariate structural time series.
+
+Two models, both with observation noise e_t ~ N(0, s2):
+
+  level   local level:   y_t = mu_t + e_t,  mu_{t+1} = mu_t + w_t,  w_t ~ N(0, q s2)
+  trend   smooth trend:  y_t = mu_t + e_t,  mu_{t+1} = mu_t + b_t,
+                         b_{t+1} = b_t + z_t,  z_t ~ N(0, q s2)
+
+Each has one signal-to-noise ratio q; s2 is concentrated out of the
+likelihood. Many series are run together as the columns of a (years x series)
+array with NaN for missing years: every filter step is one vectorized update
+across all columns (and across a grid of q values when fitting), so the
+Python loop is over years only. Missing observations skip the update step,
+which is what makes the smoother an imputer.
+
+The initial state is diffuse (large prior variance); the first observed
+innovations of each column are left out of the likelihood (two when the
+models are compared, so both are scored on the same observations).
+
+  fit = fit_smooth(Y)                 # Y: (T, k) float array, NaN = missing
+  fit["mean"], fit["var"]             # smoothed level and its variance, (T, k)
+  fit["model"], fit["q"], fit["loglik"]
+"""
+from __future__ import annotations
+import warnings
+from typing import Dict, Sequence
+
+import numpy as np
+
+MODELS = ("level", "trend")
+Q_GRID = np.logspace(-4, 2, 25)
+DIFFUSE = 1e6
+
+
+def _system(model: str):
+    if model == "level":
+        return np.array([[1.0]]), np.array([[1.0]])
+    if model == "trend":
+        return np.array([[1.0, 1.0], [0.0, 1.0]]), np.array([[0.0, 0.0], [0.0, 1.0]])
+    raise ValueError(f"Unknown model {model!r} (expected one of {MODELS})")
+
+
+def kalman_filter(Y: np.ndarray, model: str, q: np.ndarray, keep: bool = False,
+                  burn: int | None = None) -> Dict[str, np.ndarray]:
+    """
+    Filter every column of Y (T, B) with its own ratio q (B,), observation
+    variance 1 (s2 is applied afterwards). Returns the concentrated
+    log-likelihood and s2 per column, plus filtered / predicted moments when
+    `keep` is set (needed by the smoother). The first `burn` observed
+    innovations (default: the state dimension) are left out of the likelihood.
+    """
+    Y = np.asarray(Y, dtype=np.float64)
+    T, B = Y.shape
+    F_, Qs = _system(model)
+    m = F_.shape[0]
+    burn = m if burn is None else int(burn)
+    Q = np.asarray(q, dtype=np.float64)[:, None, None] * Qs
+    a = np.zeros((B, m))
+    P = np.broadcast_to(np.eye(m) * DIFFUSE, (B, m, m)).copy()
+    seen = np.zeros(B, dtype=np.int64)
+    ssq = np.zeros(B)
+    logdet = np.zeros(B)
+    n_eff = np.zeros(B)
+    if keep:
+        af, Pf = np.empty((T, B, m)), np.empty((T, B, m, m))
+        ap, Pp = np.empty((T, B, m)), np.empty((T, B, m, m))
+    for t in range(T):
+        if keep:
+            ap[t], Pp[t] = a, P
+        y = Y[t]
+        obs = ~np.isnan(y)
+        if obs.any():
+            v = np.where(obs, y - a[:, 0], 0.0)
+            Fv = P[:, 0, 0] + 1.0
+            K = P[:, :, 0] / Fv[:, None]
+            upd = obs[:, None]
+            a = np.where(upd, a + K * v[:, None], a)
+            P = np.where(upd[:, :, None], P - K[:, :, None] * K[:, None, :] * Fv[:, None, None], P)
+            counted = obs & (seen >= burn)
+            ssq += np.where(counted, v * v / Fv, 0.0)
+            logdet += np.where(counted, np.log(Fv), 0.0)
+            n_eff += counted
+            seen += obs
+        if keep:
+            af[t], Pf[t] = a, P
+        a = a @ F_.T
+        P = F_ @ P @ F_.T + Q
+    s2 = np.where(n_eff > 0, ssq / np.maximum(n_eff, 1), np.nan)
+    with np.errstate(divide="ignore", invalid="ignore"):
+        loglik = -0.5 * (n_eff * (np.log(2.0 * np.pi * s2) + 1.0) + logdet)
+    out = {"loglik": np.where(n_eff > 0, loglik, -np.inf), "s2": s2, "n_eff": n_eff}
+    if keep:
+        out.update(af=af, Pf=Pf, ap=ap, Pp=Pp)
+    return out
+
+
+def rts_smoother(filt: Dict[str, np.ndarray], model: str) -> Dict[str, np.ndarray]:
+    """Smoothed state means (T, B, m) and covariances (T, B, m, m) from a kept filter run."""
+    F_, _ = _system(model)
+    af, Pf, ap, Pp = filt["af"], filt["Pf"], filt["ap"], filt["Pp"]
+    T = af.shape[0]
+    a_s, P_s = af.copy(), Pf.copy()
+    for t in range(T - 2, -1, -1):
+        # J = Pf[t] F' Pp[t+1]^-1
+        J = np.linalg.solve(Pp[t + 1], (Pf[t] @ F_.T).transpose(0, 2, 1)).transpose(0, 2, 1)
+        a_s[t] = af[t] + np.einsum("bij,bj->bi", J, a_s[t + 1] - ap[t + 1])
+        P_s[t] = Pf[t] + J @ (P_s[t + 1] - Pp[t + 1]) @ J.transpose(0, 2, 1)
+    return {"a": a_s, "P": P_s}
+
+
+def fit_smooth(Y: np.ndarray, models: Sequence[str] = MODELS, q_grid: Sequence[float] | None = None) -> Dict:
+    """
+    Fit (model, q) per column of Y by maximum concentrated likelihood over
+    `models` x `q_grid` (all columns and grid points in one filter pass per
+    model), then smooth each column at its fitted parameters.
+
+    Columns are standardized by their observed mean / sd first; results are in
+    the original units. Returns mean / var (T, k) of the smoothed level,
+    and per column model, q, s2 and loglik.
+    """
+    Y = np.asarray(Y, dtype=np.float64)
+    T, k = Y.shape
+    grid = np.asarray(Q_GRID if q_grid is None else q_grid, dtype=np.float64)
+    with warnings.catch_warnings():  # all-missing columns
+        warnings.simplefilter("ignore", RuntimeWarning)
+        mu = np.nanmean(Y, axis=0) if T else np.zeros(k)
+        sd = np.nanstd(Y, axis=0) if T else np.ones(k)
+    mu = np.where(np.isfinite(mu), mu, 0.0)
+    sd = np.where(np.isfinite(sd) & (sd > 0), sd, 1.0)
+    Z = (Y - mu) / sd
+
+    best_ll = np.full(k, -np.inf)
+    best_model = np.array([models[0]] * k, dtype=object)
+    best_q = np.full(k, grid[len(grid) // 2])
+    burn = max(_system(m)[0].shape[0] for m in models)
+    for model in models:
+        ll = kalman_filter(np.repeat(Z, len(grid), axis=1), model, np.tile(grid, k), burn=burn)["loglik"]
+        ll = ll.reshape(k, len(grid))
+        j = np.argmax(ll, axis=1)
+        top = ll[np.arange(k), j]
+        better = top > best_ll
+        best_ll = np.where(better, top, best_ll)
+        best_model = np.where(better, model, best_model)
+        best_q = np.where(better, grid[j], best_q)
+
+    mean = np.full((T, k), np.nan)
+    var = np.full((T, k), np.nan)
+    s2 = np.full(k, np.nan)
+    for model in models:
+        cols = np.flatnonzero(best_model == model)
+        if len(cols) == 0:
+            continue
+        filt = kalman_filter(Z[:, cols], model, best_q[cols], keep=True)
+        sm = rts_smoother(filt, model)
+        scale = np.where(np.isfinite(filt["s2"]), filt["s2"], 0.0)
+        s2[cols] = filt["s2"]
+        mean[:, cols] = sm["a"][:, :, 0] * sd[cols] + mu[cols]
+        var[:, cols] = sm["P"][:, :, 0, 0] * scale * sd[cols] ** 2
+    return {"mean": mean, "var": var, "model": best_model.astype(str), "q": best_q, "s2": s2 * sd ** 2,
+            "loglik": best_ll}
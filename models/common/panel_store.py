@@ -0,0 +1,250 @@
+# models/common/panel_store.py
+"""
+Compiled, memory-mapped indicator panel.
+
+All processed indicators are packed once into a years x indicators float
+array (one contiguous column per indicator) plus an availability mask and
+prefix observation counts, stored under data/processed/_panel/:
+
+  meta.json           first year, indicator order, per-source (size, mtime_ns)
+                      fingerprints and the name of the current build directory
+  build-<id>/
+    values.npy        float64 (n_years, n_indicators), Fortran order; NaN where missing
+    mask.npy          bool    (n_years, n_indicators), True where an observation exists
+    prefix.npy        int32   (n_years + 1, n_indicators); prefix[i, j] = #obs of j in years[:i]
+
+Every rebuild writes a fresh build directory and then swaps meta.json
+atomically, so arrays that another reader (or this process) still has
+memory-mapped are never overwritten; on Windows a mapped file cannot be
+replaced at all. Superseded builds are deleted on the next build that can.
+Concurrent builders each write their own directory; the last meta.json wins.
+
+Years are a dense range, so the rows up to an origin are a leading slice of the
+memmap (a zero-copy view) and "how many observations <= origin" is a single
+row of the prefix table. The store rebuilds itself when a source CSV changes.
+A second store of the gap-filled 'imputed' columns (models.common.impute) is
+compiled the same way under _panel/imputed/ when asked for.
+"""
+from __future__ import annotations
+import json
+import os
+import time
+from pathlib import Path
+from typing import Dict, Iterable, List, Optional, Tuple
+
+import numpy as np
+import pandas as pd
+
+PANEL_DIRNAME = "_panel"
+IMPUTED_DIRNAME = "imputed"
+FORMAT_VERSION = 2
+BUILD_PREFIX = "build-"
+
+_OPEN: Dict[str, "PanelStore"] = {}
+
+
+def _fingerprint(path: Path) -> Optional[List[int]]:
+    try:
+        st = path.stat()
+    except OSError:
+        return None
+    return [int(st.st_size), int(st.st_mtime_ns)]
+
+
+def _remove_stale_builds(root: Path, keep: str) -> None:
+    """Delete build directories other than `keep`; ones still mapped somewhere are left for later."""
+    for d in root.glob(BUILD_PREFIX + "*"):
+        if d.name == keep or not d.is_dir():
+            continue
+        try:
+            for f in d.iterdir():
+                f.unlink()
+            d.rmdir()
+        except OSError:
+            pass
+
+
+class PanelStore:
+    """Read-only view over a compiled panel directory."""
+
+    def __init__(self, root: Path, pro_dir: Path, meta: Dict, values: np.ndarray,
+                 mask: np.ndarray, prefix: np.ndarray):
+        self.root = Path(root)
+        self.pro_dir = Path(pro_dir)
+        self.meta = meta
+        self.values = values
+        self.mask = mask
+        self.prefix = prefix
+        self.year0 = int(meta["year0"])
+        self.indicators: List[str] = list(meta["indicators"])
+        self._col = {ind: j for j, ind in enumerate(self.indicators)}
+        self.years = np.arange(self.year0, self.year0 + values.shape[0], dtype=np.int64)
+
+    # ---------- construction ----------
+    @classmethod
+    def open(cls, pro_dir: Path, root: Path | None = None) -> Optional["PanelStore"]:
+        """Memory-map an existing store; None if absent or unreadable."""
+        root = Path(root) if root is not None else Path(pro_dir) / PANEL_DIRNAME
+        meta_path = root / "meta.json"
+        if not meta_path.exists():
+            return None
+        try:
+            meta = json.loads(meta_path.read_text(encoding="utf-8"))
+            if meta.get("version") != FORMAT_VERSION:
+                return None
+            data = root / meta["build"]
+            values = np.load(data / "values.npy", mmap_mode="r")
+            mask = np.load(data / "mask.npy", mmap_mode="r")
+            prefix = np.load(data / "prefix.npy", mmap_mode="r")
+        except (OSError, ValueError, KeyError):
+            return None
+        return cls(root, pro_dir, meta, values, mask, prefix)
+
+    @classmethod
+    def build(cls, indicators: Iterable[str], pro_dir: Path, root: Path | None = None,
+              imputed: bool = False) -> "PanelStore":
+        """Parse each indicator once and write the compiled store (of the imputed columns if asked)."""
+        from .utils import load_indicator
+
+        pro_dir = Path(pro_dir)
+        root = Path(root) if root is not None else pro_dir / PANEL_DIRNAME
+        root.mkdir(parents=True, exist_ok=True)
+
+        names: List[str] = []
+        series: List[pd.Series] = []
+        for ind in dict.fromkeys(indicators):
+            s = load_indicator(ind, pro_dir, imputed=imputed).dropna()
+            names.append(ind)
+            series.append(s)
+
+        all_years = [int(y) for s in series for y in (s.index.min(), s.index.max()) if len(s)]
+        year0 = min(all_years) if all_years else 0
+        n_years = (max(all_years) - year0 + 1) if all_years else 0
+
+        values = np.full((n_years, len(names)), np.nan, dtype=np.float64, order="F")
+        for j, s in enumerate(series):
+            if len(s):
+                rows = s.index.to_numpy(dtype=np.int64) - year0
+                values[rows, j] = s.to_numpy(dtype=np.float64)
+        mask = np.asfortranarray(~np.isnan(values))
+        prefix = np.zeros((n_years + 1, len(names)), dtype=np.int32, order="F")
+        np.cumsum(mask, axis=0, out=prefix[1:])
+
+        build = f"{BUILD_PREFIX}{os.getpid()}-{time.time_ns():x}"
+        data = root / build
+        data.mkdir()
+        np.save(data / "values.npy", values)
+        np.save(data / "mask.npy", mask)
+        np.save(data / "prefix.npy", prefix)
+
+        meta = {
+            "version": FORMAT_VERSION,
+            "build": build,
+            "year0": year0,
+            "indicators": names,
+            "imputed": bool(imputed),
+            "sources": {ind: _fingerprint(pro_dir / f"{ind}.csv") for ind in names},
+        }
+
+        tmp = root / f"meta.json.{os.getpid()}.tmp"
+        tmp.write_text(json.dumps(meta, indent=2), encoding="utf-8")
+        os.replace(tmp, root / "meta.json")
+        print(f"[panel_store] compiled {len(names)} indicators x {n_years} years -> {data}")
+
+        # older builds are only deleted here; a store still mapping one keeps
+        # working (on Windows the delete fails and is retried on the next build)
+        _OPEN.pop(str(root.resolve()), None)
+        _remove_stale_builds(root, build)
+
+        store = cls.open(pro_dir, root)
+        assert store is not None
+        return store
+
+    def is_fresh(self, indicators: Iterable[str]) -> bool:
+        """True if every indicator is present and its source file is unchanged."""
+        sources = self.meta.get("sources", {})
+        for ind in indicators:
+            if ind not in self._col:
+                return False
+            if _fingerprint(self.pro_dir / f"{ind}.csv") != sources.get(ind):
+                return False
+        return True
+
+    # ---------- queries ----------
+    def _row_upto(self, origin: int) -> int:
+        """Number of leading rows with year <= origin."""
+        return int(np.clip(int(origin) - self.year0 + 1, 0, self.values.shape[0]))
+
+    def column(self, indicator: str) -> int:
+        try:
+            return self._col[indicator]
+        except KeyError:
+            raise KeyError(f"Indicator '{indicator}' is not in the panel store at {self.root}") from None
+
+    def upto(self, origin: int) -> Tuple[np.ndarray, np.ndarray, np.ndarray]:
+        """(years, values, mask) for years <= origin; values/mask are views of the memmap."""
+        i = self._row_upto(origin)
+        return self.years[:i], self.values[:i], self.mask[:i]
+
+    def counts_upto(self, origin: int) -> np.ndarray:
+        """Observation count per indicator for years <= origin (from prefix table)."""
+        return np.asarray(self.prefix[self._row_upto(origin)])
+
+    def eligible(self, origin: int, min_len: int, indicators: Iterable[str] | None = None) -> List[str]:
+        """Indicators with >= min_len observations up to and including origin."""
+        counts = self.counts_upto(origin)
+        names = self.indicators if indicators is None else list(indicators)
+        return [ind for ind in names if counts[self.column(ind)] >= min_len]
+
+    def series(self, indicator: str, origin: int | None = None) -> pd.Series:
+        """Observed values of one indicator (Int64 year index), optionally truncated at origin."""
+        j = self.column(indicator)
+        i = self.values.shape[0] if origin is None else self._row_upto(origin)
+        m = np.asarray(self.mask[:i, j])
+        s = pd.Series(
+            np.asarray(self.values[:i, j])[m],
+            index=pd.Index(self.years[:i][m], dtype="Int64"),
+            name=indicator,
+        )
+        return s
+
+    def year_value(self, indicator: str, origin: int | None = None) -> pd.DataFrame:
+        """Observed values as a tidy [year, value] frame sorted by year."""
+        s = self.series(indicator, origin)
+        return pd.DataFrame({"year": s.index.to_numpy(dtype=np.int64), "value": s.to_numpy()})
+
+    def frame(self, indicators: Iterable[str], origin: int | None = None) -> pd.DataFrame:
+        """Year-indexed frame (rows with at least one observation) for the given columns."""
+        names = list(indicators)
+        cols = [self.column(ind) for ind in names]
+        i = self.values.shape[0] if origin is None else self._row_upto(origin)
+        block = np.asarray(self.values[:i, cols])
+        keep = np.asarray(self.mask[:i, cols]).any(axis=1)
+        return pd.DataFrame(block[keep], index=pd.Index(self.years[:i][keep], dtype="Int64"), columns=names)
+
+
+def open_panel(indicators: Iterable[str], pro_dir: Path | None = None, imputed: bool = False) -> PanelStore:
+    """
+    Return a process-wide PanelStore covering `indicators`, (re)compiling it
+    only when it is missing, lacks an indicator, or a source file changed.
+    imputed=True gives the panel of gap-filled 'imputed' columns, compiled
+    separately under _panel/imputed/.
+    """
+    from .utils import PRO_DIR
+
+    pro_dir = Path(pro_dir) if pro_dir is not None else PRO_DIR
+    root = pro_dir / PANEL_DIRNAME / IMPUTED_DIRNAME if imputed else pro_dir / PANEL_DIRNAME
+    key = str(root.resolve())
+    wanted = list(dict.fromkeys(indicators))
+
+    store = _OPEN.get(key) or PanelStore.open(pro_dir, root)
+    if store is not None and store.is_fresh(wanted):
+        _OPEN[key] = store
+        return store
+
+    # keep what is already compiled so other callers' indicators survive the rebuild
+    previous = [ind for ind in (store.indicators if store is not None else [])
+                if (pro_dir / f"{ind}.csv").exists()]
+    store = PanelStore.build(previous + wanted, pro_dir, root, imputed=imputed)
+    _OPEN[key] = store
+    return store
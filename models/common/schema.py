@@ -0,0 +1,166 @@
+# models/common/schema.py
+"""
+Schema descriptors for processed CSVs.
+
+The first read of data/processed/<name>.csv sniffs its layout from the header
+and a small sample, then writes <name>.schema.json next to it:
+
+  layout      "tidy" (date,value), "wide_year" (explicit year column) or
+              "legacy_index" (first column is a date/year index)
+  year_col    column holding the year/date
+  year_rule   "int" | "iso" (YYYY-... strings) | "datetime" | "extract" (first
+              4-digit year 1700..2100 anywhere in the string)
+  value_col   preferred value column; extra_cols lists 'imputed'/'imputed_var' if present
+  se_col      standard errors of value_col ('se' or '<value_col>_se'), if present
+  header      the header line the descriptor was derived from
+
+Later reads trust the descriptor as long as the header line is unchanged and
+do a single read_csv with usecols and a float dtype; year parsing is always
+vectorized.
+"""
+from __future__ import annotations
+import json
+import os
+import re
+from pathlib import Path
+from typing import Dict, List, Optional
+
+import numpy as np
+import pandas as pd
+
+SCHEMA_VERSION = 2
+SNIFF_ROWS = 200
+EXTRA_COLS = ("imputed", "imputed_var")
+_ISO_RE = re.compile(r"^\d{4}-\d{2}(-\d{2})?")
+_YEAR_PATTERN = r"(1[7-9]\d\d|20\d\d|2100)"
+
+
+def schema_path(csv_path: Path) -> Path:
+    csv_path = Path(csv_path)
+    return csv_path.with_name(csv_path.stem + ".schema.json")
+
+
+def _header_line(csv_path: Path) -> str:
+    with open(csv_path, "r", encoding="utf-8", errors="replace") as f:
+        return f.readline().rstrip("\r\n")
+
+
+def years_from_values(values: pd.Series | pd.Index, rule: str) -> pd.Index:
+    """Vectorized year extraction under a descriptor's year_rule (Int64 result)."""
+    v = pd.Series(np.asarray(values, dtype=object) if rule != "int" else values)
+    if rule == "int":
+        years = pd.to_numeric(v, errors="coerce")
+    elif rule == "iso":
+        years = pd.to_numeric(v.astype(str).str.slice(0, 4), errors="coerce")
+    elif rule == "datetime":
+        years = pd.to_datetime(v, errors="coerce", format="mixed").dt.year
+    else:
+        years = pd.to_numeric(v.astype(str).str.extract(_YEAR_PATTERN, expand=False), errors="coerce")
+    years = years.where((years >= 1700) & (years <= 2100)) if rule == "extract" else years
+    return pd.Index(years.astype("Int64"))
+
+
+def _year_rule(sample: pd.Series) -> str:
+    s = sample.dropna()
+    if len(s) == 0:
+        return "iso"
+    if pd.api.types.is_numeric_dtype(s):
+        return "int"
+    st = s.astype(str)
+    if st.str.match(_ISO_RE).all():
+        return "iso"
+    parsed = pd.to_datetime(st, errors="coerce", format="mixed")
+    if parsed.notna().mean() > 0.9:
+        return "datetime"
+    return "extract"
+
+
+def _pick_value_col(df: pd.DataFrame, exclude: List[str]) -> Optional[str]:
+    for c in ("value", "imputed"):
+        if c in df.columns:
+            return c
+    num_cols = [c for c in df.columns
+                if c not in exclude and pd.api.types.is_numeric_dtype(df[c])]
+    return num_cols[-1] if num_cols else None
+
+
+def sniff_schema(csv_path: Path) -> Dict:
+    """Infer a descriptor from the header and the first SNIFF_ROWS rows."""
+    csv_path = Path(csv_path)
+    sample = pd.read_csv(csv_path, nrows=SNIFF_ROWS)
+    cols = [str(c) for c in sample.columns]
+    lower = {c.strip().lower(): c for c in cols}
+
+    if "year" in lower:
+        layout, year_col = "wide_year", lower["year"]
+    elif "date" in lower and len(cols) >= 2:
+        layout, year_col = "tidy", lower["date"]
+    else:
+        layout, year_col = "legacy_index", cols[0]
+
+    value_col = _pick_value_col(sample, exclude=[year_col] + ([cols[0]] if layout == "legacy_index" else []))
+    if layout == "legacy_index" and value_col is None and len(cols) >= 2:
+        value_col = cols[-1]
+    se_col = next((c for c in ("se", f"{value_col}_se") if value_col is not None and c in cols), None)
+    return {
+        "version": SCHEMA_VERSION,
+        "layout": layout,
+        "year_col": year_col,
+        "year_rule": _year_rule(sample[year_col]) if year_col in sample.columns else "extract",
+        "value_col": value_col,
+        "extra_cols": [c for c in EXTRA_COLS if c in cols and c != value_col],
+        "se_col": se_col,
+        "header": _header_line(csv_path),
+    }
+
+
+def read_schema(csv_path: Path, write: bool = True) -> Dict:
+    """Return the trusted descriptor for csv_path, sniffing (and persisting) it if needed."""
+    csv_path = Path(csv_path)
+    sp = schema_path(csv_path)
+    if sp.exists():
+        try:
+            desc = json.loads(sp.read_text(encoding="utf-8"))
+            if desc.get("version") == SCHEMA_VERSION and desc.get("header") == _header_line(csv_path):
+                return desc
+        except ValueError:
+            pass
+    desc = sniff_schema(csv_path)
+    if write:
+        try:
+            tmp = sp.with_name(sp.name + ".tmp")
+            tmp.write_text(json.dumps(desc, indent=2), encoding="utf-8")
+            os.replace(tmp, sp)
+        except OSError:
+            pass  # read-only data dir: descriptor just isn't persisted
+    return desc
+
+
+def read_processed(csv_path: Path, desc: Dict | None = None) -> pd.DataFrame:
+    """
+    Read a processed CSV using its descriptor: one read_csv with usecols and a
+    float dtype. Returns a frame indexed by Int64 year with a 'value' column
+    (plus any extra columns such as 'imputed', and 'se' when the file has
+    standard errors); rows without a year are dropped.
+    """
+    csv_path = Path(csv_path)
+    if desc is None:
+        desc = read_schema(csv_path)
+    vcol = desc.get("value_col")
+    if vcol is None:
+        return pd.DataFrame({"value": pd.Series(dtype=float)}, index=pd.Index([], dtype="Int64"))
+
+    ycol = desc["year_col"]
+    extra = [c for c in desc.get("extra_cols", []) if c != vcol]
+    renames = {vcol: "value"}
+    if desc.get("se_col"):
+        extra.append(desc["se_col"])
+        renames[desc["se_col"]] = "se"
+    usecols = list(dict.fromkeys([ycol, vcol] + extra))
+    dtypes = {c: "float64" for c in usecols if c != ycol}
+    df = pd.read_csv(csv_path, usecols=usecols, dtype=dtypes)
+
+    years = years_from_values(df[ycol], desc["year_rule"])
+    out = df[[c for c in usecols if c != ycol]].rename(columns=renames)
+    out.index = years
+    return out[out.index.notna()]
@@ -0,0 +1,94 @@
+# models/common/state_forecast.py
+"""
+Multi-step predictive moments of a linear Gaussian state-space model,
+
+  y_t = Z a_t + e_t,        e_t ~ N(0, H)
+  a_{t+1} = T a_t + w_t,    w_t ~ N(0, Q),
+
+computed in a single pass. The filter runs once over the sample to the
+last filtered state (a_T, P_T). The mean and full covariance are then
+carried forward one step at a time,
+
+  a <- T a,   P <- T P T' + Q,   E[y] = Z a,   Var[y] = Z P Z' + H,
+
+so all h horizons together cost h matrix updates. Recomputing each
+horizon's forecast from the origin would cost O(h^2).
+
+  a, P = filter_state(Y, Z, T, Q)                  # Y: (n, p), NaN = missing
+  mom = predictive_moments(a, P, Z, T, Q, steps=40)
+  mom["mean"] (steps, p), mom["cov"] (steps, p, p), mom["sd"] (steps, p)
+  q = marginal_quantiles(mom, [0.05, 0.5, 0.95])  # (steps, p, 3)
+"""
+from __future__ import annotations
+from typing import Dict, Sequence, Tuple
+
+import numpy as np
+from scipy.special import ndtri
+
+DIFFUSE = 1e6
+
+
+def filter_state(Y: np.ndarray, Z: np.ndarray, T: np.ndarray, Q: np.ndarray, H: np.ndarray | None = None,
+                 a0: np.ndarray | None = None, P0: np.ndarray | None = None) -> Tuple[np.ndarray, np.ndarray]:
+    """
+    Kalman filter over the rows of Y; returns the filtered state mean (m,)
+    and covariance (m, m) after the last row. Missing entries of a row are
+    dropped from that row's update (all-missing rows only predict). The
+    default initial state is diffuse: zero mean, DIFFUSE * I.
+    """
+    Y = np.asarray(Y, dtype=np.float64)
+    Z, T, Q = (np.asarray(M, dtype=np.float64) for M in (Z, T, Q))
+    p, m = Z.shape
+    H = np.zeros((p, p)) if H is None else np.asarray(H, dtype=np.float64)
+    a = np.zeros(m) if a0 is None else np.asarray(a0, dtype=np.float64).copy()
+    P = np.eye(m) * DIFFUSE if P0 is None else np.asarray(P0, dtype=np.float64).copy()
+    for t in range(Y.shape[0]):
+        if t > 0:
+            a = T @ a
+            P = T @ P @ T.T + Q
+        obs = ~np.isnan(Y[t])
+        if not obs.any():
+            continue
+        Zo = Z[obs]
+        v = Y[t, obs] - Zo @ a
+        F = Zo @ P @ Zo.T + H[np.ix_(obs, obs)]
+        # K = P Zo' F^-1 (F symmetric)
+        K = np.linalg.solve(F, Zo @ P).T
+        a = a + K @ v
+        P = P - K @ Zo @ P
+        P = 0.5 * (P + P.T)
+    return a, P
+
+
+def predictive_moments(a: np.ndarray, P: np.ndarray, Z: np.ndarray, T: np.ndarray, Q: np.ndarray,
+                       steps: int, H: np.ndarray | None = None) -> Dict[str, np.ndarray]:
+    """
+    Mean (steps, p), covariance (steps, p, p) and marginal sd (steps, p) of
+    y at 1..steps periods after the filtered state (a, P), in one pass.
+    """
+    Z, T, Q = (np.asarray(M, dtype=np.float64) for M in (Z, T, Q))
+    p = Z.shape[0]
+    H = np.zeros((p, p)) if H is None else np.asarray(H, dtype=np.float64)
+    a = np.asarray(a, dtype=np.float64)
+    P = np.asarray(P, dtype=np.float64)
+    mean = np.empty((steps, p))
+    cov = np.empty((steps, p, p))
+    for k in range(steps):
+        a = T @ a
+        P = T @ P @ T.T + Q
+        mean[k] = Z @ a
+        cov[k] = Z @ P @ Z.T + H
+    sd = np.sqrt(np.clip(np.diagonal(cov, axis1=1, axis2=2), 0.0, None))
+    return {"mean": mean, "cov": cov, "sd": sd}
+
+
+def marginal_quantiles(moments: Dict[str, np.ndarray], levels: Sequence[float]) -> np.ndarray:
+    """(steps, p, k) Gaussian marginal quantiles at `levels`."""
+    z = ndtri(np.asarray(levels, dtype=np.float64))
+    return moments["mean"][:, :, None] + moments["sd"][:, :, None] * z[None, None, :]
+
+
+def correlation(moments: Dict[str, np.ndarray]) -> np.ndarray:
+    """(steps, p, p) correlation matrices of the predictive covariance blocks."""
+    sd = np.where(moments["sd"] > 0, moments["sd"], 1.0)
+    return moments["cov"] / (sd[:, :, None] * sd[:, None, :])
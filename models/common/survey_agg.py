@@ -0,0 +1,295 @@
+# models/common/survey_agg.py
+"""
+Vectorized weighted aggregation of respondent-level survey data.
+
+Every statistic is a handful of np.bincount calls over an integer group code
+(usually the survey year), so a full 1948-2024 rebuild is a few array passes
+instead of a per-year subframe and a per-respondent Python loop.
+
+  WeightedGroups     group codes + weights normalized within group
+    .mean(x, mask)       weighted mean (unweighted where a group has no weights)
+    .moments(x, mask)    weighted mean, population SD and valid count
+    .share(cond, mask)   weighted share of rows satisfying cond among mask
+  party_gaps         per-respondent in-party minus out-party thermometer gap
+  affective_gap      gap mean for every (group, thermometer pair) in one
+                     group-by, plus the best pair per group by valid count
+  replicate_se       bootstrap SEs: per group, one (resamples x respondents)
+                     weight matrix times the stacked response vectors
+
+Weighted statistics follow the ANES scripts: a row contributes to a weighted
+statistic only if its normalized weight is positive; a group with no usable
+weights at all falls back to the unweighted statistic.
+"""
+from __future__ import annotations
+import os
+from typing import Dict, List, Optional, Sequence, Tuple
+
+import numpy as np
+import pandas as pd
+
+
+def _as_float(x) -> np.ndarray:
+    return pd.to_numeric(pd.Series(np.asarray(x).ravel()), errors="coerce").to_numpy(dtype=np.float64)
+
+
+class WeightedGroups:
+    """
+    Integer group codes (0..n_groups-1) with weights normalized to sum to one
+    within each group (negative weights clipped to zero, as in the ANES scripts).
+    """
+
+    def __init__(self, codes: np.ndarray, n_groups: int, weights: Optional[np.ndarray] = None,
+                 labels: Optional[Sequence] = None):
+        self.codes = np.asarray(codes, dtype=np.int64)
+        self.n_groups = int(n_groups)
+        self.labels = list(labels) if labels is not None else list(range(self.n_groups))
+        if weights is None:
+            self.w = np.full(len(self.codes), np.nan)
+            self.has_w = np.zeros(self.n_groups, dtype=bool)
+        else:
+            w = np.clip(_as_float(weights), 0.0, None)
+            wsum = self._sum(np.nan_to_num(w))
+            self.has_w = wsum > 0
+            denom = np.where(self.has_w, wsum, np.nan)[self.codes]
+            self.w = w / denom
+
+    @classmethod
+    def _normalized(cls, codes: np.ndarray, n_groups: int, w: np.ndarray, has_w: np.ndarray) -> "WeightedGroups":
+        """Build from weights that are already normalized within group."""
+        g = cls(codes, n_groups)
+        g.w, g.has_w = w, has_w
+        return g
+
+    @classmethod
+    def from_labels(cls, labels, weights=None, keep: Optional[np.ndarray] = None) -> "WeightedGroups":
+        """
+        Group by the values of `labels` (NaN labels, and rows where keep is
+        False, get code -1 and are ignored by every statistic).
+        """
+        lab = pd.Series(np.asarray(labels))
+        ok = lab.notna().to_numpy()
+        if keep is not None:
+            ok = ok & np.asarray(keep, dtype=bool)
+        uniq = np.unique(lab[ok].to_numpy())
+        codes = np.full(len(lab), -1, dtype=np.int64)
+        codes[ok] = np.searchsorted(uniq, lab[ok].to_numpy())
+        return cls(codes, len(uniq), weights, labels=uniq.tolist())
+
+    # ---------- primitives ----------
+    def _sum(self, values: np.ndarray, mask: Optional[np.ndarray] = None) -> np.ndarray:
+        ok = self.codes >= 0
+        if mask is not None:
+            ok = ok & mask
+        return np.bincount(self.codes[ok], weights=values[ok], minlength=self.n_groups)
+
+    def _count(self, mask: np.ndarray) -> np.ndarray:
+        ok = (self.codes >= 0) & mask
+        return np.bincount(self.codes[ok], minlength=self.n_groups)
+
+    def _weighting(self, x: np.ndarray, mask: np.ndarray) -> Tuple[np.ndarray, np.ndarray, np.ndarray]:
+        """Per-row weights (normalized or 1) and the row mask actually used, per group."""
+        use_w = self.has_w[np.clip(self.codes, 0, None)]
+        wmask = mask & ~np.isnan(x) & np.where(use_w, np.nan_to_num(self.w) > 0, True)
+        ww = np.where(use_w, np.nan_to_num(self.w), 1.0)
+        return ww, wmask, use_w
+
+    # ---------- statistics ----------
+    def mean(self, x, mask: Optional[np.ndarray] = None) -> np.ndarray:
+        """Per-group (weighted) mean of x over mask; NaN where nothing contributes."""
+        x = _as_float(x)
+        mask = ~np.isnan(x) if mask is None else (np.asarray(mask, dtype=bool) & ~np.isnan(x))
+        ww, wmask, _ = self._weighting(x, mask)
+        num = self._sum(ww * np.nan_to_num(x), wmask)
+        den = self._sum(ww, wmask)
+        with np.errstate(invalid="ignore", divide="ignore"):
+            return np.where(den > 0, num / den, np.nan)
+
+    def moments(self, x, mask: Optional[np.ndarray] = None) -> Tuple[np.ndarray, np.ndarray, np.ndarray]:
+        """(mean, population SD, n) per group; n counts valid rows regardless of weight."""
+        x = _as_float(x)
+        mask = ~np.isnan(x) if mask is None else (np.asarray(mask, dtype=bool) & ~np.isnan(x))
+        ww, wmask, _ = self._weighting(x, mask)
+        den = self._sum(ww, wmask)
+        with np.errstate(invalid="ignore", divide="ignore"):
+            mu = np.where(den > 0, self._sum(ww * np.nan_to_num(x), wmask) / den, np.nan)
+            dev = np.nan_to_num(x) - mu[np.clip(self.codes, 0, None)]
+            var = np.where(den > 0, self._sum(ww * np.nan_to_num(dev) ** 2, wmask) / den, np.nan)
+        return mu, np.sqrt(var), self._count(mask)
+
+    def share(self, cond, mask: Optional[np.ndarray] = None) -> np.ndarray:
+        """Per-group (weighted) share of rows with cond True among mask."""
+        cond = np.asarray(cond, dtype=bool)
+        mask = np.ones(len(cond), dtype=bool) if mask is None else np.asarray(mask, dtype=bool)
+        return self.mean(cond.astype(np.float64), mask)
+
+    def count(self, mask: np.ndarray) -> np.ndarray:
+        """Number of rows per group with mask True."""
+        return self._count(np.asarray(mask, dtype=bool))
+
+    def observed(self, x) -> np.ndarray:
+        """True for groups with at least one non-NaN value of x."""
+        return self._count(~np.isnan(_as_float(x))) > 0
+
+
+def party_gaps(dem, rep, pid=None) -> np.ndarray:
+    """
+    Per-respondent affective gap for thermometers on 0..100 (NaN otherwise).
+
+    With a 7-point party ID, Democrats (1-3) score |Dem - Rep|, Republicans
+    (5-7) |Rep - Dem| and independents (4) the absolute difference, so the gap
+    is |in-party - out-party| for partisans; respondents without a party ID get
+    NaN. Without pid the gap is the population |Dem - Rep|.
+    """
+    d, r = _as_float(dem), _as_float(rep)
+    valid = (d >= 0) & (d <= 100) & (r >= 0) & (r <= 100)
+    if pid is not None:
+        valid &= ~np.isnan(_as_float(pid))
+    return np.where(valid, np.abs(d - r), np.nan)
+
+
+def affective_gap(groups: WeightedGroups, pairs: Dict[str, Tuple[np.ndarray, np.ndarray]],
+                  pid=None, pid_fallback: bool = True, return_gaps: bool = False):
+    """
+    Affective-gap mean for every (group, thermometer pair) in one grouped pass,
+    then the best pair per group.
+
+    pairs maps a label to (dem, rep) arrays, in preference order. When pid is
+    given, groups where it is observed use the in-party/out-party gap; with
+    pid_fallback, groups without any party ID use the population gap instead.
+
+    The chosen pair maximizes the number of respondents with both thermometers
+    valid, then the number of gaps used; remaining ties go to the last pair
+    whose mean is defined (else the first). Returns one row per group with
+    columns pair, count_valid, n, gap (pair None / gap NaN when no pair has
+    valid data). With return_gaps, also returns each respondent's gap under
+    their group's chosen pair (for replicate_se).
+    """
+    names = list(pairs)
+    P, G, N = len(names), groups.n_groups, len(groups.codes)
+    out = pd.DataFrame({"pair": np.full(G, None, dtype=object), "count_valid": np.zeros(G, dtype=np.int64),
+                        "n": np.zeros(G, dtype=np.int64), "gap": np.full(G, np.nan)},
+                       index=pd.Index(groups.labels, name="group"))
+    if P == 0 or G == 0:
+        return (out, np.full(N, np.nan)) if return_gaps else out
+
+    gcode = np.clip(groups.codes, 0, None)
+    if pid is not None:
+        pid = _as_float(pid)
+        pid_rows = groups.observed(pid)[gcode] if pid_fallback else np.ones(N, dtype=bool)
+    else:
+        pid_rows = np.zeros(N, dtype=bool)
+
+    # stacked (pair, respondent) long form; group id = pair * G + group
+    stacked = WeightedGroups._normalized(
+        np.where(np.tile(groups.codes, P) >= 0, np.repeat(np.arange(P), N) * G + np.tile(gcode, P), -1),
+        P * G, np.tile(groups.w, P), np.tile(groups.has_w, P),
+    )
+
+    pop = np.concatenate([party_gaps(*pairs[k]) for k in names])
+    if pid is not None:
+        part = np.concatenate([party_gaps(*pairs[k], pid) for k in names])
+        gaps = np.where(np.tile(pid_rows, P), part, pop)
+    else:
+        gaps = pop
+
+    count_valid = stacked._count(~np.isnan(pop)).reshape(P, G)
+    n = stacked._count(~np.isnan(gaps)).reshape(P, G)
+    gap = stacked.mean(gaps).reshape(P, G)
+
+    # lexicographic (count_valid, n, defined-gap order) argmax over pairs
+    tiebreak = np.where(np.isnan(gap), 0, np.arange(1, P + 1)[:, None])
+    key = (count_valid * (N + 1) + n) * (P + 1) + tiebreak
+    key = np.where(count_valid > 0, key, -1)
+    best = key.argmax(axis=0)
+    cols = np.arange(G)
+    chosen = key[best, cols] >= 0
+
+    out["count_valid"] = np.where(chosen, count_valid[best, cols], 0)
+    out["n"] = np.where(chosen, n[best, cols], 0)
+    out["gap"] = np.where(chosen, gap[best, cols], np.nan)
+    chosen_pairs = np.full(G, None, dtype=object)
+    for g in np.flatnonzero(chosen):
+        chosen_pairs[g] = names[best[g]]
+    out["pair"] = chosen_pairs
+    if not return_gaps:
+        return out
+    row_gaps = gaps.reshape(P, N)[best[gcode], np.arange(N)]
+    return out, np.where((groups.codes >= 0) & chosen[gcode], row_gaps, np.nan)
+
+
+# ---------- bootstrap standard errors ----------
+def _resample_se(task) -> np.ndarray:
+    """
+    SEs for one group: B multinomial resamples of the group's respondents as a
+    (B, n) multiplicity matrix, times the row weights, times the stacked
+    response columns [m, m*x, m*x^2] of every statistic -- one matmul.
+    """
+    X, ww, kinds, n_boot, seed = task
+    n, k = len(ww), len(kinds)
+    if n == 0:
+        return np.full(k, np.nan)
+    rng = np.random.default_rng(seed)
+    R = rng.multinomial(n, np.full(n, 1.0 / n), size=n_boot).astype(np.float64)
+    A = (R * ww) @ X                                   # (B, 3k)
+    s0, s1, s2 = A[:, 0::3], A[:, 1::3], A[:, 2::3]
+    with np.errstate(invalid="ignore", divide="ignore"):
+        mu = s1 / s0
+        sd = np.sqrt(np.clip(s2 / s0 - mu * mu, 0.0, None))
+    reps = np.where(np.array(kinds) == "sd", sd, mu)
+    reps = np.where(s0 > 0, reps, np.nan)
+    se = np.full(k, np.nan)
+    for j in range(k):
+        r = reps[:, j][np.isfinite(reps[:, j])]
+        if len(r) >= 2:
+            se[j] = float(np.std(r, ddof=1))
+    return se
+
+
+def replicate_se(groups: WeightedGroups, stats: Sequence[Tuple[str, np.ndarray, Optional[np.ndarray]]],
+                 n_boot: int = 200, seed: int = 0, jobs: Optional[int] = None) -> List[np.ndarray]:
+    """
+    Bootstrap standard errors per group for each (kind, x, mask) in stats,
+    kind 'mean' (also shares: x = 0/1 indicator) or 'sd' (population SD).
+
+    Respondents are resampled within group (survey year) with the same
+    weighting rules as the point estimates. All statistics of a group share
+    one resample matrix; groups are spread over a process pool when jobs != 1.
+    Results are reproducible for a given seed regardless of jobs.
+    """
+    k = len(stats)
+    if k == 0 or groups.n_groups == 0 or n_boot < 2:
+        return [np.full(groups.n_groups, np.nan) for _ in range(k)]
+
+    cols = []
+    ww = None
+    for kind, x, mask in stats:
+        if kind not in ("mean", "sd"):
+            raise ValueError(f"replicate_se: unknown statistic kind {kind!r}")
+        x = _as_float(x)
+        mask = ~np.isnan(x) if mask is None else (np.asarray(mask, dtype=bool) & ~np.isnan(x))
+        w_j, wmask, _ = groups._weighting(x, mask)
+        ww = w_j if ww is None else ww
+        m = wmask.astype(np.float64)
+        xv = np.nan_to_num(x)
+        cols += [m, m * xv, m * xv * xv]
+    X = np.column_stack(cols)
+    kinds = [kind for kind, _, _ in stats]
+
+    order = np.argsort(groups.codes, kind="stable")
+    bounds = np.searchsorted(groups.codes[order], np.arange(groups.n_groups + 1))
+    seeds = np.random.SeedSequence(seed).spawn(groups.n_groups)
+    tasks = []
+    for g in range(groups.n_groups):
+        rows = order[bounds[g]:bounds[g + 1]]
+        tasks.append((X[rows], ww[rows], kinds, int(n_boot), seeds[g]))
+
+    if jobs == 1 or len(tasks) == 1:
+        results = [_resample_se(t) for t in tasks]
+    else:
+        from concurrent.futures import ProcessPoolExecutor
+
+        workers = min(jobs or os.cpu_count() or 1, len(tasks))
+        with ProcessPoolExecutor(max_workers=workers) as ex:
+            results = list(ex.map(_resample_se, tasks))
+    se = np.vstack(results)                             # (G, k)
+    return [se[:, j] for j in range(k)]
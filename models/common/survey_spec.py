@@ -0,0 +1,264 @@
+# models/common/survey_spec.py
+"""
+Declarative survey indicators (configs/survey_indicators.yml) computed in one
+pass per source file.
+
+For each source the executor resolves every requested indicator's variables
+against the source's column index, projects the union of those columns from
+the columnar ANES cache once, groups respondents by survey year once (weighted
+and/or unweighted) and evaluates all statistics with models.common.survey_agg.
+Bootstrap standard errors for every statistic come from one batched
+replicate_se call per weighting (years spread over a process pool) and are
+written next to the values: an `se` column in tidy outputs, `<column>_se` in
+wide ones. The processing pipeline carries a tidy output's se through to
+data/processed (models.common.freq_store), where the HSM takes it as the
+known irregular variance of the series. Outputs, thermometer pair-choice reports and one annotations block
+are written together at the end.
+
+Usage:
+  python -m models.common.survey_spec [--spec configs/survey_indicators.yml] [--only NAME ...] [--dry_run]
+                                      [--n_boot 200] [--jobs N]
+"""
+from __future__ import annotations
+import argparse
+import glob
+from pathlib import Path
+from typing import Dict, List, Optional, Sequence
+
+import numpy as np
+import pandas as pd
+import yaml
+
+from .anes_cache import open_anes
+from .survey_agg import WeightedGroups, affective_gap, replicate_se
+
+SPEC_PATH = Path("configs/survey_indicators.yml")
+ANNOTATIONS = Path("data/processed/annotations.md")
+STATISTICS = ("mean", "sd", "share", "affective_gap")
+
+
+def load_spec(path: Path | None = None) -> Dict:
+    path = Path(path) if path is not None else SPEC_PATH
+    with open(path, "r", encoding="utf-8") as f:
+        spec = yaml.safe_load(f)
+    for ind in spec.get("indicators", []):
+        for col in _columns(ind):
+            if col.get("statistic") not in STATISTICS:
+                raise ValueError(f"{ind['name']}: unknown statistic {col.get('statistic')!r} (expected one of {STATISTICS})")
+        if ind.get("source") not in spec.get("sources", {}):
+            raise ValueError(f"{ind['name']}: unknown source {ind.get('source')!r}")
+    return spec
+
+
+def _columns(ind: Dict) -> List[Dict]:
+    """The statistics an indicator produces (a tidy indicator is one unnamed column)."""
+    if ind.get("layout", "tidy") == "wide":
+        return list(ind["columns"])
+    return [dict(ind, name="value", n=None)]
+
+
+def _candidates(spec: Dict, ref) -> List:
+    if ref is None:
+        return []
+    if isinstance(ref, str):
+        return list(spec.get("variables", {}).get(ref, [ref]))
+    return list(ref)
+
+
+def _first(cands: Sequence[str], columns: Sequence[str]) -> Optional[str]:
+    present = set(columns)
+    return next((c for c in cands if c in present), None)
+
+
+def _source_csv(src: Dict) -> Optional[Path]:
+    hits = sorted(glob.glob(src["pattern"]))
+    return Path(hits[-1]) if hits else None
+
+
+def _resolve(spec: Dict, col: Dict, columns: Sequence[str]) -> Dict:
+    """Map a statistic's variable references to actual column names in the source."""
+    if col["statistic"] == "affective_gap":
+        pairs = [tuple(p) for p in _candidates(spec, col.get("pairs"))
+                 if p[0] in columns and p[1] in columns]
+        return {"pairs": pairs, "pid": _first(_candidates(spec, col.get("pid")), columns)}
+    return {"variable": _first(_candidates(spec, col.get("variable")), columns)}
+
+
+def _evaluate(col: Dict, res: Dict, frame: pd.DataFrame, groups: WeightedGroups):
+    """
+    (values, n, pair choices or None, bootstrap term or None) per group for one
+    statistic; the bootstrap term is the (kind, x, mask) passed to replicate_se.
+    """
+    G = groups.n_groups
+    stat = col["statistic"]
+    if stat == "affective_gap":
+        if not res["pairs"]:
+            return np.full(G, np.nan), np.zeros(G, dtype=int), [None] * G, None
+        pairs = {p: (frame[p[0]].to_numpy(), frame[p[1]].to_numpy()) for p in res["pairs"]}
+        pid = frame[res["pid"]].to_numpy() if res["pid"] else None
+        aff, gaps = affective_gap(groups, pairs, pid=pid, return_gaps=True)
+        return aff["gap"].to_numpy(), aff["n"].to_numpy(dtype=int), aff["pair"].tolist(), ("mean", gaps, None)
+
+    if res["variable"] is None:
+        return np.full(G, np.nan), np.zeros(G, dtype=int), None, None
+    x = frame[res["variable"]].to_numpy(dtype=np.float64)
+    lo, hi = col.get("valid", [-np.inf, np.inf])
+    valid = (x >= lo) & (x <= hi)
+    if stat == "share":
+        s_lo, s_hi = col["success"]
+        hit = ((x >= s_lo) & (x <= s_hi)).astype(np.float64)
+        n = groups.count(valid)
+        value = np.where(n > 0, groups.share(hit > 0, valid), np.nan)
+        boot = ("mean", hit, valid)
+    elif stat == "mean":
+        n = groups.count(valid)
+        value = groups.mean(x, valid)
+        boot = ("mean", x, valid)
+    else:
+        _, value, n = groups.moments(x, valid)
+        boot = ("sd", x, valid)
+    return value, np.asarray(n, dtype=int), None, boot
+
+
+def run_source(spec: Dict, src_name: str, indicators: List[Dict], write: bool = True,
+               n_boot: int = 200, seed: int = 0, jobs: Optional[int] = None) -> List[str]:
+    """Compute every indicator of one source from a single projection; returns annotation lines."""
+    src = spec["sources"][src_name]
+    csv = _source_csv(src)
+    if csv is None:
+        print(f"[survey_spec] {src_name}: no file matching {src['pattern']}; skipping {[i['name'] for i in indicators]}")
+        return []
+
+    year_const = src.get("year_const")
+    cache = open_anes(csv, year_const=year_const)
+    year_col = None
+    if year_const is None:
+        year_col = _first(src.get("year", []), cache.columns)
+        if year_col is None:
+            print(f"[survey_spec] {src_name}: no year column among {src.get('year')}; skipping")
+            return []
+        cache = open_anes(csv, year_col=year_col)
+    wcol = _first(src.get("weight", []), cache.columns)
+
+    plans = []
+    needed: List[str] = [wcol] if wcol else []
+    for ind in indicators:
+        for col in _columns(ind):
+            res = _resolve(spec, col, cache.columns)
+            needed += [c for p in res.get("pairs", []) for c in p] + [res.get("pid"), res.get("variable")]
+            plans.append((ind, col, res))
+    needed = [c for c in dict.fromkeys(needed) if c]
+    frame = cache.frame(needed)
+    print(f"[survey_spec] {src_name}: {csv.name} -> {len(needed)} of {len(cache.columns)} columns, "
+          f"{len(indicators)} indicator(s)")
+
+    year = cache.year_vector().astype(np.float64)
+    keep = (year >= 1900) & (year <= 2100)
+    groups = {
+        True: WeightedGroups.from_labels(year, weights=frame[wcol] if wcol else None, keep=keep),
+        False: WeightedGroups.from_labels(year, keep=keep),
+    }
+    years = [int(y) for y in groups[True].labels]
+
+    notes = [f"- Source {src_name}: {csv.name} | YEAR: {year_col or year_const} | "
+             f"weights: {wcol or 'None'} (per-year normalized) | columns read: {len(needed)} of {len(cache.columns)}"]
+    results: Dict[str, Dict] = {}
+    boot_terms: Dict[bool, List] = {True: [], False: []}
+    for ind, col, res in plans:
+        weighted = bool(col.get("weighted", ind.get("weighted", True)))
+        value, n, pairs, boot = _evaluate(col, res, frame, groups[weighted])
+        out = results.setdefault(ind["name"], {"ind": ind, "cols": {}, "pairs": {}})
+        out["cols"][col["name"]] = value
+        se_name = "se" if col["name"] == "value" else f"{col['name']}_se"
+        out["cols"][se_name] = np.full(len(years), np.nan)
+        if boot is not None:
+            boot_terms[weighted].append((out["cols"], se_name, boot))
+        if col.get("n"):
+            out["cols"][col["n"]] = n
+        if pairs is not None:
+            out["pairs"][col["name"]] = pairs
+        used = res.get("variable") or ", ".join("/".join(p) for p in res.get("pairs", [])) or "none"
+        if res.get("variable") is None and not res.get("pairs"):
+            print(f"[survey_spec] NOTE: {ind['name']}.{col['name']}: no candidate variable in {csv.name}")
+        notes.append(f"- {ind['name']}{'' if col['name'] == 'value' else '.' + col['name']}: "
+                     f"{col['statistic']} of {used}" + (f" (pid: {res['pid']})" if res.get("pid") else ""))
+
+    # bootstrap SEs: one batched replicate_se call per weighting, all statistics at once
+    if n_boot:
+        for weighted, terms in boot_terms.items():
+            if terms:
+                ses = replicate_se(groups[weighted], [t[2] for t in terms], n_boot=n_boot, seed=seed, jobs=jobs)
+                for (cols, se_name, _), se in zip(terms, ses):
+                    cols[se_name] = se
+        notes.append(f"- Standard errors: bootstrap, {n_boot} resamples per year (se / *_se columns)")
+
+    for name, out in results.items():
+        ind = out["ind"]
+        df = pd.DataFrame({"year": years, **out["cols"]})
+        stat_cols = [c["name"] for c in _columns(ind)]
+        df = df[df[stat_cols].notna().any(axis=1)].reset_index(drop=True)
+        path = Path(ind["output"])
+        span = f"{df['year'].iloc[0]}–{df['year'].iloc[-1]}" if len(df) else "none"
+        notes.append(f"- {name} -> {path} | rows: {len(df)} | years: {span}")
+        if ind.get("layout", "tidy") != "wide":
+            df = pd.DataFrame({"date": [f"{y}-01-01" for y in df["year"]], "value": df["value"], "se": df["se"]})
+        if not write:
+            continue
+        if df.empty:
+            print(f"[survey_spec] {name}: no data; leaving {path} untouched")
+            continue
+        path.parent.mkdir(parents=True, exist_ok=True)
+        df.to_csv(path, index=False)
+        print(f"[survey_spec] wrote {path} ({len(df)} rows)")
+        for cname, chosen in out["pairs"].items():
+            suffix = "" if len(out["pairs"]) == 1 else f"_{cname}"
+            report = path.with_name(f"{path.stem}{suffix}_pairs_by_year.txt")
+            with open(report, "w", encoding="utf-8") as f:
+                f.write("Thermometer pair chosen per year (Dem/Rep):\n")
+                for y, p in zip(years, chosen):
+                    f.write(f"{y}: {p}\n")
+            print(f"[survey_spec] wrote pair-usage report {report}")
+    return notes
+
+
+def run(spec_path: Path | None = None, only: Optional[Sequence[str]] = None, write: bool = True,
+        n_boot: Optional[int] = None, jobs: Optional[int] = None) -> None:
+    spec = load_spec(spec_path)
+    boot = spec.get("bootstrap", {})
+    n_boot = int(boot.get("n_boot", 200)) if n_boot is None else int(n_boot)
+    seed = int(boot.get("seed", 0))
+    wanted = [i for i in spec.get("indicators", []) if not only or i["name"] in set(only)]
+    missing = set(only or []) - {i["name"] for i in wanted}
+    if missing:
+        raise SystemExit(f"[survey_spec] unknown indicator(s): {sorted(missing)}")
+
+    by_source: Dict[str, List[Dict]] = {}
+    for ind in wanted:
+        by_source.setdefault(ind["source"], []).append(ind)
+
+    notes: List[str] = []
+    for src_name, inds in by_source.items():
+        notes += run_source(spec, src_name, inds, write=write, n_boot=n_boot, seed=seed, jobs=jobs)
+
+    if notes and write:
+        with open(ANNOTATIONS, "a", encoding="utf-8") as f:
+            f.write(f"\n\n## survey indicators build ({Path(spec_path or SPEC_PATH).as_posix()})\n")
+            f.write("\n".join(notes) + "\n")
+        print(f"[survey_spec] updated annotations: {ANNOTATIONS}")
+    elif notes:
+        print("\n".join(notes))
+
+
+def main():
+    ap = argparse.ArgumentParser(description="Build survey indicators from configs/survey_indicators.yml in one pass per source.")
+    ap.add_argument("--spec", type=str, default=str(SPEC_PATH))
+    ap.add_argument("--only", nargs="+", default=None, help="Indicator names to build (default: all)")
+    ap.add_argument("--dry_run", action="store_true", help="Resolve and compute, but write nothing")
+    ap.add_argument("--n_boot", type=int, default=None, help="Bootstrap resamples per year (0 disables SEs; default from spec)")
+    ap.add_argument("--jobs", type=int, default=None, help="Worker processes for the bootstrap (default: all cores)")
+    args = ap.parse_args()
+    run(Path(args.spec), args.only, write=not args.dry_run, n_boot=args.n_boot, jobs=args.jobs)
+
+
+if __name__ == "__main__":
+    main()
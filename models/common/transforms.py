@@ -0,0 +1,295 @@
+# models/common/transforms.py
+"""
+Fitted indicator transforms from configs/indicator_transform_spec.yml.
+
+Each indicator is mapped  x -> transform -> winsorize -> scale:
+
+  transform   identity | log1p | logit_share (shares in (0, 1), or percents
+              with `unit: 100` in the spec; without a unit a series is taken
+              as percents from the first training year it exceeds 1, so the
+              unit of an origin only depends on years <= origin; clipped to
+              [1e-4, 1 - 1e-4])
+  winsorize   clip to the lower_pct / upper_pct percentiles of the
+              transformed training values
+  scale       zscore (mean / sd of the winsorized training values) | none
+
+With `standardization: within-training-window` the winsorization bounds and
+scale are fitted per (indicator, origin) on years <= origin only. All origins
+of the compiled panel (models.common.panel_store) are fitted in one pass over
+its rows: each column keeps a sorted list of its values so far (percentiles
+are order statistics) and running sums of y and y^2, corrected for the few
+values beyond the bounds, give the winsorized mean and sd. Parameter tables
+are cached next to the panel in data/processed/_panel/transform_params.npz,
+keyed on the panel contents and the spec.
+
+Every step is increasing, so forecast quantiles made on the transformed scale
+map back to original units through the inverse transform (quantile
+equivariance); winsorization has no inverse and is skipped there.
+
+  tf = origin_transforms(indicators, origin)
+  z = tf.forward(panel)                       # DataFrame, vectorized
+  q = tf.inverse_quantiles({ind: {h: {"q05": ..., "q50": ..., "q95": ...}}})
+"""
+from __future__ import annotations
+import bisect
+import hashlib
+import json
+from pathlib import Path
+from typing import Dict, Iterable, List, Optional
+
+import numpy as np
+import pandas as pd
+import yaml
+
+from .comoments import _panel_key
+from .panel_store import PanelStore, open_panel
+
+SPEC_PATH = Path("configs/indicator_transform_spec.yml")
+CACHE_NAME = "transform_params.npz"
+CACHE_VERSION = 2
+TRANSFORMS = ("identity", "log1p", "logit_share")
+SCALES = ("zscore", "none")
+SHARE_EPS = 1e-4
+DEFAULT = {"transform": "identity", "scale": "zscore"}
+
+_MEMO: Dict[str, Dict] = {}
+_SPECS: Dict[tuple, Dict] = {}
+
+
+def load_transform_spec(path: Path | None = None) -> Dict:
+    """Parsed spec, memoized per file version (size, mtime_ns)."""
+    path = Path(path) if path is not None else SPEC_PATH
+    st = path.stat()
+    memo_key = (str(path.resolve()), int(st.st_size), int(st.st_mtime_ns))
+    if memo_key in _SPECS:
+        return _SPECS[memo_key]
+    with open(path, "r", encoding="utf-8") as f:
+        spec = yaml.safe_load(f) or {}
+    for name, t in (spec.get("transforms") or {}).items():
+        if t.get("transform", "identity") not in TRANSFORMS:
+            raise ValueError(f"{name}: unknown transform {t.get('transform')!r} (expected one of {TRANSFORMS})")
+        if t.get("scale", "zscore") not in SCALES:
+            raise ValueError(f"{name}: unknown scale {t.get('scale')!r} (expected one of {SCALES})")
+        if "unit" in t and not (isinstance(t["unit"], (int, float)) and t["unit"] > 0):
+            raise ValueError(f"{name}: unit must be a positive number, got {t['unit']!r}")
+    _SPECS[memo_key] = spec
+    return spec
+
+
+def transform_for(indicator: str, spec: Dict) -> Dict:
+    """{'transform', 'scale'[, 'unit']} for an indicator, by name or through `aliases`."""
+    entries = spec.get("transforms") or {}
+    name = (spec.get("aliases") or {}).get(indicator, indicator)
+    return {**DEFAULT, **entries.get(name, {})}
+
+
+def _spec_key(spec: Dict) -> str:
+    return hashlib.sha256(json.dumps(spec, sort_keys=True, default=str).encode("utf-8")).hexdigest()
+
+
+# ---------- elementwise transforms ----------
+def forward_transform(kind: str, x, unit: float = 1.0) -> np.ndarray:
+    x = np.asarray(x, dtype=np.float64)
+    with np.errstate(invalid="ignore", divide="ignore"):
+        if kind == "log1p":
+            return np.log1p(x)
+        if kind == "logit_share":
+            p = np.clip(x / unit, SHARE_EPS, 1.0 - SHARE_EPS)
+            return np.log(p) - np.log1p(-p)
+    return x
+
+
+def inverse_transform(kind: str, y, unit: float = 1.0) -> np.ndarray:
+    y = np.asarray(y, dtype=np.float64)
+    if kind == "log1p":
+        return np.expm1(y)
+    if kind == "logit_share":
+        return unit / (1.0 + np.exp(-y))
+    return y
+
+
+def _share_units(kind: str, x: np.ndarray, unit: Optional[float] = None) -> np.ndarray:
+    """
+    Unit of a column as of every row: the spec's unit if given, else fractions
+    until the series first exceeds 1 and percents from that row on.
+    """
+    if kind != "logit_share":
+        return np.ones(len(x))
+    if unit is not None:
+        return np.full(len(x), float(unit))
+    seen = np.fmax.accumulate(np.where(np.isnan(x), -np.inf, x)) if len(x) else np.zeros(0)
+    return np.where(seen > 1.0, 100.0, 1.0)
+
+
+def _order_quantile(srt: List[float], p: float) -> float:
+    """Linear-interpolated quantile (numpy's default) of a sorted list."""
+    pos = p * (len(srt) - 1)
+    i = int(pos)
+    if i + 1 >= len(srt):
+        return srt[-1]
+    return srt[i] + (pos - i) * (srt[i + 1] - srt[i])
+
+
+def origin_params_table(values: np.ndarray, mask: np.ndarray, kinds: List[str], units: np.ndarray,
+                        lower_pct: float = 0.5, upper_pct: float = 99.5) -> Dict[str, np.ndarray]:
+    """
+    Winsorization bounds and winsorized mean / sd of each transformed column
+    as of every row: (T, k) arrays lo, hi, mean, sd, n. `units` is (T, k), the
+    unit each row's origin transforms with. One pass over the rows, restarted
+    from the top in the (rare) row where a column's unit changes.
+    """
+    values = np.asarray(values, dtype=np.float64)
+    T, k = values.shape
+    units = np.broadcast_to(np.asarray(units, dtype=np.float64), (T, k))
+    out = {name: np.full((T, k), np.nan) for name in ("lo", "hi", "mean", "sd")}
+    out["n"] = np.zeros((T, k), dtype=np.int32)
+    pl, pu = lower_pct / 100.0, upper_pct / 100.0
+    for j in range(k):
+        starts = [0] + [int(t) for t in np.flatnonzero(np.diff(units[:, j])) + 1] if T else []
+        for r, t0 in enumerate(starts):
+            t1 = starts[r + 1] if r + 1 < len(starts) else T
+            y = forward_transform(kinds[j], values[:t1, j], units[t0, j])
+            ok = np.asarray(mask[:t1, j], dtype=bool) & np.isfinite(y)
+            if ok.any():
+                _running_params(y, ok, pl, pu, t0, out, j)
+    return out
+
+
+def _running_params(y: np.ndarray, ok: np.ndarray, pl: float, pu: float, t0: int,
+                    out: Dict[str, np.ndarray], j: int) -> None:
+    """Fill rows t0.. of column j of `out` with the parameters of y[:t + 1][ok]."""
+    c = float(y[ok][0])  # centre for the running sums (conditioning only)
+    srt: List[float] = []
+    s1 = s2 = 0.0
+    for t in range(len(y)):
+        if ok[t]:
+            d = float(y[t]) - c
+            bisect.insort(srt, d)
+            s1 += d
+            s2 += d * d
+        n = len(srt)
+        if n == 0 or t < t0:
+            continue
+        a, b = _order_quantile(srt, pl), _order_quantile(srt, pu)
+        c1, c2 = s1, s2
+        i = 0
+        while i < n and srt[i] < a:
+            c1 += a - srt[i]
+            c2 += a * a - srt[i] * srt[i]
+            i += 1
+        i = n - 1
+        while i >= 0 and srt[i] > b:
+            c1 += b - srt[i]
+            c2 += b * b - srt[i] * srt[i]
+            i -= 1
+        m = c1 / n
+        out["lo"][t, j], out["hi"][t, j], out["mean"][t, j] = a + c, b + c, m + c
+        if n > 1:
+            out["sd"][t, j] = np.sqrt(max(c2 - c1 * m, 0.0) / (n - 1))
+        out["n"][t, j] = n
+
+
+# ---------- fitted transforms for one origin ----------
+class FittedTransforms:
+    """Transforms of a set of indicators with parameters fitted up to one origin."""
+
+    def __init__(self, indicators: List[str], kinds: List[str], scales: List[str], units: np.ndarray,
+                 lo: np.ndarray, hi: np.ndarray, mean: np.ndarray, sd: np.ndarray):
+        self.indicators = list(indicators)
+        self.kinds = list(kinds)
+        self.units = np.asarray(units, dtype=np.float64)
+        self.lo = np.asarray(lo, dtype=np.float64)
+        self.hi = np.asarray(hi, dtype=np.float64)
+        z = np.array([s == "zscore" for s in scales])
+        ok_sd = np.isfinite(sd) & (np.asarray(sd) > 0)
+        self.mean = np.where(z & np.isfinite(mean), mean, 0.0)
+        self.sd = np.where(z & ok_sd, sd, 1.0)
+        self._col = {ind: j for j, ind in enumerate(self.indicators)}
+
+    def params(self) -> pd.DataFrame:
+        return pd.DataFrame({"transform": self.kinds, "unit": self.units, "lo": self.lo, "hi": self.hi,
+                             "mean": self.mean, "sd": self.sd}, index=pd.Index(self.indicators, name="indicator"))
+
+    def forward(self, data: pd.DataFrame) -> pd.DataFrame:
+        """Transform, winsorize and scale every column of `data` (NaN stays NaN)."""
+        cols = [self._col[c] for c in data.columns]
+        x = data.to_numpy(dtype=np.float64)
+        y = np.empty_like(x)
+        for i, j in enumerate(cols):
+            y[:, i] = forward_transform(self.kinds[j], x[:, i], self.units[j])
+        lo, hi = self.lo[cols], self.hi[cols]
+        y = np.clip(y, np.where(np.isnan(lo), -np.inf, lo), np.where(np.isnan(hi), np.inf, hi))
+        y = (y - self.mean[cols]) / self.sd[cols]
+        return pd.DataFrame(y, index=data.index, columns=data.columns)
+
+    def inverse(self, z, indicator: str) -> np.ndarray:
+        """Original units of values on the transformed (scaled) scale of one indicator."""
+        j = self._col[indicator]
+        return inverse_transform(self.kinds[j], np.asarray(z, dtype=np.float64) * self.sd[j] + self.mean[j],
+                                 self.units[j])
+
+    def inverse_quantiles(self, quantiles: Dict[str, Dict]) -> Dict[str, Dict]:
+        """Map {indicator: {horizon: {q: value}}} back to original units."""
+        out: Dict[str, Dict] = {}
+        for ind, sub in quantiles.items():
+            if ind not in self._col:
+                out[ind] = sub
+                continue
+            out[ind] = {h: {q: float(self.inverse(v, ind)) for q, v in qs.items()} for h, qs in sub.items()}
+        return out
+
+
+def _load_or_build(store: PanelStore, spec: Dict) -> Dict:
+    key = hashlib.sha256(f"{CACHE_VERSION}:{_panel_key(store)}{_spec_key(spec)}".encode("utf-8")).hexdigest()
+    memo = _MEMO.get(str(store.root.resolve()))
+    if memo is not None and memo["key"] == key:
+        return memo
+
+    cfg = [transform_for(ind, spec) for ind in store.indicators]
+    kinds = [c["transform"] for c in cfg]
+    path = store.root / CACHE_NAME
+    data = None
+    if path.exists():
+        with np.load(path, allow_pickle=False) as z:
+            if str(z["key"]) == key:
+                data = {k: z[k] for k in ("units", "lo", "hi", "mean", "sd", "n")}
+    if data is None:
+        values = np.asarray(store.values)
+        units = np.column_stack([_share_units(kd, values[:, j], c.get("unit"))
+                                 for j, (kd, c) in enumerate(zip(kinds, cfg))]) if kinds else np.ones((len(values), 0))
+        w = spec.get("winsorization") or {}
+        data = origin_params_table(values, store.mask, kinds, units,
+                                   float(w.get("lower_pct", 0.0)), float(w.get("upper_pct", 100.0)))
+        data["units"] = units
+        np.savez_compressed(path, key=np.array(key), years=store.years,
+                            indicators=np.array(store.indicators), **data)
+        print(f"[transforms] fitted transform parameters for {len(store.years)} origins -> {path}")
+
+    if spec.get("standardization", "within-training-window") != "within-training-window":
+        # full-sample fit: every origin uses the parameters of the last year
+        data = {k: (np.broadcast_to(v[-1:], v.shape) if v.ndim == 2 and len(v) else v) for k, v in data.items()}
+
+    memo = {"key": key, "year0": store.year0, "index": {ind: j for j, ind in enumerate(store.indicators)},
+            "kinds": kinds, "scales": [c["scale"] for c in cfg], **data}
+    _MEMO[str(store.root.resolve())] = memo
+    return memo
+
+
+def origin_transforms(indicators: Iterable[str], origin: int, pro_dir: Path | None = None,
+                      spec: Optional[Dict] = None) -> FittedTransforms:
+    """Transforms of `indicators` fitted on years <= origin."""
+    indicators = list(indicators)
+    spec = load_transform_spec() if spec is None else spec
+    store = open_panel(indicators, pro_dir)
+    memo = _load_or_build(store, spec)
+    cols = [memo["index"][ind] for ind in indicators]
+    t = int(origin) - memo["year0"]
+    n_years = memo["mean"].shape[0]
+
+    def row(name: str) -> np.ndarray:
+        if t < 0 or n_years == 0:
+            return np.full(len(cols), np.nan)
+        return np.asarray(memo[name][min(t, n_years - 1)], dtype=np.float64)[cols]
+
+    return FittedTransforms(indicators, [memo["kinds"][j] for j in cols], [memo["scales"][j] for j in cols],
+                            np.nan_to_num(row("units"), nan=1.0), row("lo"), row("hi"), row("mean"), row("sd"))
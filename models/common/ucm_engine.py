@@ -0,0 +1,196 @@
+# models/common/ucm_engine.py
+"""
+Batched maximum-likelihood fitting of the local level model used by the HSM,
+
+  y_t = mu_t + e_t,        e_t ~ N(0, sigma2.irregular)
+  mu_{t+1} = mu_t + w_t,   w_t ~ N(0, sigma2.level),
+
+for many series at once in NumPy. It is the model statsmodels'
+UnobservedComponents(level="local level") estimates, without its per-model
+construction cost and numerical gradients.
+
+The series are the columns of a (time x series) array, left-aligned at each
+series' first observation and NaN-padded at the end. sigma2.irregular is
+concentrated out of the likelihood, leaving one parameter per series,
+theta = log(sigma2.level / sigma2.irregular). One Kalman filter pass over the
+array gives every column's concentrated log-likelihood together with its
+exact derivative in theta (the filter recursions are differentiated
+alongside: dP, da, dF, dv). The first observation initializes the level
+exactly (diffuse prior) and is left out of the likelihood, as statsmodels'
+loglikelihood_burn does.
+
+Fitting: one pass over a grid of theta values brackets each column's
+maximum, then safeguarded regula falsi (Illinois) on the analytic
+derivative converges all columns together, a pass per iteration. theta is
+kept in [THETA_MIN, THETA_MAX]; a column whose derivative keeps its sign
+over the range ends on the bound.
+
+A series whose irregular variance is known (e.g. the squared standard error
+of a survey estimate) can have it fixed: sigma2.irregular is then not
+concentrated out and only theta, hence sigma2.level, is estimated.
+
+  fit = fit_local_level([y1, y2, ...])     # 1-d arrays, NaN = missing year
+  fit = fit_local_level([y1, y2], sigma2_irregular=[0.4, np.nan])   # y1's fixed
+  mu, var = forecast_local_level(fit, h)   # (k, h) predictive mean / variance of y
+"""
+from __future__ import annotations
+from typing import Dict, List, Sequence
+
+import numpy as np
+
+THETA_MIN, THETA_MAX = np.log(1e-10), np.log(1e10)
+GRID = np.linspace(THETA_MIN, THETA_MAX, 21)
+TOL = 1e-7
+MAX_ITER = 60
+
+
+def stack_series(series: Sequence[np.ndarray]) -> tuple[np.ndarray, np.ndarray]:
+    """(T, k) array left-aligned at each series' first observation, and each series' last row."""
+    trimmed = []
+    for y in series:
+        y = np.asarray(y, dtype=np.float64)
+        ok = np.flatnonzero(~np.isnan(y))
+        trimmed.append(y[ok[0]:ok[-1] + 1] if len(ok) else y[:0])
+    T = max((len(y) for y in trimmed), default=0)
+    Y = np.full((T, len(trimmed)), np.nan)
+    for j, y in enumerate(trimmed):
+        Y[:len(y), j] = y
+    return Y, np.array([len(y) - 1 for y in trimmed], dtype=np.int64)
+
+
+def loglik_grad(Y: np.ndarray, last: np.ndarray, theta: np.ndarray,
+                s2_fixed: np.ndarray | None = None) -> Dict[str, np.ndarray]:
+    """
+    Concentrated log-likelihood of every column of Y at theta (B,) and its
+    derivative in theta, plus sigma2.irregular and the filtered level /
+    variance (in sigma2.irregular units) at each column's last row.
+    Columns with a finite s2_fixed (B,) use that sigma2.irregular instead of
+    concentrating it out. Y must be left-aligned (row 0 observed in every
+    non-empty column).
+    """
+    T, B = Y.shape
+    q = np.exp(theta)
+    a = Y[0].copy() if T else np.zeros(B)  # level initialized at the first observation
+    P = np.ones(B) + q          # predicted variance of the level for row 1
+    dP = np.ones(B)             # d P / d q
+    da = np.zeros(B)
+    S = np.zeros(B)             # sum v^2 / F
+    dS = np.zeros(B)
+    L = np.zeros(B)             # sum log F
+    dL = np.zeros(B)
+    n = np.zeros(B)
+    a_last = a.copy()
+    P_last = np.ones(B)
+    for t in range(1, T):
+        y = Y[t]
+        obs = ~np.isnan(y)
+        F = P + 1.0
+        v = np.where(obs, y - a, 0.0)
+        iF = 1.0 / F
+        # innovations (only where observed)
+        S += np.where(obs, v * v * iF, 0.0)
+        dS += np.where(obs, (-2.0 * v * da - v * v * dP * iF) * iF, 0.0)
+        L += np.where(obs, np.log(F), 0.0)
+        dL += np.where(obs, dP * iF, 0.0)
+        n += obs
+        # update
+        K = P * iF
+        dK = dP * iF * iF
+        a_f = np.where(obs, a + K * v, a)
+        da_f = np.where(obs, da * (1.0 - K) + dK * v, da)
+        P_f = np.where(obs, P * iF, P)
+        dP_f = np.where(obs, dP * iF * iF, dP)
+        at_end = last == t
+        a_last = np.where(at_end, a_f, a_last)
+        P_last = np.where(at_end, P_f, P_last)
+        # predict
+        a, da = a_f, da_f
+        P, dP = P_f + q, dP_f + 1.0
+    with np.errstate(divide="ignore", invalid="ignore"):
+        s2 = np.where(n > 0, S / np.maximum(n, 1), np.nan)
+        if s2_fixed is not None:
+            s2 = np.where(np.isfinite(s2_fixed), s2_fixed, s2)
+        s2 = np.maximum(s2, 1e-300)
+        # at the concentrated s2 = S / n, S / s2 = n
+        ll = -0.5 * (n * np.log(2.0 * np.pi * s2) + S / s2 + L)
+        grad = -0.5 * (dS / s2 + dL) * q
+    return {"loglik": ll, "grad": np.where(n > 0, grad, 0.0), "s2": s2, "n": n, "a": a_last, "P": P_last}
+
+
+def fit_local_level(series: Sequence[np.ndarray],
+                    sigma2_irregular: Sequence[float] | None = None) -> Dict[str, np.ndarray]:
+    """
+    MLE of the local level model for every series. Returns per-series arrays
+    sigma2_irregular, sigma2_level, loglik, converged, iterations, and the
+    filtered level / variance at the last observation (for forecasting).
+    A finite sigma2_irregular[j] fixes series j's irregular variance.
+    """
+    Y, last = stack_series(series)
+    k = Y.shape[1]
+    G = len(GRID)
+    s2_fixed = None if sigma2_irregular is None else np.asarray(sigma2_irregular, dtype=np.float64)
+
+    # grid pass: every column at every grid point in one filter run
+    grid = loglik_grad(np.repeat(Y, G, axis=1), np.repeat(last, G), np.tile(GRID, k),
+                       None if s2_fixed is None else np.repeat(s2_fixed, G))
+    ll = grid["loglik"].reshape(k, G)
+    g = grid["grad"].reshape(k, G)
+    best = np.argmax(np.where(np.isfinite(ll), ll, -np.inf), axis=1)
+    rows = np.arange(k)
+    # bracket the stationary point next to the best grid value
+    up = (g[rows, best] > 0) & (best < G - 1)
+    down = (g[rows, best] < 0) & (best > 0)
+    lo_i = np.where(up, best, np.where(down, best - 1, best))
+    hi_i = np.where(up, best + 1, np.where(down, best, best))
+    lo, hi = GRID[lo_i], GRID[hi_i]
+    g_lo, g_hi = g[rows, lo_i], g[rows, hi_i]
+    done = (lo_i == hi_i) | np.isclose(g[rows, best], 0.0, atol=TOL)
+    theta = GRID[best].astype(np.float64)
+
+    iterations = np.zeros(k, dtype=np.int64)
+    side = np.zeros(k, dtype=np.int64)
+    for _ in range(MAX_ITER):
+        if done.all():
+            break
+        # regula falsi on the derivative, Illinois-modified; bisect if degenerate
+        denom = g_lo - g_hi
+        with np.errstate(divide="ignore", invalid="ignore"):
+            x = lo + (hi - lo) * g_lo / denom
+        x = np.where((x <= lo) | (x >= hi) | ~np.isfinite(x), 0.5 * (lo + hi), x)
+        x = np.where(done, theta, x)
+        r = loglik_grad(Y, last, x, s2_fixed)
+        gx = r["grad"]
+        iterations += ~done
+        pos = gx > 0
+        # the maximum lies above x when the derivative is still positive
+        new_lo = ~done & pos
+        new_hi = ~done & ~pos
+        g_hi = np.where(new_lo & (side == 1), g_hi * 0.5, g_hi)
+        g_lo = np.where(new_hi & (side == -1), g_lo * 0.5, g_lo)
+        lo, g_lo = np.where(new_lo, x, lo), np.where(new_lo, gx, g_lo)
+        hi, g_hi = np.where(new_hi, x, hi), np.where(new_hi, gx, g_hi)
+        side = np.where(new_lo, 1, np.where(new_hi, -1, side))
+        theta = np.where(done, theta, x)
+        done = done | (np.abs(gx) < TOL) | (hi - lo < TOL)
+
+    r = loglik_grad(Y, last, theta, s2_fixed)
+    s2 = r["s2"]
+    return {"theta": theta, "sigma2_irregular": s2, "sigma2_level": np.exp(theta) * s2, "loglik": r["loglik"],
+            "converged": done, "iterations": iterations, "level": r["a"], "level_var": r["P"] * s2,
+            "n_obs": r["n"] + 1}
+
+
+def forecast_local_level(fit: Dict[str, np.ndarray], h: int) -> tuple[np.ndarray, np.ndarray]:
+    """(k, h) predictive mean and variance of y at 1..h steps after each series' last observation."""
+    steps = np.arange(1, h + 1)[None, :]
+    mu = np.repeat(fit["level"][:, None], h, axis=1)
+    var = fit["level_var"][:, None] + steps * fit["sigma2_level"][:, None] + fit["sigma2_irregular"][:, None]
+    return mu, var
+
+
+def fit_forecast_many(series: List[np.ndarray], h: int,
+                      sigma2_irregular: Sequence[float] | None = None) -> Dict[str, np.ndarray]:
+    """fit_local_level + forecast_local_level in one call (adds 'mu' and 'var', (k, h))."""
+    fit = fit_local_level(series, sigma2_irregular)
+    fit["mu"], fit["var"] = forecast_local_level(fit, h)
+    return fit
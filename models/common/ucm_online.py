@@ -0,0 +1,107 @@
+# models/common/ucm_online.py
+"""
+Online updating of the HSM's local level model at fixed parameters,
+
+  y_t = mu_t + e_t,        e_t ~ N(0, s2_irr)
+  mu_{t+1} = mu_t + w_t,   w_t ~ N(0, s2_lvl),
+
+so a new annual observation costs one Kalman step instead of a refit.
+
+A state is a plain dict (JSON-serializable) holding the parameters, the
+filtered level and its variance after the last assimilated year, and
+drift-test counters since the parameters were last estimated:
+
+  s2_irr, s2_lvl     parameters (from a full fit, see models.common.ucm_engine
+                     or statsmodels UnobservedComponents)
+  year, level, level_var
+  fit_year           last year of the data the parameters were fitted on
+  since_fit, innov_ss
+                     number of observations assimilated since the fit and
+                     the sum of their squared standardized innovations
+
+Drift test: under the model the standardized one-step innovations are
+iid N(0, 1), so innov_ss ~ chi2(since_fit). needs_refit() asks for a
+re-estimate when that statistic's p-value falls below `alpha`. This
+catches a single large surprise as well as a run of moderate ones. It
+also asks once `refit_every` observations have been assimilated.
+
+  st = init_state(years, values, s2_irr, s2_lvl)      # filter a whole series
+  st, e = assimilate(st, 2025, 61.2)                  # one new year
+  needs_refit(st)                                     # None, "drift" or "schedule"
+  mu, var = forecast(st, h)                           # predictive mean / variance of y
+"""
+from __future__ import annotations
+from typing import Dict, Optional, Sequence, Tuple
+
+import numpy as np
+from scipy.stats import chi2
+
+REFIT_EVERY = 5
+DRIFT_ALPHA = 0.01
+_F_MIN = 1e-300
+
+
+def _step(level: float, level_var: float, gap: int, y: float, s2_irr: float, s2_lvl: float):
+    """Predict `gap` years ahead, then update with y: (level, level_var, standardized innovation)."""
+    P = level_var + gap * s2_lvl
+    F = max(P + s2_irr, _F_MIN)
+    v = y - level
+    K = P / F
+    return level + K * v, P - K * P, v / np.sqrt(F)
+
+
+def init_state(years: Sequence[int], values: Sequence[float], s2_irr: float, s2_lvl: float) -> Dict:
+    """
+    Filter one series at fixed parameters. The level starts at the first
+    observation with variance s2_irr (exact diffuse initialization).
+    Missing years (NaN, or absent from `years`) are prediction-only steps.
+    """
+    years = np.asarray(years, dtype=np.int64)
+    values = np.asarray(values, dtype=np.float64)
+    ok = ~np.isnan(values)
+    years, values = years[ok], values[ok]
+    order = np.argsort(years, kind="stable")
+    years, values = years[order], values[order]
+    if len(years) == 0:
+        raise ValueError("no observations to initialize from")
+    s2_irr, s2_lvl = max(float(s2_irr), 0.0), max(float(s2_lvl), 0.0)
+    level, level_var = float(values[0]), s2_irr
+    for t in range(1, len(years)):
+        level, level_var, _ = _step(level, level_var, int(years[t] - years[t - 1]), float(values[t]), s2_irr, s2_lvl)
+    return {"s2_irr": s2_irr, "s2_lvl": s2_lvl, "year": int(years[-1]), "level": float(level),
+            "level_var": float(level_var), "fit_year": int(years[-1]), "since_fit": 0, "innov_ss": 0.0}
+
+
+def assimilate(state: Dict, year: int, y: float) -> Tuple[Dict, float]:
+    """One Kalman update with the observation of `year` (after state["year"]): (new state, standardized innovation)."""
+    year = int(year)
+    if year <= state["year"]:
+        raise ValueError(f"year {year} is not after the state's last year {state['year']}")
+    level, level_var, e = _step(state["level"], state["level_var"], year - state["year"], float(y),
+                                state["s2_irr"], state["s2_lvl"])
+    new = dict(state, year=year, level=float(level), level_var=float(level_var),
+               since_fit=int(state["since_fit"]) + 1, innov_ss=float(state["innov_ss"]) + float(e * e))
+    return new, float(e)
+
+
+def drift_pvalue(state: Dict) -> float:
+    """p-value of the innovations since the last fit (chi2 test); 1.0 when there are none."""
+    n = int(state["since_fit"])
+    return float(chi2.sf(state["innov_ss"], n)) if n > 0 else 1.0
+
+
+def needs_refit(state: Dict, refit_every: int = REFIT_EVERY, alpha: float = DRIFT_ALPHA) -> Optional[str]:
+    """"drift" if the drift test fires, "schedule" after refit_every updates, else None."""
+    if drift_pvalue(state) < alpha:
+        return "drift"
+    if int(state["since_fit"]) >= refit_every:
+        return "schedule"
+    return None
+
+
+def forecast(state: Dict, h: int) -> Tuple[np.ndarray, np.ndarray]:
+    """(h,) predictive mean and variance of y at 1..h years after state["year"]."""
+    steps = np.arange(1, h + 1, dtype=np.float64)
+    mu = np.full(h, state["level"])
+    var = state["level_var"] + steps * state["s2_lvl"] + state["s2_irr"]
+    return mu, var
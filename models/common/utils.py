@@ -7,38 +7,14 @@ from typing import Dict, Iterable, List, Tuple
 import numpy as np
 import pandas as pd
 
+from .cache import INDICATOR_CACHE
+from .freq_store import get_freq_store
+from .schema import read_processed, read_schema
+
 PRO_DIR = Path("data/processed")
 RAW_DIR = Path("data/raw")
 
 
-def _coerce_year_index(idx: pd.Index) -> pd.Index:
-    """Convert various date-ish indices to Int64 year index."""
-    try:
-        years = pd.to_datetime(idx, errors="coerce").year
-        years = pd.Index(years, dtype="Int64")
-        if years.notna().any():
-            return years
-    except Exception:
-        pass
-    try:
-        years = pd.to_numeric(idx, errors="coerce").astype("Int64")
-        return pd.Index(years)
-    except Exception:
-        pass
-
-    def _extract_year(x):
-        s = str(x)
-        for i in range(len(s) - 3):
-            sub = s[i : i + 4]
-            if sub.isdigit():
-                val = int(sub)
-                if 1700 <= val <= 2100:
-                    return val
-        return pd.NA
-
-    return pd.Index([_extract_year(x) for x in idx], dtype="Int64")
-
-
 def _repair_from_raw(indicator: str, pro_path: Path) -> pd.Series:
     """
     Rebuild processed series from data/raw/{indicator}.csv (date,value).
@@ -50,10 +26,9 @@ def _repair_from_raw(indicator: str, pro_path: Path) -> pd.Series:
     df = pd.read_csv(raw_path)
     if "date" not in df.columns or "value" not in df.columns:
         raise KeyError(f"{raw_path} must have columns 'date' and 'value'")
-    df["date"] = pd.to_datetime(df["date"], errors="coerce")
-    s = df.set_index("date")["value"].astype(float).resample("YE").mean().dropna()
-    s.index = pd.Index(s.index.year, dtype="Int64")
-    s = s.sort_index()
+    store = get_freq_store()
+    store.ingest(indicator, df)
+    s = store.annual(indicator, "mean").dropna()
 
     out = pd.DataFrame({"value": s.values}, index=pd.to_datetime(s.index.astype(int), format="%Y"))
     pro_path.parent.mkdir(parents=True, exist_ok=True)
@@ -62,50 +37,100 @@ def _repair_from_raw(indicator: str, pro_path: Path) -> pd.Series:
     return s.rename(indicator)
 
 
-def _read_processed_any_shape(pro_path: Path) -> pd.DataFrame:
+def _parse_indicator(indicator: str, pro_path: Path, imputed: bool = False) -> pd.Series:
     """
-    Read a processed CSV regardless of shape and try to produce a frame
-    with a 'value' column (or at least some numeric column).
+    Parse a processed CSV of any supported shape via its schema descriptor
+    (models.common.schema): one read_csv with known columns and dtypes.
+    With imputed=True the 'imputed' column is returned when the file has one.
     """
-    df = pd.read_csv(pro_path, index_col=0)
-    if df.shape[1] == 1 and df.columns.tolist() == ["date"]:
-        df2 = pd.read_csv(pro_path)
-        if "date" in df2.columns and df2.shape[1] >= 2:
-            cand_cols = [c for c in df2.columns if c.lower() != "date"]
-            val_col = cand_cols[-1]
-            df = df2.set_index("date")[[val_col]].rename(columns={val_col: "value"})
-        else:
-            return df
+    desc = read_schema(pro_path)
+    if desc.get("value_col") is None:
+        return _repair_from_raw(indicator, pro_path)
 
-    if "value" not in df.columns and "imputed" not in df.columns:
-        num_cols = [c for c in df.columns if pd.api.types.is_numeric_dtype(df[c])]
-        if num_cols:
-            df = df[[num_cols[-1]]].rename(columns={num_cols[-1]: "value"})
-    return df
+    df = read_processed(pro_path, desc)
+    col = "imputed" if imputed and "imputed" in df.columns else "value"
+    s = pd.Series(df[col].astype(float).values, index=df.index, name=indicator)
+    s = s[~s.index.duplicated(keep="first")].sort_index()
+    return s
 
 
-def load_indicator(indicator: str, pro_dir: Path | None = None) -> pd.Series:
+def load_indicator(indicator: str, pro_dir: Path | None = None, as_of: int | None = None,
+                   view: str | None = None, imputed: bool = False, allow_latest: bool = False) -> pd.Series:
     """
     Load processed indicator as a Series (Int64 year index).
     Accepts 'value' (preferred) or 'imputed' column; if malformed, rebuilds
     from data/raw/{indicator}.csv.
+
+    imputed=True returns the gap-filled 'imputed' column written by
+    models.common.impute (the observed values where a file has none). It
+    applies to the processed file only, not to view= or as_of= loads.
+
+    view='mean' | 'last' | 'max' | 'min' | 'sum' | 'count' returns that annual
+    aggregate of the native-frequency series from the frequency store
+    (models.common.freq_store) instead of the processed file, which is the
+    'mean' view. Series not yet in the store are ingested from data/raw.
+
+    Parsed series are memoized in INDICATOR_CACHE, keyed on the file's size,
+    mtime and sha256, so repeated loads of an unchanged file skip the parse.
+
+    With as_of=YYYY the series is reconstructed from the vintage store as it
+    was known in the latest vintage <= YYYY. An indicator with no such
+    vintage raises KeyError; allow_latest=True falls back to the current
+    (revised) processed file truncated at YYYY instead, with a warning.
     """
     if pro_dir is None:
         pro_dir = PRO_DIR
+    if view is not None:
+        return _load_view(indicator, view)
+    if as_of is not None:
+        from .vintages import get_vintage_store
+
+        s = get_vintage_store().as_of(indicator, as_of)
+        if s is not None:
+            return s
+        if not allow_latest:
+            raise KeyError(f"No vintage of {indicator} <= {as_of} in the vintage store; snapshot one "
+                           f"(python -m models.common.vintages snapshot) or allow the latest-data fallback")
+        print(f"[WARN] no vintage of {indicator} <= {as_of}; training on LATEST processed data truncated "
+              f"at {as_of} (allow_latest)")
+        s = load_indicator(indicator, pro_dir)
+        return s[s.index <= as_of]
     pro_path = pro_dir / f"{indicator}.csv"
     if not pro_path.exists():
         return _repair_from_raw(indicator, pro_path)
 
-    df = _read_processed_any_shape(pro_path)
-    col = "value" if "value" in df.columns else ("imputed" if "imputed" in df.columns else None)
-    if col is None:
-        return _repair_from_raw(indicator, pro_path)
+    return INDICATOR_CACHE.get_or_load(pro_path, lambda p: _parse_indicator(indicator, p, imputed),
+                                       tag=(indicator, "imputed") if imputed else indicator)
 
-    years = _coerce_year_index(df.index)
-    s = pd.Series(df[col].astype(float).values, index=years, name=indicator)
-    s = s[s.index.notna()]
-    s = s[~s.index.duplicated(keep="first")].sort_index()
-    return s
+
+def _parse_se(indicator: str, pro_path: Path) -> pd.Series:
+    df = read_processed(pro_path)
+    if "se" not in df.columns:
+        return pd.Series(dtype=float, index=pd.Index([], dtype="Int64"), name=indicator)
+    s = pd.Series(df["se"].astype(float).values, index=df.index, name=indicator)
+    return s[~s.index.duplicated(keep="first")].dropna().sort_index()
+
+
+def load_indicator_se(indicator: str, pro_dir: Path | None = None) -> pd.Series:
+    """
+    Standard errors of the processed values (Int64 year index), from the
+    file's 'se' / '<value>_se' column (e.g. the bootstrap SEs of survey
+    indicators, models.common.survey_spec). Empty when the file has none.
+    """
+    pro_path = (pro_dir if pro_dir is not None else PRO_DIR) / f"{indicator}.csv"
+    if not pro_path.exists():
+        return pd.Series(dtype=float, index=pd.Index([], dtype="Int64"), name=indicator)
+    return INDICATOR_CACHE.get_or_load(pro_path, lambda p: _parse_se(indicator, p), tag=(indicator, "se"))
+
+
+def _load_view(indicator: str, view: str) -> pd.Series:
+    store = get_freq_store()
+    if store.meta(indicator) is None:
+        raw_path = RAW_DIR / f"{indicator}.csv"
+        if not raw_path.exists():
+            raise KeyError(f"{indicator} is not in the frequency store and has no raw file at {raw_path}")
+        store.ingest(indicator, pd.read_csv(raw_path))
+    return store.annual(indicator, view).dropna().rename(indicator)
 
 
 def make_origin_panel(
@@ -113,31 +138,76 @@ def make_origin_panel(
     origin_year: int,
     pro_dir: Path | None = None,
     min_len: int = 3,
+    as_of: int | None = None,
+    imputed: bool = False,
 ) -> pd.DataFrame:
-    """Build a panel up to/including origin_year; keep series with >=min_len obs."""
-    if pro_dir is None:
-        pro_dir = PRO_DIR
+    """
+    Build a panel up to/including origin_year; keep series with >=min_len obs.
+    With as_of set, every series is read from the vintage store as known at
+    that year instead of from the latest processed files.
+
+    With imputed=True gaps are filled by the Kalman smoother of
+    models.common.impute, fitted here on years <= origin_year only (the
+    'imputed' columns of the processed files are smoothed over the full
+    sample and are for descriptive use). Only years between a series' first
+    and last observation are filled; min_len still counts observed years.
+    """
+    from .panel_store import open_panel
+
+    indicators = list(indicators)
+    if as_of is not None:
+        return _make_vintage_panel(indicators, origin_year, pro_dir, min_len, as_of)
+    store = open_panel(indicators, pro_dir)
 
     print(f"[make_origin_panel] Origin={origin_year}, min_len={min_len}")
-    kept: List[pd.Series] = []
+    totals = store.counts_upto(store.year0 + store.values.shape[0])
+    pre = store.counts_upto(origin_year)
     names: List[str] = []
 
     for ind in indicators:
-        s = load_indicator(ind, pro_dir)
-        yrs_total = int(s.index.notna().sum())
-        yrs_pre = int((s.index.astype("Int64") <= origin_year).sum())
+        j = store.column(ind)
+        yrs_total = int(totals[j])
+        yrs_pre = int(pre[j])
         print(f"  - {ind}: {yrs_total} yrs  -> <= origin: {yrs_pre}")
         if yrs_pre >= min_len:
-            kept.append(s.loc[s.index <= origin_year])
             names.append(ind)
         else:
             print(f"    ! Skipping {ind}: only {yrs_pre} obs before origin (need >= {min_len})")
 
+    if not names:
+        raise ValueError("No indicators with sufficient history for the given origin.")
+    if not imputed:
+        return store.frame(names, origin=origin_year)
+
+    from .impute import impute_series
+
+    observed = store.frame(names, origin=origin_year)
+    fitted = impute_series({ind: observed[ind] for ind in names})
+    years = observed.index
+    for f in fitted.values():
+        years = years.union(f.index)
+    filled = observed.reindex(years)
+    for ind, f in fitted.items():
+        filled[ind] = filled[ind].fillna(f["imputed"].reindex(years))
+    return filled
+
+
+def _make_vintage_panel(
+    indicators: List[str], origin_year: int, pro_dir: Path | None, min_len: int, as_of: int
+) -> pd.DataFrame:
+    print(f"[make_origin_panel] Origin={origin_year}, min_len={min_len}, as_of={as_of}")
+    kept: List[pd.Series] = []
+    for ind in indicators:
+        s = load_indicator(ind, pro_dir, as_of=as_of).dropna()
+        s = s[s.index <= origin_year]
+        print(f"  - {ind}: <= origin: {len(s)} (vintage as of {as_of})")
+        if len(s) >= min_len:
+            kept.append(s)
+        else:
+            print(f"    ! Skipping {ind}: only {len(s)} obs before origin (need >= {min_len})")
     if not kept:
         raise ValueError("No indicators with sufficient history for the given origin.")
-    df = pd.concat(kept, axis=1)
-    df.columns = names
-    return df
+    return pd.concat(kept, axis=1).sort_index()
 
 
 def _parse_horizon(h) -> int:
@@ -0,0 +1,223 @@
+# models/common/vintages.py
+"""
+Append-only vintage store: what each indicator looked like as of a given year.
+
+Layout (data/vintage_store/):
+  records.bin   fixed-width records (year:int32, value:float64, op:int8), append-only
+  index.json    {indicator: [[vintage, offset, count, kind], ...]} sorted by vintage
+
+A snapshot is stored as a delta against the indicator's previous vintage
+(upserts for new/revised years, deletes for dropped years). Every
+CHECKPOINT_EVERY-th vintage is written in full so that reconstructing any
+vintage touches at most that many deltas. Reconstructed states are memoized per
+indicator, so walking origins forward (1985, 1990, ...) only applies the rows
+that changed between consecutive vintages.
+
+Backtests read it through load_indicator(..., as_of=YYYY). An indicator
+without a vintage <= YYYY is an error unless the caller opts in to the
+latest processed data truncated at YYYY (allow_latest=True, the CLIs'
+--allow-latest-fallback). configs/experiment.yml's vintage_required makes
+the runners train on vintages without --vintage.
+
+Usage:
+  python -m models.common.vintages snapshot --vintage 2025 --indicators vep_turnout_pct trust_media_pct
+  python -m models.common.vintages list
+  python -m models.common.vintages show --indicator vep_turnout_pct --as_of 2000
+"""
+from __future__ import annotations
+import argparse
+import bisect
+import json
+import os
+from pathlib import Path
+from typing import Dict, Iterable, List, Optional, Tuple
+
+import numpy as np
+import pandas as pd
+import yaml
+
+VINTAGE_DIR = Path("data/vintage_store")
+EXPERIMENT_YML = Path("configs/experiment.yml")
+CHECKPOINT_EVERY = 8
+
+RECORD = np.dtype([("year", "<i4"), ("value", "<f8"), ("op", "i1")])
+OP_DELETE = 0
+OP_UPSERT = 1
+
+
+class VintageStore:
+    """Append-only delta log of indicator snapshots with an (indicator, vintage) index."""
+
+    def __init__(self, root: Path | None = None):
+        self.root = Path(root) if root is not None else VINTAGE_DIR
+        self.records_path = self.root / "records.bin"
+        self.index_path = self.root / "index.json"
+        self.index: Dict[str, List[List]] = {}
+        if self.index_path.exists():
+            self.index = json.loads(self.index_path.read_text(encoding="utf-8"))
+        self._records: Optional[np.ndarray] = None
+        # indicator -> (position in index list, {year: value})
+        self._state: Dict[str, Tuple[int, Dict[int, float]]] = {}
+
+    # ---------- reading ----------
+    def _map_records(self) -> np.ndarray:
+        n = self.records_path.stat().st_size // RECORD.itemsize if self.records_path.exists() else 0
+        if self._records is None or len(self._records) < n:
+            self._records = (np.memmap(self.records_path, dtype=RECORD, mode="r", shape=(n,))
+                             if n else np.zeros(0, dtype=RECORD))
+        return self._records
+
+    def vintages(self, indicator: str) -> List[int]:
+        return [int(e[0]) for e in self.index.get(indicator, [])]
+
+    def _apply(self, state: Dict[int, float], entry: List) -> None:
+        _, offset, count, kind = entry
+        recs = self._map_records()[int(offset): int(offset) + int(count)]
+        if kind == "full":
+            state.clear()
+        for year, value, op in zip(recs["year"].tolist(), recs["value"].tolist(), recs["op"].tolist()):
+            if op == OP_DELETE:
+                state.pop(year, None)
+            else:
+                state[year] = value
+
+    def _state_at(self, indicator: str, pos: int) -> Dict[int, float]:
+        entries = self.index[indicator]
+        cached = self._state.get(indicator)
+        # nearest full snapshot at or before pos
+        start = pos
+        while entries[start][3] != "full":
+            start -= 1
+        if cached is not None and start <= cached[0] <= pos:
+            cur, state = cached[0], cached[1]
+        else:
+            cur, state = start, {}
+            self._apply(state, entries[start])
+        for k in range(cur + 1, pos + 1):
+            self._apply(state, entries[k])
+        self._state[indicator] = (pos, state)
+        return state
+
+    def as_of(self, indicator: str, as_of: int) -> Optional[pd.Series]:
+        """Series as known in the latest vintage <= as_of; None if no such vintage."""
+        vints = self.vintages(indicator)
+        pos = bisect.bisect_right(vints, int(as_of)) - 1
+        if pos < 0:
+            return None
+        state = self._state_at(indicator, pos)
+        years = np.fromiter(state.keys(), dtype=np.int64, count=len(state))
+        values = np.fromiter(state.values(), dtype=np.float64, count=len(state))
+        order = np.argsort(years, kind="stable")
+        return pd.Series(values[order], index=pd.Index(years[order], dtype="Int64"), name=indicator)
+
+    # ---------- writing ----------
+    def snapshot(self, indicator: str, series: pd.Series, vintage: int) -> int:
+        """
+        Append `series` as vintage `vintage` of `indicator`; returns the number of
+        records written (0 if nothing changed since the previous vintage).
+        """
+        vintage = int(vintage)
+        entries = self.index.setdefault(indicator, [])
+        if entries and vintage <= int(entries[-1][0]):
+            raise ValueError(
+                f"Vintage store is append-only: {indicator} already has vintage {entries[-1][0]} >= {vintage}"
+            )
+
+        s = pd.Series(series).dropna()
+        new = {int(y): float(v) for y, v in zip(s.index, s.to_numpy(dtype=float))}
+
+        full = not entries or (len(entries) % CHECKPOINT_EVERY == 0)
+        if full:
+            rows = [(y, v, OP_UPSERT) for y, v in sorted(new.items())]
+            kind = "full"
+        else:
+            prev = self._state_at(indicator, len(entries) - 1)
+            rows = [(y, v, OP_UPSERT) for y, v in sorted(new.items()) if prev.get(y) != v]
+            rows += [(y, np.nan, OP_DELETE) for y in sorted(set(prev) - set(new))]
+            kind = "delta"
+
+        self.root.mkdir(parents=True, exist_ok=True)
+        offset = self.records_path.stat().st_size // RECORD.itemsize if self.records_path.exists() else 0
+        if rows:
+            with open(self.records_path, "ab") as f:
+                f.write(np.array(rows, dtype=RECORD).tobytes())
+        entries.append([vintage, int(offset), len(rows), kind])
+        self._state[indicator] = (len(entries) - 1, dict(new))
+        self._write_index()
+        return len(rows)
+
+    def _write_index(self) -> None:
+        tmp = self.index_path.with_name(self.index_path.name + ".tmp")
+        tmp.write_text(json.dumps(self.index, indent=1, sort_keys=True), encoding="utf-8")
+        os.replace(tmp, self.index_path)
+
+
+_STORES: Dict[str, VintageStore] = {}
+
+
+def get_vintage_store(root: Path | None = None) -> VintageStore:
+    """Process-wide VintageStore (keeps the reconstructed-state memo warm across calls)."""
+    root = Path(root) if root is not None else VINTAGE_DIR
+    key = str(root.resolve())
+    store = _STORES.get(key)
+    if store is None:
+        store = _STORES[key] = VintageStore(root)
+    return store
+
+
+def vintage_required(path: Path | None = None) -> bool:
+    """`vintage_required` of configs/experiment.yml (False when the file or key is absent)."""
+    path = Path(path) if path is not None else EXPERIMENT_YML
+    if not path.exists():
+        return False
+    with open(path, "r", encoding="utf-8") as f:
+        return bool((yaml.safe_load(f) or {}).get("vintage_required", False))
+
+
+def snapshot_indicators(indicators: Iterable[str], vintage: int, pro_dir: Path | None = None,
+                        root: Path | None = None) -> Dict[str, int]:
+    """Record the current processed files as vintage `vintage`."""
+    from .utils import load_indicator
+
+    store = get_vintage_store(root)
+    written = {}
+    for ind in indicators:
+        written[ind] = store.snapshot(ind, load_indicator(ind, pro_dir), vintage)
+        print(f"[vintages] {ind} @ {vintage}: {written[ind]} records")
+    return written
+
+
+def main():
+    ap = argparse.ArgumentParser(description="Append-only as-of vintage store for processed indicators.")
+    sub = ap.add_subparsers(dest="cmd", required=True)
+
+    sp = sub.add_parser("snapshot", help="Record current processed files as a new vintage")
+    sp.add_argument("--vintage", type=int, required=True)
+    sp.add_argument("--indicators", nargs="+", required=True)
+    sp.add_argument("--pro_dir", type=str, default="data/processed")
+
+    sub.add_parser("list", help="List indicators and their vintages")
+
+    sh = sub.add_parser("show", help="Print one indicator as of a vintage")
+    sh.add_argument("--indicator", required=True)
+    sh.add_argument("--as_of", type=int, required=True)
+
+    ap.add_argument("--root", type=str, default=str(VINTAGE_DIR))
+    args = ap.parse_args()
+
+    if args.cmd == "snapshot":
+        snapshot_indicators(args.indicators, args.vintage, Path(args.pro_dir), Path(args.root))
+    elif args.cmd == "list":
+        store = get_vintage_store(Path(args.root))
+        for ind in sorted(store.index):
+            print(f"{ind}: {store.vintages(ind)}")
+    else:
+        s = get_vintage_store(Path(args.root)).as_of(args.indicator, args.as_of)
+        if s is None:
+            print(f"[vintages] no vintage of {args.indicator} at or before {args.as_of}")
+        else:
+            print(s.to_string())
+
+
+if __name__ == "__main__":
+    main()
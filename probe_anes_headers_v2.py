@@ -1,5 +1,8 @@
 import os, sys, pandas as pd, numpy as np, codecs
 
+from models.common.anes_cache import open_anes
+from models.common.column_profile import profile_csv, scale_candidates, year_candidates as year_like
+
 PROJECT = r"C:\Users\Owner\Downloads\forecast_experiment"
 RAW = os.path.join(PROJECT, "data", "raw")
 csv_path = os.path.join(RAW, "anes_timeseries_2024_csv_20250808.csv")
@@ -22,71 +25,36 @@ except Exception as e:
     print("Failed to open raw file:", e)
     sys.exit(1)
 
-# 2) Try robust read attempts WITHOUT low_memory
-attempts = [
-    dict(sep=None, engine="python", encoding="utf-8"),
-    dict(sep=None, engine="python", encoding="latin-1"),
-    dict(sep=",", engine="c", encoding="utf-8"),
-    dict(sep=",", engine="c", encoding="latin-1"),
-    dict(sep="\t", engine="python", encoding="utf-8"),
-    dict(sep=";", engine="python", encoding="utf-8"),
-]
-df = None
-ok = None
-for opts in attempts:
-    try:
-        print("\nTrying read_csv with:", opts)
-        df = pd.read_csv(csv_path, **opts, nrows=2000)  # read a sample
-        ok = opts
-        print("OK. shape:", df.shape)
-        break
-    except Exception as e:
-        print("Failed:", e)
-
-if df is None:
-    print("\nAll attempts failed. The file may not be a text CSV/TSV. Is it XLSX/SAV/DTA/ZIP?")
+# 2) Convert once to the columnar cache (utf-8, then latin-1) and probe the
+#    per-column profile of the whole file instead of a 2000-row sample
+try:
+    cache = open_anes(csv_path)
+except Exception as e:
+    print("Conversion failed:", e)
+    print("\nThe file may not be a text CSV/TSV. Is it XLSX/SAV/DTA/ZIP?")
     sys.exit(1)
 
+cols = cache.columns
+
 print("\n--- COLUMNS (first 20) ---")
-print(list(df.columns[:20]))
-print("Total columns:", len(df.columns))
+print(cols[:20])
+print("Total columns:", len(cols))
 
 print("\n--- SAMPLE ROWS ---")
-print(df.head(5).to_string())
+head_rows = np.arange(min(5, cache.n_rows))
+print(pd.DataFrame({c: cache.column(c, head_rows) for c in cols}).to_string())
 
 # 3) Heuristic detection of key columns by content
-def frac_in_set(series, allowed):
-    s = pd.to_numeric(series, errors="coerce")
-    s = s.dropna()
-    if len(s) == 0: return 0
-    return np.isin(s.values, allowed).mean()
-
-cols = df.columns.tolist()
+prof = profile_csv(csv_path)  # one numeric conversion per column, cached as a sidecar
 
 # Year candidates: mostly 1948..2025 and not too many unique values
-year_candidates = []
-for c in cols:
-    s = pd.to_numeric(df[c], errors="coerce").dropna()
-    if len(s) > 100 and (s.between(1948, 2025).mean() > 0.8) and (s.nunique() < 200):
-        year_candidates.append(c)
-
-scale_1to7 = []
-for c in cols:
-    frac = frac_in_set(df[c], np.arange(1,8))
-    if frac > 0.5 and pd.to_numeric(df[c], errors="coerce").notna().sum() > 200:
-        scale_1to7.append((c, round(frac,3)))
-
-thermo_candidates = []
-for c in cols:
-    s = pd.to_numeric(df[c], errors="coerce").dropna()
-    if len(s) > 200:
-        share = s.between(0,100).mean()
-        if share > 0.9:
-            thermo_candidates.append((c, round(share,3)))
+year_candidates = year_like(prof, min_numeric=100)
+scale_1to7 = scale_candidates(prof, "n_1_7", 0.5, min_numeric=200)
+thermo_candidates = scale_candidates(prof, "n_0_100", 0.9, min_numeric=200)
 
 print("\n--- HEURISTIC CANDIDATES ---")
 print("Year-ish:", year_candidates)
 print("1..7-scale (IDEO or PID7):", scale_1to7[:20])
 print("0..100 thermometer-like:", thermo_candidates[:20])
 
-print("\nUsed read options:", ok)
+print("\nUsed encoding:", cache.meta["encoding"])
@@ -4,6 +4,8 @@ import os
 import glob
 import sys
 
+from models.common.anes_cache import open_anes
+
 # ---- Paths ----
 PROJECT = r"C:\Users\Owner\Downloads\forecast_experiment"
 RAW = os.path.join(PROJECT, "data", "raw")
@@ -25,12 +27,12 @@ if not candidates:
 anes_csv = candidates[0]
 print("Using ANES file:", anes_csv)
 
-# ---- Load ----
-df = pd.read_csv(anes_csv, low_memory=False)
+# ---- Load (columnar cache: only the detected columns are read) ----
+cache = open_anes(anes_csv)
 
 def first_existing(cands):
     for c in cands:
-        if c in df.columns:
+        if c in cache.columns:
             return c
     return None
 
@@ -48,6 +50,10 @@ print("  PID7:", PID7)
 print("  THERM_DEM:", THERM_DEM)
 print("  THERM_REP:", THERM_REP)
 
+df = cache.frame([c for c in (YEAR, IDEO, PID7, THERM_DEM, THERM_REP) if c])
+if YEAR:
+    df[YEAR] = df[YEAR].astype("Int64")  # cache decodes numeric codes as float
+
 # ---- 1) Ideology dispersion (std of 1..7 scale) ----
 ideo_result = pd.DataFrame(columns=["year","ideology_dispersion","ideology_n"])
 if YEAR and IDEO:
@@ -12,6 +12,9 @@ import sys
 import numpy as np
 import pandas as pd
 
+from models.common.anes_cache import read_anes
+from models.common.survey_agg import WeightedGroups, affective_gap
+
 # ---------------- CONFIG: 2024 ANES variable IDs ----------------
 # This file is a single-year (2024) wave; we set the year constant.
 YEAR_CONST = 2024
@@ -40,19 +43,13 @@ if not candidates:
 anes_csv = candidates[0]
 print("Using ANES file:", anes_csv)
 
-# Read file (disable low_memory to avoid dtype issues in wide survey files)
+# Read only the four columns we need from the columnar cache (converted once;
+# utf-8 with latin-1 fallback). Columns absent from the file are simply omitted.
 try:
-    df = pd.read_csv(anes_csv, encoding="utf-8", low_memory=False)
-except Exception as e_utf8:
-    # Fallback to latin-1 if needed
-    try:
-        df = pd.read_csv(anes_csv, encoding="latin-1", low_memory=False)
-        print("NOTE: Read with latin-1 encoding fallback.")
-    except Exception as e_lat:
-        print("Failed to read CSV with utf-8 and latin-1.")
-        print("utf-8 error:", e_utf8)
-        print("latin-1 error:", e_lat)
-        sys.exit(1)
+    df = read_anes(anes_csv, [IDEO, PID7, THERM_DEM, THERM_REP], year_const=YEAR_CONST)
+except Exception as e:
+    print("Failed to read/convert ANES CSV:", e)
+    sys.exit(1)
 
 # Utility
 def to_num(s):
@@ -67,20 +64,18 @@ print(f"  PID7 ({PID7}):", exists(PID7))
 print(f"  THERM_DEM ({THERM_DEM}):", exists(THERM_DEM))
 print(f"  THERM_REP ({THERM_REP}):", exists(THERM_REP))
 
+# Single-wave file: one group (the survey year), unweighted
+groups = WeightedGroups(np.zeros(len(df), dtype=np.int64), 1, labels=[YEAR_CONST])
+
 # ---------- 1) Ideology dispersion (std of 1..7) ----------
 ideo_result = pd.DataFrame(columns=["year","ideology_dispersion","ideology_n"])
 if exists(IDEO):
     x = to_num(df[IDEO])
-    mask = x.between(1,7)
-    if mask.any():
-        ideo_sd = float(x[mask].std(ddof=0))  # population SD; use ddof=1 if you prefer sample SD
-        ideo_n  = int(mask.sum())
-    else:
-        ideo_sd, ideo_n = (np.nan, 0)
+    _, ideo_sd, ideo_n = groups.moments(x, x.between(1,7).to_numpy())  # population SD
     ideo_result = pd.DataFrame({
         "year": [YEAR_CONST],
-        "ideology_dispersion": [ideo_sd],
-        "ideology_n": [ideo_n]
+        "ideology_dispersion": ideo_sd,
+        "ideology_n": ideo_n.astype(int)
     })
 else:
     print("NOTE: IDEO column not found; ideology dispersion will be missing.")
@@ -93,47 +88,14 @@ aff_result = pd.DataFrame(columns=["year","affective_polarization","affective_n"
 
 have_therm = exists(THERM_DEM) and exists(THERM_REP)
 if have_therm:
-    d = to_num(df[THERM_DEM])
-    r = to_num(df[THERM_REP])
-    valid = d.between(0,100) & r.between(0,100)
-
-    if exists(PID7):
-        pid = to_num(df[PID7])
-
-        # Compute per-respondent in-party vs out-party gap
-        # Typical 7-pt PID coding: 1..3 Dem side, 4 Ind, 5..7 Rep side (we treat 4 as independent)
-        def gap_row(i):
-            if not valid.iat[i] or pd.isna(pid.iat[i]):
-                return np.nan
-            if pid.iat[i] <= 3:
-                return abs(d.iat[i] - r.iat[i])   # Dem/lean Dem
-            elif pid.iat[i] >= 5:
-                return abs(r.iat[i] - d.iat[i])   # Rep/lean Rep
-            else:
-                return abs(d.iat[i] - r.iat[i])   # Independents: absolute difference
-
-        # Vectorized-ish apply for safety with mixed dtypes
-        gaps = pd.Series([gap_row(i) for i in range(len(df))], dtype="float64")
-        m = gaps.notna()
-        if m.any():
-            aff_mean = float(gaps[m].mean())
-            aff_n    = int(m.sum())
-        else:
-            aff_mean, aff_n = (np.nan, 0)
-
-        aff_result = pd.DataFrame({
-            "year": [YEAR_CONST],
-            "affective_polarization": [aff_mean],
-            "affective_n": [aff_n]
-        })
-    else:
-        # Fallback: population-level thermometer gap (no PID7)
-        gaps = (d[valid] - r[valid]).abs()
-        aff_result = pd.DataFrame({
-            "year": [YEAR_CONST],
-            "affective_polarization": [float(gaps.mean()) if len(gaps) else np.nan],
-            "affective_n": [int(len(gaps))]
-        })
+    pairs = {(THERM_DEM, THERM_REP): (to_num(df[THERM_DEM]), to_num(df[THERM_REP]))}
+    pid = to_num(df[PID7]) if exists(PID7) else None
+    aff = affective_gap(groups, pairs, pid=pid, pid_fallback=False)
+    aff_result = pd.DataFrame({
+        "year": [YEAR_CONST],
+        "affective_polarization": aff["gap"].to_numpy(),
+        "affective_n": aff["n"].to_numpy(dtype=int)
+    })
 else:
     print("NOTE: Missing one or both thermometer columns; affective polarization will be missing.")
 
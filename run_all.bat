@@ -2,9 +2,18 @@
 set ORIGINS=1985 1990 1995 2000 2005 2010 2015 2020
 set INDICATORS=mass_public_polarization public_trust_government vep_turnout_pct trust_media_pct union_membership_rate unemployment_rate real_gdp_growth house_polarization_dw mil_spend_gdp_share_pct ba_plus_25plus_share
 
+rem configs/experiment.yml sets vintage_required, so runs train on vintages (data/vintage_store).
+rem --allow-latest-fallback trains indicators without a vintage <= origin on the latest revised data
+rem (logged per indicator); drop it once every indicator has vintages.
+rem both UCM backends must give the same forecasts at every origin (exits 1 otherwise)
+python C:\Users\Owner\Downloads\forecast_experiment\run_hsm.py --indicators %INDICATORS% --origins %ORIGINS% --h 15 --allow-latest-fallback --check_backends --out "C:\Users\Owner\Downloads\forecast_experiment\eval\results\diagnostics\hsm_backend_parity.csv"
+if errorlevel 1 exit /b 1
+
+rem all origins in one process; the fits run in parallel
+python C:\Users\Owner\Downloads\forecast_experiment\run_hsm.py --indicators %INDICATORS% --origins %ORIGINS% --h 15 --allow-latest-fallback --out "C:\Users\Owner\Downloads\forecast_experiment\eval\results\hsm_chatgpt\hsm_chatgpt_{origin}.csv"
+
 for %%O in (%ORIGINS%) do (
-  python C:\Users\Owner\Downloads\forecast_experiment\run_hsm.py --indicators %INDICATORS% --origin %%O --h 15 --out "C:\Users\Owner\Downloads\forecast_experiment\eval\results\hsm_chatgpt\hsm_chatgpt_%%O.csv"
-  python C:\Users\Owner\Downloads\forecast_experiment\calibrate_sigma_cli.py --in "C:\Users\Owner\Downloads\forecast_experiment\eval\results\hsm_chatgpt\hsm_chatgpt_%%O.csv" --out "C:\Users\Owner\Downloads\forecast_experiment\eval\results\calibrated\hsm_chatgpt_%%O_cal.csv" --origins %%O --indicators %INDICATORS% --h 15 --target_cov 0.90
+  python C:\Users\Owner\Downloads\forecast_experiment\calibrate_sigma_cli.py --in "C:\Users\Owner\Downloads\forecast_experiment\eval\results\hsm_chatgpt\hsm_chatgpt_%%O.csv" --out "C:\Users\Owner\Downloads\forecast_experiment\eval\results\calibrated\hsm_chatgpt_%%O_cal.csv" --origins %%O --indicators %INDICATORS% --h 15 --target_cov 0.90 --allow-latest-fallback
   python C:\Users\Owner\Downloads\forecast_experiment\verify_calibrated_cli.py --calibrated_csv "C:\Users\Owner\Downloads\forecast_experiment\eval\results\calibrated\hsm_chatgpt_%%O_cal.csv" --indicators %INDICATORS% --origin %%O --h 15 --out_dir "C:\Users\Owner\Downloads\forecast_experiment\eval\results\diagnostics\hsm_chatgpt_%%O_cal"
 )
 
@@ -9,7 +9,7 @@ sys.path.insert(0, COMMON_DIR)
 
 import argparse
 from models.FSM_chatgpt.fsm import fsm_forecast
-from utils import save_quantiles_csv  # from models/common/utils.py
+from models.common.utils import save_quantiles_csv
 
 if __name__ == "__main__":
     ap = argparse.ArgumentParser()
@@ -6,29 +6,116 @@ import sys
 import pandas as pd
 
 # import your HSM forecast function
-from models.HSM_chatgpt.hsm import hsm_forecast
+from models.HSM_chatgpt.hsm import backend_parity, hsm_forecast, hsm_forecast_many, hsm_forecast_online
+from models.common.vintages import vintage_required
 
 def parse_args():
     p = argparse.ArgumentParser()
     p.add_argument("--indicators", nargs="+", required=True, help="List of indicator names")
-    p.add_argument("--origin", type=int, required=True, help="Last year included in training")
+    g = p.add_mutually_exclusive_group(required=True)
+    g.add_argument("--origin", type=int, help="Last year included in training")
+    g.add_argument("--origins", type=int, nargs="+",
+                   help="Several origins in one run (fits in parallel); use {origin} in --out for one file per origin")
     p.add_argument("--h", type=int, default=15, help="Forecast horizon (years)")
     p.add_argument("--out", type=str, required=True, help="Output CSV path")
+    p.add_argument("--jobs", type=int, default=None, help="Worker processes for --origins (default: CPU count)")
+    p.add_argument("--cold_start", action="store_true",
+                   help="With --origins, fit every origin from default start values instead of the previous origin's")
+    p.add_argument("--fit_stats", type=str, default=None,
+                   help="With --origins, write per-fit optimizer counts (iterations, fcalls, warm) to this CSV")
+    p.add_argument("--backend", choices=["statsmodels", "numpy"], default="statsmodels",
+                   help="UCM fitting backend (numpy: batched engine in models/common/ucm_engine.py). "
+                        "Same model; statsmodels fits that stop below the engine's likelihood maximum "
+                        "are refitted from it, so both agree to optimizer tolerance (see --check_backends)")
+    p.add_argument("--check_backends", action="store_true",
+                   help="Fit every origin with both backends and write their forecast differences to --out "
+                        "instead of forecasts; exits 1 if any (origin, indicator) pair disagrees")
+    p.add_argument("--no-cache", "--no_cache", dest="no_cache", action="store_true",
+                   help="Refit every model instead of using the persistent fit cache (data/fit_cache)")
+    p.add_argument("--params", action="store_true",
+                   help="Write distribution parameters (mu, sigma; see models/common/distributions.py) "
+                        "instead of q05/q50/q95")
+    p.add_argument("--online", action="store_true",
+                   help="With --origin, update each indicator's stored filter state with the new years "
+                        "(one Kalman step each) and refit only on schedule or drift")
+    p.add_argument("--refit_every", type=int, default=5,
+                   help="With --online, re-estimate after this many assimilated observations")
+    p.add_argument("--drift_alpha", type=float, default=0.01,
+                   help="With --online, re-estimate when the innovation drift test p-value falls below this")
+    p.add_argument("--vintage", action="store_true",
+                   help="Train on data as known at the origin (vintage store) instead of the latest release; "
+                        "implied when configs/experiment.yml sets vintage_required")
+    p.add_argument("--allow-latest-fallback", "--allow_latest_fallback", dest="allow_latest", action="store_true",
+                   help="With vintages, train indicators that have no vintage <= origin on the latest "
+                        "processed data truncated at the origin (default: fail)")
     return p.parse_args()
 
+def _write(df: pd.DataFrame, out_path: Path) -> None:
+    # refuse to write header-only files
+    if df.empty:
+        print(f"[run_hsm] ERROR: forecast dataframe is empty — not writing {out_path}.")
+        sys.exit(1)
+    out_path.parent.mkdir(parents=True, exist_ok=True)
+    df.to_csv(out_path, index=False)
+    print(f"[run_hsm] wrote {len(df)} rows to {out_path}")
+
+def main_many(args):
+    df = hsm_forecast_many(args.indicators, args.origins, h=args.h, vintage=args.vintage, jobs=args.jobs,
+                           warm_start=not args.cold_start, backend=args.backend,
+                           cache=not args.no_cache, dist=args.params, allow_latest=args.allow_latest)
+    if args.params:
+        dist, df = df, df.to_frame()
+        df.attrs.update(dist.attrs)
+    if args.fit_stats:
+        Path(args.fit_stats).parent.mkdir(parents=True, exist_ok=True)
+        pd.DataFrame(df.attrs["fit_stats"]).to_csv(args.fit_stats, index=False)
+        print(f"[run_hsm] wrote fit stats to {args.fit_stats}")
+    if "{origin}" in args.out:
+        for origin in sorted(set(args.origins)):
+            part = df[df["origin"] == origin].drop(columns="origin")
+            _write(part, Path(args.out.format(origin=origin)))
+    else:
+        _write(df, Path(args.out))
+    if df.attrs.get("failures"):
+        print(f"[run_hsm] {len(df.attrs['failures'])} fit(s) failed; see messages above")
+
 def main():
     args = parse_args()
+    if args.online and (args.origins or args.vintage):
+        sys.exit("[run_hsm] --online works with a single --origin on the latest data (no --origins / --vintage)")
+    if not args.online and not args.vintage and vintage_required():
+        print("[run_hsm] configs/experiment.yml sets vintage_required: training on vintages (--vintage)")
+        args.vintage = True
+    if args.check_backends:
+        df = backend_parity(args.indicators, args.origins or [args.origin], h=args.h, vintage=args.vintage,
+                            allow_latest=args.allow_latest)
+        print(df.to_string(index=False))
+        _write(df, Path(args.out))
+        if not df["ok"].all():
+            sys.exit(1)
+        return
+    if args.origins:
+        main_many(args)
+        return
     out_path = Path(args.out)
     out_path.parent.mkdir(parents=True, exist_ok=True)
 
-    df = hsm_forecast(args.indicators, origin=args.origin, h=args.h)
+    if args.online:
+        df = hsm_forecast_online(args.indicators, origin=args.origin, h=args.h, backend=args.backend,
+                                 refit_every=args.refit_every, alpha=args.drift_alpha, dist=args.params)
+    else:
+        df = hsm_forecast(args.indicators, origin=args.origin, h=args.h,
+                          as_of=args.origin if args.vintage else None, backend=args.backend,
+                          cache=not args.no_cache, dist=args.params, allow_latest=args.allow_latest)
+    if args.params:
+        df = df.to_frame().drop(columns="origin")
 
     # Accept either q05 or q5; standardize to q05 in the file
     if "q5" in df.columns and "q05" not in df.columns:
         df = df.rename(columns={"q5": "q05"})
 
     # sanity columns (don’t drop rows if a column is missing)
-    expected = ["indicator", "horizon", "q05", "q50", "q95"]
+    expected = ["indicator", "horizon"] + (["mu", "sigma"] if args.params else ["q05", "q50", "q95"])
     present = [c for c in expected if c in df.columns]
     df = df[present]
 
@@ -1,14 +1,14 @@
 # verify_calibrated_cli.py
 from __future__ import annotations
-import argparse, math
+import argparse
 from pathlib import Path
-from typing import List
 import numpy as np
 import pandas as pd
 
+from models.common.distributions import GaussianForecast, observed_values
+from models.common.panel_store import PanelStore, open_panel
+
 DATA_DIR = Path(r'C:\Users\Owner\Downloads\forecast_experiment\data\processed')
-Z90 = 1.6448536269514722  # Phi^{-1}(0.95)
-Z50 = 0.6744897501960817  # Phi^{-1}(0.75)
 
 def _normalize_qdf(df: pd.DataFrame) -> pd.DataFrame:
     df = df.copy()
@@ -32,51 +32,13 @@ def _normalize_qdf(df: pd.DataFrame) -> pd.DataFrame:
         df[c] = pd.to_numeric(df[c], errors='coerce')
     return df
 
-def _extract_year_series(df: pd.DataFrame) -> pd.Series:
-    if 'year' in df.columns:
-        y = pd.to_numeric(df['year'], errors='coerce')
-        if y.notna().sum() > 1 and y.nunique() > 1:
-            return y
-    for c in df.columns:
-        if c == 'year': continue
-        if df[c].dtype == 'O':
-            s = df[c].astype(str)
-            m = s.str.extract(r'^(?P<y>\d{4})(?:[-/]\d{1,2})?(?:[-/]\d{1,2})?$', expand=True)
-            y = pd.to_numeric(m['y'], errors='coerce')
-            if y.notna().sum() > 1 and y.nunique() > 1:
-                return y
-    for cand in ['date','period','time','year_month','year_quarter']:
-        if cand in df.columns:
-            y = pd.to_datetime(df[cand], errors='coerce').dt.year
-            if y.notna().sum() > 1 and y.nunique() > 1:
-                return y
-    for c in df.columns:
-        y = pd.to_datetime(df[c], errors='coerce').dt.year
-        if y.notna().sum() > 1 and y.nunique() > 1:
-            return y
-    return pd.to_datetime(df.index, errors='coerce').year
-
-def _load_truth(indicator: str) -> pd.DataFrame:
+def _load_truth(indicator: str, store: PanelStore | None = None) -> pd.DataFrame:
     path = DATA_DIR / f'{indicator}.csv'
     if not path.exists():
         raise FileNotFoundError(f"Truth series not found for '{indicator}': {path}")
-    df = pd.read_csv(path)
-    df.columns = [c.strip().lower() for c in df.columns]
-    y = _extract_year_series(df)
-    y = pd.to_numeric(y, errors='coerce')
-    value_col = 'value'
-    if value_col not in df.columns:
-        if indicator.lower() in df.columns:
-            value_col = indicator.lower()
-        else:
-            numc = [c for c in df.columns if c != 'year' and pd.api.types.is_numeric_dtype(df[c])]
-            value_col = numc[0] if numc else df.columns[-1]
-    out = pd.DataFrame({'year': y, 'value': pd.to_numeric(df[value_col], errors='coerce')})
-    out = out.dropna(subset=['year','value']).astype({'year': int}).sort_values('year').reset_index(drop=True)
-    return out
-
-def _phi(x: np.ndarray) -> np.ndarray:
-    return 0.5 * (1.0 + np.vectorize(lambda t: math.erf(t / math.sqrt(2.0)))(x))
+    if store is None:
+        store = open_panel([indicator], DATA_DIR)
+    return store.year_value(indicator)
 
 def main():
     ap = argparse.ArgumentParser(description='Verify PIT & coverage for calibrated quantiles.')
@@ -90,40 +52,27 @@ def main():
     out_dir = Path(args.out_dir); out_dir.mkdir(parents=True, exist_ok=True)
     qdf = _normalize_qdf(pd.read_csv(args.calibrated_csv))
 
-    pit_rows: List[dict] = []
-    cov_rows: List[dict] = []
-
-    for ind in args.indicators:
-        sub = qdf[qdf['indicator'] == ind]
-        if sub.empty:
-            continue
-        truth = _load_truth(ind)
-        for k in range(1, args.h + 1):
-            y_year = args.origin + k
-            row = sub[sub['horizon'] == k]
-            if row.empty:
-                continue
-            trow = truth[truth['year'] == y_year]
-            if trow.empty:
-                continue
-            y_true = float(trow['value'].values[0])
-            q50 = float(row['q50'].values[0]); q95 = float(row['q95'].values[0])
-
-            sigma = max(1e-8, (q95 - q50) / Z90)
-            z = (y_true - q50) / sigma
-            pit = float(_phi(np.array([z]))[0])
-            pit_rows.append(dict(indicator=ind, year=y_year, horizon=k, pit=pit))
-
-            lo50 = q50 - Z50 * sigma; hi50 = q50 + Z50 * sigma
-            covered50 = int(min(lo50, hi50) <= y_true <= max(lo50, hi50))
-            cov_rows.append(dict(indicator=ind, year=y_year, horizon=k, level=0.50, covered=covered50))
-
-            lo90 = q50 - Z90 * sigma; hi90 = q50 + Z90 * sigma
-            covered90 = int(min(lo90, hi90) <= y_true <= max(lo90, hi90))
-            cov_rows.append(dict(indicator=ind, year=y_year, horizon=k, level=0.90, covered=covered90))
-
-    pd.DataFrame(pit_rows, columns=['indicator','year','horizon','pit']).to_csv(out_dir / 'pit_values_calibrated.csv', index=False)
-    cov_df = pd.DataFrame(cov_rows, columns=['indicator','year','horizon','level','covered'])
+    store = open_panel([i for i in args.indicators if (DATA_DIR / f'{i}.csv').exists()], DATA_DIR)
+
+    # one row per (indicator, horizon) in indicator order, horizons 1..h
+    order = {ind: i for i, ind in enumerate(dict.fromkeys(args.indicators))}
+    qdf = qdf[qdf['indicator'].isin(order) & qdf['horizon'].between(1, args.h)]
+    qdf = (qdf.drop_duplicates(['indicator', 'horizon'])
+              .assign(_ind=qdf['indicator'].map(order))
+              .sort_values(['_ind', 'horizon'], kind='stable'))
+    # Gaussian with mu = q50 and sigma from the upper half, (q95 - q50) / z95
+    dist = GaussianForecast.from_quantiles(qdf.assign(origin=args.origin), qdf['q50'], qdf['q95'])
+    truth = {ind: _load_truth(ind, store).set_index('year')['value'] for ind in dict.fromkeys(qdf['indicator'])}
+    y = observed_values(dist.keys, truth)
+    scored = ~np.isnan(y)
+    dist, y = dist.take(scored), y[scored]
+    keys = dist.keys.assign(year=dist.keys['origin'] + dist.keys['horizon'])[['indicator', 'year', 'horizon']]
+
+    pd.DataFrame(keys.assign(pit=dist.pit(y)), columns=['indicator','year','horizon','pit']).to_csv(out_dir / 'pit_values_calibrated.csv', index=False)
+    cov = [keys.assign(level=level, covered=dist.covers(y, level).astype(int), _pos=np.arange(len(keys)))
+           for level in (0.50, 0.90)]
+    cov_df = (pd.concat(cov, ignore_index=True).sort_values(['_pos', 'level'], kind='stable')
+                [['indicator','year','horizon','level','covered']])
     cov_df.to_csv(out_dir / 'coverage_points_calibrated.csv', index=False)
 
     if not cov_df.empty: